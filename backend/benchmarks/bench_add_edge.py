@@ -0,0 +1,93 @@
+"""加边环检测基准：增量拓扑序索引 vs 每次重建 networkx 图
+
+按随机顺序逐条加入一个随机 DAG 的边（其中混入会形成环的反向边），
+比较 DynamicDAG 的总耗时与旧实现（每条边重建 DiGraph + is_directed_acyclic_graph）
+在同样规模下的单次耗时。旧实现是平方级的，只对最终规模抽样计时再外推。
+
+用法（在 backend 目录下，10 万条边的规模需要几分钟）：
+    python benchmarks/bench_add_edge.py
+"""
+import random
+import time
+
+from common import setup_temp_data_dir
+
+setup_temp_data_dir()
+
+import networkx as nx  # noqa: E402
+
+from knowledge_dag.graph import CycleError, DynamicDAG  # noqa: E402
+
+# (节点数, 边数)
+SIZES = [
+    (2_500, 10_000),
+    (12_500, 50_000),
+    (25_000, 100_000),
+]
+CYCLE_RATIO = 0.1
+BASELINE_SAMPLES = 20
+
+
+def random_dag_edges(nodes: int, edges: int, rng: random.Random):
+    """生成随机 DAG 的边（隐藏拓扑序为一个随机排列），按随机顺序返回"""
+    order = list(range(nodes))
+    rng.shuffle(order)
+    result = set()
+    while len(result) < edges:
+        i = rng.randrange(nodes - 1)
+        # 偏向局部连接，和真实书籍中“相邻章节间引用更多”的形态接近
+        j = min(nodes - 1, i + 1 + int(rng.expovariate(1 / 50)))
+        result.add((f"n{order[i]}", f"n{order[j]}"))
+    result = list(result)
+    rng.shuffle(result)
+    return result
+
+
+def legacy_add_edge(node_ids, edges, source, target) -> bool:
+    """旧实现：重建整个图再做一次全图 DAG 检查"""
+    graph = nx.DiGraph()
+    graph.add_nodes_from(node_ids)
+    graph.add_edges_from(edges)
+    graph.add_edge(source, target)
+    return nx.is_directed_acyclic_graph(graph)
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'nodes':>8} {'edges':>8} {'cycles':>8} {'index total ms':>15} {'index us/edge':>14} "
+          f"{'legacy ms/edge':>15} {'legacy total s (est.)':>22}")
+    for nodes, edges in SIZES:
+        node_ids = [f"n{i}" for i in range(nodes)]
+        edge_list = random_dag_edges(nodes, edges, rng)
+        # 混入反向边：一定会在某个时刻形成环（若其正向边已经加入）
+        attempts = []
+        for source, target in edge_list:
+            attempts.append((source, target))
+            if rng.random() < CYCLE_RATIO:
+                attempts.append((target, source))
+
+        dag = DynamicDAG.from_edges(node_ids, [])
+        rejected = 0
+        start = time.perf_counter()
+        for source, target in attempts:
+            try:
+                dag.add_edge(source, target)
+            except CycleError:
+                rejected += 1
+        index_ms = (time.perf_counter() - start) * 1000
+        accepted = [(s, t) for s in dag.succ for t in dag.succ[s]]
+
+        samples = rng.sample(edge_list, BASELINE_SAMPLES)
+        start = time.perf_counter()
+        for source, target in samples:
+            legacy_add_edge(node_ids, accepted, source, target)
+        legacy_ms = (time.perf_counter() - start) * 1000 / BASELINE_SAMPLES
+        # 旧实现的单次耗时随已有边数线性增长，整个过程约为最终单次耗时 * 次数 / 2
+        legacy_total_s = legacy_ms * len(attempts) / 2 / 1000
+
+        print(f"{nodes:>8} {len(accepted):>8} {rejected:>8} {index_ms:>15.1f} "
+              f"{index_ms * 1000 / len(attempts):>14.1f} {legacy_ms:>15.2f} {legacy_total_s:>22.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""变更日志基准：增量同步（GET /projects/{id}/changes）vs 每次完整获取项目
+
+对不同规模的项目先执行若干次编辑（节点移动、改名、加边），再分别用完整 GET 和
+changes?since= 同步，报告平均延迟和响应体大小；最后比较开启/关闭变更日志时单次写入的耗时。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_change_feed.py
+"""
+import time
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (5, 4, 10),
+    (10, 10, 20),
+    (20, 10, 50),
+]
+EDITS = 20
+REPEAT = 20
+WRITES = 200
+
+
+def edit(client, url, i):
+    """执行一次小编辑：依次轮换移动节点、改名节点、添加边"""
+    kind = i % 3
+    if kind == 0:
+        client.put(f"{url}/nodes/position", json={
+            "node_id": "node_0_0_0", "section_id": "sec_0_0", "x": float(i), "y": float(i)
+        }, headers={"Prefer": "return=minimal"})
+    elif kind == 1:
+        client.put(f"{url}/nodes/node_0_0_1", json={
+            "section_id": "sec_0_0", "name": f"renamed {i}"
+        }, headers={"Prefer": "return=minimal"})
+    else:
+        client.post(f"{url}/edges", json={
+            "source": "node_0_0_0", "target": f"node_1_0_{i % 5}"
+        }, headers={"Prefer": "return=minimal"})
+
+
+def measure(client, url, params=None):
+    """返回 (平均延迟 ms, 响应字节数)"""
+    size = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        response = client.get(url, params=params)
+        assert response.status_code == 200, response.text
+        size = len(response.content)
+    return (time.perf_counter() - start) * 1000 / REPEAT, size
+
+
+def write_latency(client, url, max_entries):
+    """开启（max_entries > 0）或关闭变更日志时，单次节点移动的平均耗时 ms"""
+    settings.change_log_max_entries = max_entries
+    start = time.perf_counter()
+    for i in range(WRITES):
+        client.put(f"{url}/nodes/position", json={
+            "node_id": "node_0_0_2", "section_id": "sec_0_0", "x": float(i), "y": 0.0
+        }, headers={"Prefer": "return=minimal"})
+    return (time.perf_counter() - start) * 1000 / WRITES
+
+
+def main():
+    projects = []
+    for chapters, sections, nodes in SIZES:
+        project = build_project(f"bench_{chapters}_{sections}_{nodes}", chapters, sections, nodes,
+                                content_size=512)
+        storage.add(project)
+        projects.append((chapters * sections * nodes, project))
+
+    max_entries = settings.change_log_max_entries
+    print(f"{EDITS} edits since the last sync")
+    print(f"{'nodes':>6} {'full ms':>8} {'feed ms':>8} {'full KB':>9} {'feed KB':>8} "
+          f"{'write ms':>9} {'no-log ms':>10}")
+    with TestClient(app) as client:
+        for node_count, project in projects:
+            url = f"{settings.api_prefix}/projects/{project.id}"
+            since = client.get(url).json()["version"]
+            for i in range(EDITS):
+                edit(client, url, i)
+            full_ms, full_bytes = measure(client, url)
+            feed_ms, feed_bytes = measure(client, f"{url}/changes", {"since": since})
+            logged_ms = write_latency(client, url, max_entries)
+            unlogged_ms = write_latency(client, url, 0)
+            settings.change_log_max_entries = max_entries
+            print(f"{node_count:>6} {full_ms:>8.2f} {feed_ms:>8.2f} {full_bytes / 1024:>9.1f} "
+                  f"{feed_bytes / 1024:>8.1f} {logged_ms:>9.3f} {unlogged_ms:>10.3f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
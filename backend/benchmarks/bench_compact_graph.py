@@ -0,0 +1,87 @@
+"""紧凑图基准：CompactGraph（CSR 整数数组）vs networkx.DiGraph
+
+对 1 万 ~ 10 万条边的随机 DAG 报告：
+    - 构建耗时与内存占用（tracemalloc 统计的构建完成后仍占用的部分，单独测量，不影响计时）
+    - 拓扑排序、DAG 检查、祖先+后代搜索、诱导子图的耗时
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_compact_graph.py
+"""
+import random
+import time
+import tracemalloc
+
+from common import setup_temp_data_dir, timeit
+from bench_add_edge import random_dag_edges
+
+setup_temp_data_dir()
+
+import networkx as nx  # noqa: E402
+
+from knowledge_dag.graph import CompactGraph  # noqa: E402
+
+# (节点数, 边数)
+SIZES = [
+    (2_500, 10_000),
+    (12_500, 50_000),
+    (25_000, 100_000),
+]
+QUERIES = 20
+
+
+def build_networkx(node_ids, edges):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(node_ids)
+    graph.add_edges_from(edges)
+    return graph
+
+
+def measure_build(builder):
+    """返回 (对象, 构建耗时 ms, 常驻内存 MB)"""
+    elapsed, _ = timeit(builder, repeat=3)
+    tracemalloc.start()
+    result = builder()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained / 1024 / 1024
+
+
+def networkx_related(graph, node):
+    related = nx.ancestors(graph, node) | nx.descendants(graph, node) | {node}
+    return list(graph.subgraph(related).edges())
+
+
+def compact_related(graph, node):
+    related = {node, *graph.ancestors(node), *graph.descendants(node)}
+    return graph.induced_edges(related)
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'edges':>7} {'impl':>9} {'build ms':>9} {'memory MB':>10} {'topo ms':>8} "
+          f"{'is_dag ms':>10} {'query ms':>9}")
+    for nodes, edges in SIZES:
+        node_ids = [f"n{i}" for i in range(nodes)]
+        edge_list = random_dag_edges(nodes, edges, rng)
+        focus = rng.sample(node_ids, QUERIES)
+
+        cases = [
+            ("networkx", lambda: build_networkx(node_ids, edge_list),
+             lambda g: list(nx.topological_sort(g)), nx.is_directed_acyclic_graph, networkx_related),
+            ("compact", lambda: CompactGraph.from_edges(node_ids, edge_list),
+             lambda g: g.topological_order(), lambda g: g.is_dag(), compact_related),
+        ]
+        for name, builder, topo, is_dag, related in cases:
+            graph, build_ms, memory_mb = measure_build(builder)
+            topo_ms, _ = timeit(lambda: topo(graph), repeat=3)
+            dag_ms, _ = timeit(lambda: is_dag(graph), repeat=3)
+            start = time.perf_counter()
+            for node in focus:
+                related(graph, node)
+            query_ms = (time.perf_counter() - start) * 1000 / QUERIES
+            print(f"{edges:>7} {name:>9} {build_ms:>9.1f} {memory_mb:>10.2f} {topo_ms:>8.1f} "
+                  f"{dag_ms:>10.1f} {query_ms:>9.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
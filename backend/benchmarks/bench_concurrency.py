@@ -0,0 +1,112 @@
+"""并发基准：混合读写流量下的吞吐量与延迟
+
+在后台线程中启动 uvicorn，用 httpx.AsyncClient 同时发起：
+    - 读取完整项目（GET /projects/{id}）
+    - 拖拽更新部分坐标（PUT /projects/{id}/sections/position，宽容模式接口）
+    - 重命名项目（PUT /projects/{id}，走完整的差量保存）
+    - 心跳请求（GET /），用于观察事件循环是否被阻塞
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_concurrency.py [--seconds 5] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+PROJECT_ID = "bench_concurrency"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _percentile(samples, ratio):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+async def _worker(client, kind, deadline, latencies, counter):
+    base = f"{settings.api_prefix}/projects/{PROJECT_ID}"
+    while time.perf_counter() < deadline:
+        counter[kind] += 1
+        i = counter[kind]
+        start = time.perf_counter()
+        if kind == "read":
+            resp = await client.get(base)
+        elif kind == "drag":
+            resp = await client.put(f"{base}/sections/position", json={
+                "chapter_id": f"ch_{i % 10}", "section_id": f"sec_{i % 10}_0", "x": i, "y": i
+            })
+        elif kind == "write":
+            resp = await client.put(base, json={"name": f"renamed {i}"})
+        else:
+            resp = await client.get(f"{settings.api_prefix}/")
+            await asyncio.sleep(0.01)
+        resp.raise_for_status()
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+
+
+async def run(port: int, seconds: float, concurrency: int):
+    latencies = defaultdict(list)
+    counter = defaultdict(int)
+    limits = httpx.Limits(max_connections=concurrency * 4)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                 timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+        tasks = []
+        for kind in ("read", "drag", "write"):
+            tasks += [_worker(client, kind, deadline, latencies, counter) for _ in range(concurrency)]
+        tasks.append(_worker(client, "ping", deadline, latencies, counter))
+        await asyncio.gather(*tasks)
+
+    print(f"{'kind':>6} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for kind in ("read", "drag", "write", "ping"):
+        samples = latencies[kind]
+        print(f"{kind:>6} {len(samples):>9} {len(samples) / seconds:>8.1f} "
+              f"{_percentile(samples, 0.5):>9.1f} {_percentile(samples, 0.95):>9.1f} "
+              f"{max(samples):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="每类请求的并发数")
+    parser.add_argument("--nodes-per-section", type=int, default=5, help="项目规模：10 章 x 10 部分 x N 节点")
+    args = parser.parse_args()
+
+    storage.add(build_project(PROJECT_ID, 10, 10, args.nodes_per_section))
+    port = _free_port()
+    server = _start_server(port)
+    try:
+        asyncio.run(run(port, args.seconds, args.concurrency))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""条件请求基准：GET /projects/{id} 完整响应 vs If-None-Match 命中时的 304
+
+对不同规模的项目，通过 TestClient 反复读取同一个未变化的项目，报告平均延迟和响应体大小。
+完整响应即使命中项目缓存也要序列化整棵树；304 只查询一次版本号。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_conditional_get.py
+"""
+import time
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (5, 4, 10),
+    (10, 10, 20),
+    (20, 10, 50),
+]
+REPEAT = 20
+
+
+def measure(client, url, headers):
+    """返回 (平均延迟 ms, 响应字节数)"""
+    size = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        response = client.get(url, headers=headers)
+        size = len(response.content)
+    return (time.perf_counter() - start) * 1000 / REPEAT, size
+
+
+def main():
+    projects = []
+    for chapters, sections, nodes in SIZES:
+        project = build_project(f"bench_{chapters}_{sections}_{nodes}", chapters, sections, nodes,
+                                content_size=512)
+        storage.add(project)
+        projects.append((chapters * sections * nodes, project))
+
+    print(f"{'nodes':>6} {'full ms':>8} {'304 ms':>7} {'full KB':>9} {'304 B':>6}")
+    with TestClient(app) as client:
+        for node_count, project in projects:
+            url = f"{settings.api_prefix}/projects/{project.id}"
+            etag = client.get(url).headers["etag"]
+            full_ms, full_bytes = measure(client, url, None)
+            cached_ms, cached_bytes = measure(client, url, {"If-None-Match": etag})
+            print(f"{node_count:>6} {full_ms:>8.2f} {cached_ms:>7.2f} {full_bytes / 1024:>9.1f} {cached_bytes:>6}",
+                  flush=True)
+
+
+if __name__ == "__main__":
+    main()
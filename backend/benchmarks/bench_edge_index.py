@@ -0,0 +1,79 @@
+"""边索引基准：删除章节时的级联清理与按 (source, target) 查找边
+
+旧实现用列表判断节点是否被删除（O(E × N)），按端点查找边时线性扫描整个边列表；
+新实现的级联清理用集合判断、只过滤一遍边列表；查找使用 Project 的 (source, target) 哈希索引。
+查找计时包含每次加载后首次使用时构建索引的开销（单次查找与线性扫描相当，多次查找时摊薄）。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_edge_index.py
+"""
+import random
+
+from common import setup_temp_data_dir, build_project, timeit
+
+setup_temp_data_dir()
+
+from knowledge_dag.storage import clone_project  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (10, 10, 10),
+    (20, 10, 25),
+    (50, 10, 20),
+]
+LOOKUPS = 100
+REPEAT = 5
+
+
+def legacy_delete_chapter(project, chapter):
+    node_ids_to_remove = [node.id for section in chapter.sections for node in section.nodes]
+    project.edges = [
+        e for e in project.edges
+        if e.source not in node_ids_to_remove and e.target not in node_ids_to_remove
+    ]
+
+
+def indexed_delete_chapter(project, chapter):
+    project.remove_node_edges(node.id for section in chapter.sections for node in section.nodes)
+
+
+def legacy_lookup(project, pairs):
+    for source, target in pairs:
+        next((e for e in project.edges if e.source == source and e.target == target), None)
+
+
+def indexed_lookup(project, pairs):
+    for source, target in pairs:
+        project.find_edge(source, target)
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'nodes':>7} {'edges':>7} {'chapter nodes':>14} {'cascade legacy ms':>18} {'cascade indexed ms':>19} "
+          f"{'lookup legacy ms':>17} {'lookup indexed ms':>18}")
+    for chapters, sections, nodes in SIZES:
+        project = build_project("bench", chapters, sections, nodes, edges_per_node=2)
+        chapter = project.chapters[chapters // 2]
+        pairs = [(e.source, e.target) for e in rng.sample(project.edges, LOOKUPS)]
+
+        # 每次都在新加载（复制）的项目上操作，与服务层一致；复制在计时之外完成
+        def fresh(count=REPEAT):
+            copies = iter([clone_project(project) for _ in range(count)])
+            return lambda: next(copies)
+
+        copy = fresh()
+        cascade_legacy, _ = timeit(lambda: legacy_delete_chapter(copy(), chapter), repeat=REPEAT)
+        copy = fresh()
+        cascade_indexed, _ = timeit(lambda: indexed_delete_chapter(copy(), chapter), repeat=REPEAT)
+        lookup_legacy, _ = timeit(lambda: legacy_lookup(project, pairs), repeat=REPEAT)
+        copy = fresh()
+        lookup_indexed, _ = timeit(lambda: indexed_lookup(copy(), pairs), repeat=REPEAT)
+
+        chapter_nodes = sections * nodes
+        print(f"{chapters * sections * nodes:>7} {len(project.edges):>7} {chapter_nodes:>14} "
+              f"{cascade_legacy:>18.1f} {cascade_indexed:>19.1f} "
+              f"{lookup_legacy:>17.1f} {lookup_indexed:>18.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""批量图谱分析基准：一次 graph_analysis/batch vs 逐个节点调用 graph_analysis
+
+对每个项目规模，分别用 N 次单节点请求和一次 focus_nodes="all" 的批量请求分析全部节点，
+报告两种方式的总耗时（含请求处理与 JSON 序列化）。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_graph_batch.py
+"""
+import time
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (2, 5, 20),
+    (5, 5, 20),
+    (10, 5, 20),
+]
+
+
+def main():
+    prefix = settings.api_prefix
+    print(f"{'nodes':>6} {'single total ms':>16} {'batch total ms':>15} {'speedup':>8}")
+    with TestClient(app) as client:
+        for chapters, sections, nodes in SIZES:
+            project = build_project(f"bench_{chapters}", chapters, sections, nodes, edges_per_node=2)
+            storage.add(project)
+            url = f"{prefix}/projects/{project.id}/graph_analysis"
+            node_ids = [n.id for c in project.chapters for s in c.sections for n in s.nodes]
+            client.get(url, params={"focus_node": node_ids[0]})  # 预热项目缓存和图索引
+
+            start = time.perf_counter()
+            for node_id in node_ids:
+                client.get(url, params={"focus_node": node_id}).json()
+            single_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            with client.stream("POST", f"{url}/batch", json={"focus_nodes": "all"}) as response:
+                for _ in response.iter_lines():
+                    pass
+            batch_ms = (time.perf_counter() - start) * 1000
+
+            print(f"{len(node_ids):>6} {single_ms:>16.1f} {batch_ms:>15.1f} "
+                  f"{single_ms / batch_ms:>7.1f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""整图指标基准：graph_metrics 一次拓扑遍历 vs networkx 分别计算各项指标
+
+networkx 版本依次调用 topological_generations、dag_longest_path、in/out_degree、
+weakly_connected_components 并逐边统计跨分组连接，对应前端逐项计算的做法。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_graph_metrics.py
+"""
+import random
+
+from common import setup_temp_data_dir, timeit
+from bench_add_edge import random_dag_edges
+
+setup_temp_data_dir()
+
+import networkx as nx  # noqa: E402
+
+from knowledge_dag.graph import CompactGraph, graph_metrics  # noqa: E402
+
+# (节点数, 边数)
+SIZES = [
+    (2_500, 10_000),
+    (12_500, 50_000),
+    (25_000, 100_000),
+]
+GROUP_SIZE = 250
+
+
+def networkx_metrics(node_ids, edges, groups):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(node_ids)
+    graph.add_edges_from(edges)
+    levels = {node: i for i, generation in enumerate(nx.topological_generations(graph)) for node in generation}
+    critical_path = nx.dag_longest_path(graph)
+    in_degree, out_degree = dict(graph.in_degree()), dict(graph.out_degree())
+    components = list(nx.weakly_connected_components(graph))
+    cross = {}
+    for source, target in graph.edges():
+        key = (groups[source], groups[target])
+        cross[key] = cross.get(key, 0) + 1
+    return levels, critical_path, in_degree, out_degree, components, cross
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'nodes':>7} {'edges':>7} {'metrics ms':>11} {'+ CSR build ms':>15} {'networkx ms':>12}")
+    for nodes, edges in SIZES:
+        node_ids = [f"n{i}" for i in range(nodes)]
+        edge_list = random_dag_edges(nodes, edges, rng)
+        groups = {node: f"g{i // GROUP_SIZE}" for i, node in enumerate(node_ids)}
+        graph = CompactGraph.from_edges(node_ids, edge_list)
+
+        metrics_ms, _ = timeit(lambda: graph_metrics(graph, groups), repeat=3)
+        build_ms, _ = timeit(lambda: CompactGraph.from_edges(node_ids, edge_list), repeat=3)
+        legacy_ms, _ = timeit(lambda: networkx_metrics(node_ids, edge_list, groups), repeat=3)
+        print(f"{nodes:>7} {edges:>7} {metrics_ms:>11.1f} {metrics_ms + build_ms:>15.1f} {legacy_ms:>12.1f}",
+              flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""YAML 导入基准：批量写入（executemany）与逐行写入的对比
+
+生成不同规模的 YAML 文件，分别测量：
+- 完整导入耗时（解析 YAML + 构建模型 + 写库）
+- 仅写库耗时：Storage._save_project_structure（executemany）
+  与逐行 execute 的旧写法对比（在回滚的事务中执行，不留下数据）
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_import_yaml.py
+"""
+import yaml
+
+from common import setup_temp_data_dir, build_project, timeit
+
+setup_temp_data_dir()
+
+from knowledge_dag.services import ExportService  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (5, 10, 10),
+    (10, 10, 20),
+    (20, 10, 25),
+    (40, 10, 25),
+]
+
+
+def make_yaml(chapters: int, sections: int, nodes: int) -> str:
+    """生成与导出格式一致的 YAML 文本"""
+    project = build_project("bench", chapters, sections, nodes)
+    data = {
+        "project": {"id": project.id, "name": project.name},
+        "chapters": [
+            {
+                "id": chapter.id,
+                "name": chapter.name,
+                "sections": [
+                    {
+                        "id": section.id,
+                        "name": section.name,
+                        "nodes": [
+                            {"id": node.id, "name": node.name, "content": node.content,
+                             "position": node.position, "x": node.x, "y": node.y}
+                            for node in section.nodes
+                        ],
+                    }
+                    for section in chapter.sections
+                ],
+            }
+            for chapter in project.chapters
+        ],
+        "edges": [{"source": e.source, "target": e.target} for e in project.edges],
+    }
+    return yaml.dump(data, allow_unicode=True, sort_keys=False)
+
+
+def save_row_by_row(cursor, project) -> None:
+    """旧写法：每一行调用一次 cursor.execute"""
+    rows = storage._project_rows(project)
+    for table, key_columns, value_columns in storage._DELTA_TABLES:
+        columns = ('project_id',) + key_columns + value_columns
+        sql = (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        for key, value in rows[table].items():
+            cursor.execute(sql, (project.id,) + key + value)
+
+
+def time_write(writer, project) -> float:
+    """在回滚的事务中执行写入，返回最小耗时（毫秒）"""
+    def run():
+        with storage._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute(
+                "INSERT INTO projects (id, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (project.id, project.name, project.created_at, project.updated_at)
+            )
+            writer(cursor, project)
+            conn.rollback()
+    best, _ = timeit(run, repeat=3)
+    return best
+
+
+def main():
+    print(f"{'nodes':>8} {'edges':>8} {'import ms':>10} {'row-by-row ms':>14} {'executemany ms':>15} {'speedup':>8}")
+    for chapters, sections, nodes in SIZES:
+        content = make_yaml(chapters, sections, nodes)
+        import_ms, _ = timeit(lambda: ExportService.import_from_yaml(content), repeat=1)
+        project = build_project("bench_write", chapters, sections, nodes)
+        legacy_ms = time_write(save_row_by_row, project)
+        batched_ms = time_write(storage._save_project_structure, project)
+        print(f"{chapters * sections * nodes:>8} {len(project.edges):>8} {import_ms:>10.1f} "
+              f"{legacy_ms:>14.1f} {batched_ms:>15.1f} {legacy_ms / batched_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""分层布局基准：layered_layout 耗时与质量 vs 节点数
+
+两类输入：
+    - book：build_project 生成的合成书籍（边指向后面不远的节点，类似真实的前置关系）
+    - random：随机 DAG（每节点 2 条边，章节分组与边无关，是较差的情况）
+报告布局耗时、层数、长边拐点数，以及重心排序前后的边交叉数。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_layout.py
+"""
+import random
+import time
+
+from common import setup_temp_data_dir, build_project
+from bench_add_edge import random_dag_edges
+
+setup_temp_data_dir()
+
+from knowledge_dag.graph import CompactGraph  # noqa: E402
+from knowledge_dag.layout import layered_layout  # noqa: E402
+
+NODE_COUNTS = [500, 1_000, 2_000, 5_000]
+SECTION_SIZE = 20
+SECTIONS_PER_CHAPTER = 5
+
+
+def book_case(nodes: int):
+    chapters = nodes // (SECTION_SIZE * SECTIONS_PER_CHAPTER)
+    project = build_project("bench", chapters, SECTIONS_PER_CHAPTER, SECTION_SIZE, edges_per_node=2)
+    groups = {node.id: (c, s, k) for c, chapter in enumerate(project.chapters)
+              for s, section in enumerate(chapter.sections) for k, node in enumerate(section.nodes)}
+    return CompactGraph.from_project(project), groups
+
+
+def random_case(nodes: int, rng: random.Random):
+    node_ids = [f"n{i}" for i in range(nodes)]
+    graph = CompactGraph.from_edges(node_ids, random_dag_edges(nodes, nodes * 2, rng))
+    section_count = SECTION_SIZE * SECTIONS_PER_CHAPTER
+    groups = {node: (i // section_count, i // SECTION_SIZE % SECTIONS_PER_CHAPTER, i % SECTION_SIZE)
+              for i, node in enumerate(node_ids)}
+    return graph, groups
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'input':>7} {'nodes':>6} {'edges':>6} {'layout ms':>10} {'layers':>7} {'bent edges':>11} "
+          f"{'crossings (initial -> final)':>29}")
+    for name in ("book", "random"):
+        for nodes in NODE_COUNTS:
+            graph, groups = book_case(nodes) if name == "book" else random_case(nodes, rng)
+            initial = layered_layout(graph, groups, sweeps=0)["crossings"]
+            start = time.perf_counter()
+            layout = layered_layout(graph, groups)
+            elapsed = (time.perf_counter() - start) * 1000
+            crossings = f"{initial} -> {layout['crossings']}"
+            print(f"{name:>7} {len(graph):>6} {graph.edge_count:>6} {elapsed:>10.1f} {layout['layer_count']:>7} "
+                  f"{len(layout['bends']):>11} {crossings:>29}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""项目加载基准：Storage._load_project 的耗时随项目规模的变化
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_load_project.py
+"""
+from common import setup_temp_data_dir, build_project, timeit
+
+setup_temp_data_dir()
+
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (5, 5, 5),
+    (10, 10, 5),
+    (40, 10, 5),
+    (40, 10, 20),
+    (100, 10, 20),
+]
+
+
+def main():
+    print(f"{'chapters':>8} {'sections':>8} {'nodes':>8} {'edges':>8} {'min ms':>10} {'avg ms':>10} "
+          f"{'cached ms':>10}")
+    for idx, (chapters, sections, nodes) in enumerate(SIZES):
+        project = build_project(f"bench_{idx}", chapters, sections, nodes)
+        storage.add(project)
+        best, avg = timeit(lambda: storage._load_project(project.id))
+        # 缓存命中（只读共享对象）：只有一次版本校验查询
+        cached, _ = timeit(lambda: storage.get(project.id, copy=False))
+        print(f"{chapters:>8} {chapters * sections:>8} {chapters * sections * nodes:>8} "
+              f"{len(project.edges):>8} {best:>10.2f} {avg:>10.2f} {cached:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
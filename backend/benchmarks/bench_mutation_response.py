@@ -0,0 +1,75 @@
+"""修改类接口响应基准：返回整个项目 vs 只返回变更（Prefer: return=minimal）
+
+对不同规模的项目，通过 TestClient 反复执行两种典型修改，报告平均延迟和响应体大小：
+    - 拖拽节点（PUT /nodes/position，单行几何更新）
+    - 编辑节点内容（PUT /nodes/{id}，走完整的差量保存）
+默认模式下响应是整个项目（含所有节点的 content），delta 模式下只有变化的行。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_mutation_response.py
+"""
+import time
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (5, 4, 10),
+    (10, 10, 20),
+    (20, 10, 50),
+]
+REPEAT = 20
+MINIMAL = {"Prefer": "return=minimal"}
+
+
+def measure(client, method, url, payloads, headers):
+    """返回 (平均延迟 ms, 平均响应字节数)"""
+    total_bytes = 0
+    start = time.perf_counter()
+    for payload in payloads:
+        response = client.request(method, url, json=payload, headers=headers)
+        response.raise_for_status()
+        total_bytes += len(response.content)
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed / len(payloads), total_bytes / len(payloads)
+
+
+def main():
+    projects = []
+    for chapters, sections, nodes in SIZES:
+        project = build_project(f"bench_{chapters}_{sections}_{nodes}", chapters, sections, nodes,
+                                content_size=512)
+        storage.add(project)
+        projects.append(project)
+
+    print(f"{'nodes':>6} {'operation':>9} {'full ms':>8} {'delta ms':>9} {'full KB':>9} {'delta B':>8}")
+    with TestClient(app) as client:
+        for project in projects:
+            base = f"{settings.api_prefix}/projects/{project.id}"
+            node = project.chapters[0].sections[0].nodes[0]
+            node_count = sum(len(s.nodes) for c in project.chapters for s in c.sections)
+            cases = [
+                ("drag", "PUT", f"{base}/nodes/position",
+                 lambda i: {"node_id": node.id, "section_id": "sec_0_0", "x": float(i), "y": 1.0}),
+                ("edit", "PUT", f"{base}/nodes/{node.id}",
+                 lambda i: {"content": f"notes {i}"}),
+            ]
+            for name, method, url, payload in cases:
+                payloads = [payload(i) for i in range(REPEAT)]
+                measure(client, method, url, payloads[:2], None)
+                full_ms, full_bytes = measure(client, method, url, payloads, None)
+                delta_ms, delta_bytes = measure(client, method, url, payloads, MINIMAL)
+                print(f"{node_count:>6} {name:>9} {full_ms:>8.2f} {delta_ms:>9.2f} "
+                      f"{full_bytes / 1024:>9.1f} {delta_bytes:>8.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
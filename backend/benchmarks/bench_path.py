@@ -0,0 +1,84 @@
+"""两点路径查询基准：best_path（CSR 图）vs networkx
+
+对 1 万 ~ 10 万条边的随机 DAG，随机选取可达的节点对，报告每次查询的平均耗时：
+    - 不带权最短路径：广度优先搜索 vs networkx.shortest_path
+    - 带权最短路径：子图拓扑序动态规划 vs networkx.dijkstra_path
+    - 带权最长路径：子图拓扑序动态规划 vs networkx.dag_longest_path（在两点之间的子图上）
+CSR 图和边权在服务中按项目版本缓存，这里只构建一次，不计入查询耗时。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_path.py
+"""
+import random
+import time
+
+from common import setup_temp_data_dir
+from bench_add_edge import random_dag_edges
+
+setup_temp_data_dir()
+
+import networkx as nx  # noqa: E402
+
+from knowledge_dag.graph import CompactGraph, best_path, label_weights  # noqa: E402
+
+# (节点数, 边数)
+SIZES = [
+    (2_500, 10_000),
+    (12_500, 50_000),
+    (25_000, 100_000),
+]
+QUERIES = 20
+
+
+def per_query_ms(func, pairs):
+    start = time.perf_counter()
+    for source, target in pairs:
+        func(source, target)
+    return (time.perf_counter() - start) * 1000 / len(pairs)
+
+
+def networkx_longest(graph, source, target):
+    between = (nx.descendants(graph, source) & nx.ancestors(graph, target)) | {source, target}
+    return nx.dag_longest_path(graph.subgraph(between), weight="weight", default_weight=1)
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'edges':>7} {'impl':>9} {'bfs ms':>8} {'weighted ms':>12} {'longest ms':>11}")
+    for nodes, edges in SIZES:
+        node_ids = [f"n{i}" for i in range(nodes)]
+        edge_list = random_dag_edges(nodes, edges, rng)
+        labels = [(s, t, str(rng.randint(1, 9)) if rng.random() < 0.5 else "") for s, t in edge_list]
+
+        graph = CompactGraph.from_edges(node_ids, edge_list)
+        weights = label_weights(graph, labels)
+        nx_graph = nx.DiGraph()
+        nx_graph.add_nodes_from(node_ids)
+        for source, target, label in labels:
+            nx_graph.add_edge(source, target, weight=float(label) if label else 1.0)
+
+        # 随机可达节点对：起点靠前、终点在它的后代中
+        pairs = []
+        while len(pairs) < QUERIES:
+            source = rng.choice(node_ids[:nodes // 4])
+            descendants = graph.descendants(source)
+            if descendants:
+                pairs.append((source, rng.choice(descendants)))
+
+        cases = [
+            ("networkx",
+             lambda s, t: nx.shortest_path(nx_graph, s, t),
+             lambda s, t: nx.dijkstra_path(nx_graph, s, t),
+             lambda s, t: networkx_longest(nx_graph, s, t)),
+            ("compact",
+             lambda s, t: best_path(graph, s, t),
+             lambda s, t: best_path(graph, s, t, weights=weights),
+             lambda s, t: best_path(graph, s, t, longest=True, weights=weights)),
+        ]
+        for name, bfs, weighted, longest in cases:
+            print(f"{edges:>7} {name:>9} {per_query_ms(bfs, pairs):>8.2f} "
+                  f"{per_query_ms(weighted, pairs):>12.2f} {per_query_ms(longest, pairs):>11.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
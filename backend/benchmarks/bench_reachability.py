@@ -0,0 +1,84 @@
+"""闭包索引基准：ReachabilityIndex vs 每次查询时 networkx 的 ancestors/descendants
+
+对不同规模的合成项目报告：
+    - 索引构建耗时与内存占用
+    - 单次祖先+后代查询耗时（索引查找并展开 vs 重建 DiGraph 后搜索）
+    - 增量更新（加边、删边）的耗时
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_reachability.py
+"""
+import random
+import time
+
+from common import setup_temp_data_dir, build_project, timeit
+
+setup_temp_data_dir()
+
+import networkx as nx  # noqa: E402
+
+from knowledge_dag.graph import CycleError, DynamicDAG, ReachabilityIndex  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (10, 10, 10),
+    (40, 10, 10),
+    (100, 10, 10),
+]
+QUERIES = 50
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'nodes':>7} {'edges':>7} {'build ms':>9} {'memory MB':>10} {'query us':>9} "
+          f"{'networkx ms':>12} {'add edge ms':>12} {'del edge ms':>12}")
+    for chapters, sections, nodes in SIZES:
+        project = build_project("bench", chapters, sections, nodes, edges_per_node=2)
+        node_ids = [n.id for c in project.chapters for s in c.sections for n in s.nodes]
+        edges = [(e.source, e.target) for e in project.edges]
+
+        start = time.perf_counter()
+        index = ReachabilityIndex.from_project(project)
+        build_ms = (time.perf_counter() - start) * 1000
+        memory_mb = index.memory_bytes() / 1024 / 1024
+
+        focus = rng.sample(node_ids, QUERIES)
+        start = time.perf_counter()
+        for node in focus:
+            index.ancestors(node)
+            index.descendants(node)
+        query_us = (time.perf_counter() - start) * 1e6 / QUERIES
+
+        def legacy(node):
+            graph = nx.DiGraph()
+            graph.add_nodes_from(node_ids)
+            graph.add_edges_from(edges)
+            nx.ancestors(graph, node)
+            nx.descendants(graph, node)
+        legacy_ms, _ = timeit(lambda: legacy(focus[0]), repeat=3)
+
+        # 增量更新：随机挑选不会成环的新边，以及随机删除已有边
+        dag = DynamicDAG.from_project(project)
+        candidates = []
+        while len(candidates) < 20:
+            source, target = rng.sample(node_ids, 2)
+            try:
+                if dag.add_edge(source, target):
+                    candidates.append((source, target))
+            except CycleError:
+                pass
+        start = time.perf_counter()
+        for source, target in candidates:
+            index = index.with_edge_added(source, target)
+        add_ms = (time.perf_counter() - start) * 1000 / len(candidates)
+        start = time.perf_counter()
+        for source, target in rng.sample(edges, 20):
+            index = index.with_edge_removed(source, target)
+        remove_ms = (time.perf_counter() - start) * 1000 / 20
+
+        print(f"{len(node_ids):>7} {len(edges):>7} {build_ms:>9.1f} {memory_mb:>10.2f} {query_us:>9.1f} "
+              f"{legacy_ms:>12.2f} {add_ms:>12.2f} {remove_ms:>12.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""项目骨架基准：笔记较长时 GET /projects/{id} vs /skeleton vs ?fields=
+
+对不同规模、每个节点带 4KB 笔记的项目，分别在项目缓存命中（热）和清空缓存（冷）时
+读取完整项目、骨架和只含名称的字段选择，报告平均延迟和响应体大小；
+最后报告批量获取 50 个节点内容的耗时。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_skeleton.py
+"""
+import time
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (5, 4, 10),
+    (10, 10, 20),
+    (20, 10, 50),
+]
+CONTENT_SIZE = 4096
+REPEAT = 10
+BATCH = 50
+NAMES_ONLY = "name,version,edges,chapters.name,chapters.sections.name,chapters.sections.nodes.name"
+
+
+def measure(client, url, params=None, cold=False):
+    """返回 (平均延迟 ms, 响应字节数)；cold 为真时每次请求前清空项目缓存"""
+    size = 0
+    elapsed = 0.0
+    for _ in range(REPEAT):
+        if cold:
+            storage.cache.clear()
+        start = time.perf_counter()
+        response = client.get(url, params=params)
+        elapsed += time.perf_counter() - start
+        assert response.status_code == 200, response.text
+        size = len(response.content)
+    return elapsed * 1000 / REPEAT, size
+
+
+def main():
+    projects = []
+    for chapters, sections, nodes in SIZES:
+        project = build_project(f"bench_{chapters}_{sections}_{nodes}", chapters, sections, nodes,
+                                content_size=CONTENT_SIZE)
+        storage.add(project)
+        projects.append((chapters * sections * nodes, project))
+
+    print(f"{CONTENT_SIZE} B of content per node")
+    print(f"{'nodes':>6} {'cache':>5} {'full ms':>8} {'skel ms':>8} {'names ms':>9} "
+          f"{'full KB':>9} {'skel KB':>8} {'names KB':>9}")
+    with TestClient(app) as client:
+        for node_count, project in projects:
+            url = f"{settings.api_prefix}/projects/{project.id}"
+            for cold in (True, False):
+                full_ms, full_bytes = measure(client, url, cold=cold)
+                skel_ms, skel_bytes = measure(client, f"{url}/skeleton", cold=cold)
+                names_ms, names_bytes = measure(client, url, {"fields": NAMES_ONLY}, cold=cold)
+                print(f"{node_count:>6} {'cold' if cold else 'warm':>5} {full_ms:>8.2f} {skel_ms:>8.2f} "
+                      f"{names_ms:>9.2f} {full_bytes / 1024:>9.1f} {skel_bytes / 1024:>8.1f} "
+                      f"{names_bytes / 1024:>9.1f}", flush=True)
+
+            node_ids = [node.id for chapter in project.chapters for section in chapter.sections
+                        for node in section.nodes][:BATCH]
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                response = client.post(f"{url}/nodes/contents", json={"node_ids": node_ids})
+                assert len(response.json()["contents"]) == len(node_ids)
+            print(f"{'':>6} {BATCH} node contents: {(time.perf_counter() - start) * 1000 / REPEAT:.2f} ms",
+                  flush=True)
+
+
+if __name__ == "__main__":
+    main()
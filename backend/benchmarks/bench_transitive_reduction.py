@@ -0,0 +1,51 @@
+"""传递归约基准：redundant_edges（逆拓扑序位集）vs networkx.transitive_reduction
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_transitive_reduction.py
+"""
+import random
+
+from common import setup_temp_data_dir, timeit
+from bench_add_edge import random_dag_edges
+
+setup_temp_data_dir()
+
+import networkx as nx  # noqa: E402
+
+from knowledge_dag.graph import CompactGraph, redundant_edges  # noqa: E402
+
+# (节点数, 边数)
+SIZES = [
+    (2_500, 10_000),
+    (12_500, 50_000),
+    (25_000, 100_000),
+]
+# networkx 的实现对每个节点做一次 DFS 并保存所有后代集合，10 万条边时耗时和内存都不可接受
+NETWORKX_MAX_EDGES = 50_000
+
+
+def networkx_redundant(node_ids, edges):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(node_ids)
+    graph.add_edges_from(edges)
+    return set(graph.edges()) - set(nx.transitive_reduction(graph).edges())
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'nodes':>7} {'edges':>7} {'redundant':>10} {'bitset ms':>10} {'networkx ms':>12}")
+    for nodes, edges in SIZES:
+        node_ids = [f"n{i}" for i in range(nodes)]
+        edge_list = random_dag_edges(nodes, edges, rng)
+        graph = CompactGraph.from_edges(node_ids, edge_list)
+        redundant = redundant_edges(graph)
+        bitset_ms, _ = timeit(lambda: redundant_edges(graph), repeat=3)
+        legacy = "-"
+        if edges <= NETWORKX_MAX_EDGES:
+            legacy_ms, _ = timeit(lambda: networkx_redundant(node_ids, edge_list), repeat=1)
+            legacy = f"{legacy_ms:.1f}"
+        print(f"{nodes:>7} {edges:>7} {len(redundant):>10} {bitset_ms:>10.1f} {legacy:>12}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""视口查询基准：GET /projects/{id}/viewport（R*Tree）vs 完整获取项目后在内存中过滤
+
+章节按网格排列在画布上，每个章节中的部分和节点都有坐标。对不同规模的项目，
+用一个约能容纳 4 个章节的视口矩形随机查询，报告平均延迟和响应体大小；
+同时报告单个章节接口的耗时，以及拖拽节点/章节时维护几何索引后的写入耗时。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_viewport.py
+"""
+import random
+import time
+
+from common import setup_temp_data_dir, build_project
+
+setup_temp_data_dir()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_dag.config import settings  # noqa: E402
+from knowledge_dag.main import app  # noqa: E402
+from knowledge_dag.storage import storage  # noqa: E402
+
+# (章节数, 每章部分数, 每部分节点数)
+SIZES = [
+    (10, 4, 10),
+    (50, 10, 20),
+    (100, 10, 50),
+]
+GRID_COLUMNS = 10
+CHAPTER_SIZE = (1200.0, 1000.0)
+VIEWPORT = (2400.0, 2000.0)
+REPEAT = 20
+
+
+def lay_out(project):
+    """章节按网格排列，部分按 5 列排列在章节内，节点按 5 列排列在部分内"""
+    chapter_w, chapter_h = CHAPTER_SIZE
+    for c, chapter in enumerate(project.chapters):
+        chapter.x = (c % GRID_COLUMNS) * chapter_w
+        chapter.y = (c // GRID_COLUMNS) * chapter_h
+        chapter.width, chapter.height = chapter_w - 50, chapter_h - 50
+        for s, section in enumerate(chapter.sections):
+            section.x, section.y = (s % 5) * 220.0, (s // 5) * 450.0
+            section.width, section.height = 200.0, 430.0
+            for n, node in enumerate(section.nodes):
+                node.x, node.y = (n % 5) * 40.0, (n // 5) * 40.0
+                node.width, node.height = 36.0, 36.0
+
+
+def in_viewport(project, x0, y0, x1, y1):
+    """不使用索引时的做法：遍历整个项目，计算每个节点的项目坐标"""
+    hits = []
+    for chapter in project["chapters"]:
+        for section in chapter["sections"]:
+            sx, sy = chapter["x"] + section["x"], chapter["y"] + section["y"]
+            for node in section["nodes"]:
+                nx, ny = sx + node["x"], sy + node["y"]
+                if nx <= x1 and nx + node["width"] >= x0 and ny <= y1 and ny + node["height"] >= y0:
+                    hits.append(node["id"])
+    return hits
+
+
+def main():
+    rnd = random.Random(0)
+    projects = []
+    for chapters, sections, nodes in SIZES:
+        project = build_project(f"bench_{chapters}_{sections}_{nodes}", chapters, sections, nodes,
+                                edges_per_node=2, content_size=64)
+        lay_out(project)
+        storage.add(project)
+        projects.append((chapters * sections * nodes, project))
+
+    print(f"{'nodes':>6} {'hits':>5} {'full ms':>8} {'view ms':>8} {'full KB':>9} {'view KB':>8} "
+          f"{'chapter ms':>11} {'drag node ms':>13} {'drag ch ms':>11}")
+    with TestClient(app) as client:
+        for node_count, project in projects:
+            url = f"{settings.api_prefix}/projects/{project.id}"
+            rows = (len(project.chapters) + GRID_COLUMNS - 1) // GRID_COLUMNS
+            width = min(GRID_COLUMNS, len(project.chapters)) * CHAPTER_SIZE[0]
+            height = rows * CHAPTER_SIZE[1]
+            boxes = []
+            for _ in range(REPEAT):
+                x0 = rnd.uniform(0, max(width - VIEWPORT[0], 0))
+                y0 = rnd.uniform(0, max(height - VIEWPORT[1], 0))
+                boxes.append((x0, y0, x0 + VIEWPORT[0], y0 + VIEWPORT[1]))
+
+            full_bytes = view_bytes = hits = 0
+            start = time.perf_counter()
+            for box in boxes:
+                response = client.get(url)
+                full_bytes = len(response.content)
+                hits = len(in_viewport(response.json(), *box))
+            full_ms = (time.perf_counter() - start) * 1000 / REPEAT
+
+            start = time.perf_counter()
+            for box in boxes:
+                response = client.get(f"{url}/viewport", params=dict(zip(("x0", "y0", "x1", "y1"), box)))
+                view_bytes = len(response.content)
+            view_ms = (time.perf_counter() - start) * 1000 / REPEAT
+
+            start = time.perf_counter()
+            for i in range(REPEAT):
+                client.get(f"{url}/chapters/{project.chapters[i % len(project.chapters)].id}")
+            chapter_ms = (time.perf_counter() - start) * 1000 / REPEAT
+
+            minimal = {"Prefer": "return=minimal"}
+            start = time.perf_counter()
+            for i in range(REPEAT):
+                client.put(f"{url}/nodes/position", json={
+                    "node_id": "node_0_0_0", "section_id": "sec_0_0", "x": float(i), "y": 0.0
+                }, headers=minimal)
+            node_drag_ms = (time.perf_counter() - start) * 1000 / REPEAT
+
+            start = time.perf_counter()
+            for i in range(REPEAT):
+                client.put(f"{url}/chapters/position", json={"chapter_id": "ch_0", "x": float(i), "y": 0.0},
+                           headers=minimal)
+            chapter_drag_ms = (time.perf_counter() - start) * 1000 / REPEAT
+
+            print(f"{node_count:>6} {hits:>5} {full_ms:>8.2f} {view_ms:>8.2f} {full_bytes / 1024:>9.1f} "
+                  f"{view_bytes / 1024:>8.1f} {chapter_ms:>11.2f} {node_drag_ms:>13.2f} {chapter_drag_ms:>11.2f}",
+                  flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""基准测试公共工具
+
+所有基准脚本都在临时目录中创建独立数据库，不会触碰 backend/knowledge_dag.db。
+必须在导入 knowledge_dag 之前调用 setup_temp_data_dir()。
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_temp_data_dir() -> Path:
+    """将 DATA_FILE 指向临时目录，并把 backend 目录加入 sys.path"""
+    temp_dir = Path(tempfile.mkdtemp(prefix="knowledge_dag_bench_"))
+    os.environ["DATA_FILE"] = str(temp_dir / "projects_data.json")
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    return temp_dir
+
+
+def build_project(project_id: str, chapters: int, sections_per_chapter: int,
+                  nodes_per_section: int, edges_per_node: int = 2, content_size: int = 64):
+    """生成一个合成项目（边只从前面的节点指向后面的节点，保证无环）"""
+    from knowledge_dag.models import Project, Chapter, Section, Node, Edge
+
+    now = "2024-01-01T00:00:00"
+    chapter_list = []
+    node_ids: List[str] = []
+    for c in range(chapters):
+        section_list = []
+        for s in range(sections_per_chapter):
+            nodes = []
+            for n in range(nodes_per_section):
+                node_id = f"node_{c}_{s}_{n}"
+                node_ids.append(node_id)
+                nodes.append(Node(id=node_id, name=node_id, content="x" * content_size,
+                                  position=float(n), x=float(n * 10), y=float(s * 10)))
+            section_list.append(Section(id=f"sec_{c}_{s}", name=f"S{c}.{s}", nodes=nodes))
+        chapter_list.append(Chapter(id=f"ch_{c}", name=f"C{c}", sections=section_list))
+
+    edges = []
+    total = len(node_ids)
+    for i in range(total):
+        for k in range(1, edges_per_node + 1):
+            j = i + k * 7
+            if j < total:
+                edges.append(Edge(source=node_ids[i], target=node_ids[j]))
+
+    return Project(id=project_id, name=project_id, created_at=now, updated_at=now,
+                   chapters=chapter_list, edges=edges)
+
+
+def timeit(func: Callable[[], object], repeat: int = 5) -> Tuple[float, float]:
+    """返回 (最小耗时, 平均耗时)，单位毫秒"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples), sum(samples) / len(samples)
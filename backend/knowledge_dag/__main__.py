@@ -1,13 +1,120 @@
-"""允许使用 python -m knowledge_dag 运行应用"""
-from knowledge_dag.main import app
-import uvicorn
-from knowledge_dag.config import settings
+"""允许使用 python -m knowledge_dag 运行应用
 
-if __name__ == "__main__":
+    python -m knowledge_dag                            启动 API 服务
+    python -m knowledge_dag migrate [--status]         执行数据库结构迁移
+    python -m knowledge_dag sweep-orphans [--dry-run]  清理孤儿数据
+    python -m knowledge_dag reduce-edges PROJECT_ID [--dry-run]  删除传递归约中的冗余边
+    python -m knowledge_dag compact-changes [PROJECT_ID] [--keep N] [--retention-days D]  压缩变更日志
+"""
+import argparse
+import sys
+
+
+def _serve(args) -> int:
+    import uvicorn
+    from knowledge_dag.main import app
+    from knowledge_dag.config import settings
     uvicorn.run(
         app,
         host=settings.host,
         port=settings.port,
         reload=settings.reload
     )
+    return 0
+
+
+def _migrate(args) -> int:
+    # 直接打开数据库执行迁移，不经过 Storage（避免导入时的自动迁移）
+    import sqlite3
+    from knowledge_dag import migrations
+    from knowledge_dag.config import settings
+    
+    conn = sqlite3.connect(settings.db_path)
+    try:
+        current = migrations.get_schema_version(conn)
+        pending = migrations.pending_migrations(conn)
+        print(f"Database: {settings.db_path}")
+        print(f"Schema version: {current} (latest: {migrations.LATEST_VERSION})")
+        if args.status:
+            for version, name, _ in pending:
+                print(f"  pending {version}: {name}")
+            return 0
+        applied = migrations.migrate(conn)
+        if applied:
+            for name in applied:
+                print(f"  applied {name}")
+        else:
+            print("Schema is up to date")
+        return 0
+    finally:
+        conn.close()
+
+
+def _sweep_orphans(args) -> int:
+    from knowledge_dag.storage import storage
+    counts = storage.sweep_orphans(dry_run=args.dry_run)
+    action = "Would delete" if args.dry_run else "Deleted"
+    for table, count in counts.items():
+        print(f"{action} {count} orphaned row(s) from {table}")
+    return 0
+
 
+def _reduce_edges(args) -> int:
+    from fastapi import HTTPException
+    from knowledge_dag.services import GraphService
+    try:
+        report = GraphService.transitive_reduction(args.project_id, dry_run=args.dry_run)
+    except HTTPException as e:
+        print(f"Error: {e.detail}", file=sys.stderr)
+        return 1
+    action = "Would remove" if args.dry_run else "Removed"
+    print(f"{action} {report.redundant_count} of {report.edge_count} edge(s)")
+    if args.verbose:
+        for edge in report.redundant_edges:
+            print(f"  {edge.source} -> {edge.target}" + (f"  [{edge.label}]" if edge.label else ""))
+    return 0
+
+
+def _compact_changes(args) -> int:
+    from knowledge_dag.storage import storage
+    counts = storage.compact_changes(args.project_id, keep=args.keep, retention_days=args.retention_days)
+    print(f"Compacted change log of {counts['projects']} project(s): "
+          f"merged {counts['merged']} entr(ies), expired {counts['expired']} entr(ies)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m knowledge_dag")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    serve_parser = subparsers.add_parser("serve", help="启动 API 服务（默认）")
+    serve_parser.set_defaults(func=_serve)
+    
+    migrate_parser = subparsers.add_parser("migrate", help="执行数据库结构迁移")
+    migrate_parser.add_argument("--status", action="store_true", help="只显示当前版本和待执行的步骤")
+    migrate_parser.set_defaults(func=_migrate)
+    
+    sweep_parser = subparsers.add_parser("sweep-orphans", help="清理项目删除后遗留的章节/部分/节点/边")
+    sweep_parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+    sweep_parser.set_defaults(func=_sweep_orphans)
+    
+    reduce_parser = subparsers.add_parser("reduce-edges", help="删除项目中的冗余边（传递归约）")
+    reduce_parser.add_argument("project_id", help="项目ID")
+    reduce_parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+    reduce_parser.add_argument("-v", "--verbose", action="store_true", help="列出每条冗余边")
+    reduce_parser.set_defaults(func=_reduce_edges)
+    
+    compact_parser = subparsers.add_parser("compact-changes", help="删除过期的变更日志并合并较早的条目")
+    compact_parser.add_argument("project_id", nargs="?", help="项目ID（默认处理所有项目）")
+    compact_parser.add_argument("--keep", type=int, help="每个项目保留的未合并条目数（默认 CHANGE_LOG_MAX_ENTRIES）")
+    compact_parser.add_argument("--retention-days", type=int, help="保留天数，0 表示不按时间清理（默认 CHANGE_LOG_RETENTION_DAYS）")
+    compact_parser.set_defaults(func=_compact_changes)
+    
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        args.func = _serve
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
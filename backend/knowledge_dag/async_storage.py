@@ -0,0 +1,119 @@
+"""异步存储门面
+
+SQLite 的写入天然是串行的：多个线程同时写只会在 busy_timeout 上互相等待。
+AsyncStorage 因此使用一个专用写线程执行所有写操作，读操作则交给读线程池
+（借助 WAL 与写操作并行），事件循环本身从不执行阻塞的数据库 I/O。
+
+除了与 Storage 同名的异步方法，还提供 run_read / run_write，
+用于把包含“读取-修改-保存”的整段服务逻辑作为一个单元投递到对应线程：
+写入单元在写线程上依次执行，不会再出现两个请求同时修改同一项目导致的覆盖丢失。
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from knowledge_dag.config import settings
+from knowledge_dag.models import Project
+from knowledge_dag.storage import Storage, storage
+
+T = TypeVar("T")
+
+
+class AsyncStorage:
+    """Storage 的异步包装（单写线程 + 读线程池）"""
+
+    def __init__(self, storage: Storage, readers: Optional[int] = None):
+        self.storage = storage
+        # 写线程固定占用一个连接，其余连接留给读线程
+        readers = readers or max(1, settings.db_pool_size - 1)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge-dag-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="knowledge-dag-reader")
+        self._lock = threading.Lock()
+        self.pending_writes = 0
+        self.writes = 0
+
+    async def run_read(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在读线程池中执行只读操作"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, partial(func, *args, **kwargs))
+
+    async def run_write(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在写线程中执行写操作（按提交顺序串行执行）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.pending_writes += 1
+        try:
+            return await loop.run_in_executor(self._writer, partial(func, *args, **kwargs))
+        finally:
+            with self._lock:
+                self.pending_writes -= 1
+                self.writes += 1
+
+    def close(self) -> None:
+        """等待已提交的写操作完成后关闭线程与连接池"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.storage.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        """存储层运行指标（附带写队列状态）"""
+        stats = self.storage.stats()
+        with self._lock:
+            stats["writer"] = {"pending": self.pending_writes, "completed": self.writes}
+        return stats
+
+    # ---- 只读操作 ----
+
+    async def get(self, project_id: str, copy: bool = True) -> Project:
+        return await self.run_read(self.storage.get, project_id, copy=copy)
+
+    async def get_all(self) -> Dict[str, Project]:
+        return await self.run_read(self.storage.get_all)
+
+    async def get_version(self, project_id: str) -> Optional[int]:
+        return await self.run_read(self.storage.get_version, project_id)
+
+    async def count(self) -> int:
+        return await self.run_read(self.storage.count)
+
+    async def list_summaries(self, *args, **kwargs) -> List[Dict]:
+        return await self.run_read(self.storage.list_summaries, *args, **kwargs)
+
+    async def find_node(self, project_id: str, node_id: str,
+                        section_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+        return await self.run_read(self.storage.find_node, project_id, node_id, section_id)
+
+    async def chapter_exists(self, project_id: str, chapter_id: str) -> bool:
+        return await self.run_read(self.storage.chapter_exists, project_id, chapter_id)
+
+    async def exists(self, project_id: str) -> bool:
+        return await self.run_read(self.storage.exists, project_id)
+
+    # ---- 写操作 ----
+
+    async def add(self, project: Project) -> None:
+        return await self.run_write(self.storage.add, project)
+
+    async def update(self, project: Project) -> Dict[str, Dict[str, int]]:
+        return await self.run_write(self.storage.update, project)
+
+    async def delete(self, project_id: str) -> None:
+        return await self.run_write(self.storage.delete, project_id)
+
+    async def update_node_geometry(self, *args, **kwargs) -> bool:
+        return await self.run_write(self.storage.update_node_geometry, *args, **kwargs)
+
+    async def update_section_geometry(self, *args, **kwargs) -> bool:
+        return await self.run_write(self.storage.update_section_geometry, *args, **kwargs)
+
+    async def update_chapter_geometry(self, *args, **kwargs) -> bool:
+        return await self.run_write(self.storage.update_chapter_geometry, *args, **kwargs)
+
+    async def sweep_orphans(self, dry_run: bool = False) -> Dict[str, int]:
+        return await self.run_write(self.storage.sweep_orphans, dry_run)
+
+
+# 全局异步存储实例（与 storage 共享连接池和缓存）
+async_storage = AsyncStorage(storage)
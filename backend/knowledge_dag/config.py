@@ -1,6 +1,7 @@
 """配置管理模块"""
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -25,6 +26,47 @@ class Settings(BaseSettings):
     # 数据存储配置
     data_file: Path = Path(__file__).parent.parent / "projects_data.json"
     
+    # 启动时自动执行数据库结构迁移（关闭后需手动运行 python -m knowledge_dag migrate）
+    db_auto_migrate: bool = True
+    
+    # 数据库连接池配置
+    db_pool_size: int = 8
+    db_pool_timeout: float = 30.0
+    
+    # SQLite 存储配置（每个新连接创建时通过 PRAGMA 应用）
+    db_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"] = "WAL"
+    db_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    db_cache_size: int = -20000  # 负数表示 KiB，即约 20MB 页缓存
+    db_mmap_size: int = 268435456  # 256MB，0 表示禁用内存映射
+    db_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    db_busy_timeout: int = 5000  # 毫秒
+    db_foreign_keys: bool = True
+    
+    # 项目缓存配置（任一为 0 时禁用缓存）
+    project_cache_max_entries: int = 32
+    project_cache_max_bytes: int = 64 * 1024 * 1024
+    
+    # 图谱路径分析限制（graph_analysis 的默认值；完整枚举请使用流式接口）
+    graph_max_paths: int = 1000
+    graph_path_timeout_ms: int = 200
+    
+    # 闭包索引（祖先/后代位集）最多覆盖的节点数，内存约为 节点数² / 4 字节；超出或为 0 时按需搜索
+    graph_reachability_max_nodes: int = 5000
+    # 所有项目的闭包索引合计的内存上限（字节），超出时淘汰最久未用的项目；单个超出上限的闭包不缓存
+    graph_reachability_cache_max_bytes: int = 128 * 1024 * 1024
+    # 批量图谱分析在没有闭包索引（或限制了深度）时每个焦点都要搜索一遍，整批最多允许的焦点数
+    graph_batch_max_search_nodes: int = 500
+    
+    # 变更日志（GET /projects/{id}/changes）：每个项目最多保留的条目数，超出时把较早的条目合并为一条；为 0 时不记录
+    change_log_max_entries: int = 1000
+    # 变更日志保留天数，合并或运行 compact-changes 时删除更早的条目（为 0 时不按时间清理）
+    change_log_retention_days: int = 30
+    
+    @property
+    def db_path(self) -> Path:
+        """SQLite 数据库文件路径（与 data_file 位于同一目录）"""
+        return self.data_file.parent / "knowledge_dag.db"
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
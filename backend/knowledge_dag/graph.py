@@ -0,0 +1,1054 @@
+"""图索引模块
+
+DynamicDAG 为项目的边维护一个持久的拓扑序（Pearce–Kelly 动态拓扑排序算法）：
+    - 加入边 u -> v 时，若 u 在拓扑序中已排在 v 之前，无需任何检查；
+    - 否则只在受影响区间 [ord(v), ord(u)] 内做前向/后向搜索，
+      前向搜索到达 u 即说明会形成环，不会形成环时只重排这两个搜索集合。
+单次插入的代价与受影响区域大小成正比，而不是整个图的 O(V+E)。
+
+ReachabilityIndex 是传递闭包的只读快照（每个节点的祖先/后代位集），
+用于 O(1) 的祖先、后代和可达性查询，加边/删边/删节点时以写时复制的方式增量更新。
+
+IndexCache 按项目缓存这些索引，并像 ProjectCache 一样使用项目 version 校验：
+服务层在保存后推进索引版本，其他任何修改都会让版本不一致，下次使用时自动重建。
+
+CompactGraph 是按版本缓存的只读 CSR 图，供整图分析使用，也是闭包索引无法使用时的退路。
+
+iter_paths 等函数用于焦点节点的路径分析：邻居按节点 ID 排序，
+因此路径按确定的先序顺序产生，可以用上一次产生的路径作为游标继续枚举；
+best_path 则只求两点之间的一条最短/最长路径，不做枚举。
+"""
+import hashlib
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from itertools import accumulate
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from knowledge_dag.config import settings
+from knowledge_dag.models import Project
+
+
+class CycleError(ValueError):
+    """加入边后图中会出现环"""
+
+
+class DynamicDAG:
+    """带增量拓扑序的有向无环图"""
+
+    def __init__(self):
+        self.succ: Dict[str, Set[str]] = {}
+        self.pred: Dict[str, Set[str]] = {}
+        # 拓扑序号：只要求边的起点序号小于终点序号，不要求连续
+        self.ord: Dict[str, int] = {}
+        self._next_ord = 0
+
+    @classmethod
+    def from_edges(cls, nodes: Iterable[str], edges: Iterable[Tuple[str, str]]) -> "DynamicDAG":
+        """用 Kahn 算法建立初始拓扑序；图中已存在环时抛出 CycleError"""
+        dag = cls()
+        for node in nodes:
+            dag.add_node(node)
+        for source, target in edges:
+            dag.add_node(source)
+            dag.add_node(target)
+            dag.succ[source].add(target)
+            dag.pred[target].add(source)
+
+        in_degree = {node: len(preds) for node, preds in dag.pred.items()}
+        queue = deque(node for node, degree in in_degree.items() if degree == 0)
+        index = 0
+        while queue:
+            node = queue.popleft()
+            dag.ord[node] = index
+            index += 1
+            for succ in dag.succ[node]:
+                in_degree[succ] -= 1
+                if in_degree[succ] == 0:
+                    queue.append(succ)
+        if index != len(dag.ord):
+            raise CycleError("Graph already contains a cycle")
+        dag._next_ord = index
+        return dag
+
+    @classmethod
+    def from_project(cls, project: Project) -> "DynamicDAG":
+        """从项目的节点和边构建索引"""
+        nodes = (node.id for chapter in project.chapters
+                 for section in chapter.sections for node in section.nodes)
+        return cls.from_edges(nodes, ((edge.source, edge.target) for edge in project.edges))
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.ord
+
+    def __len__(self) -> int:
+        return len(self.ord)
+
+    def has_edge(self, source: str, target: str) -> bool:
+        return target in self.succ.get(source, ())
+
+    def add_node(self, node: str) -> None:
+        """加入节点（新节点排在拓扑序末尾）"""
+        if node not in self.ord:
+            self.ord[node] = self._next_ord
+            self._next_ord += 1
+            self.succ[node] = set()
+            self.pred[node] = set()
+
+    def remove_node(self, node: str) -> None:
+        """删除节点及其所有边（删除不会破坏拓扑序）"""
+        if node not in self.ord:
+            return
+        for succ in self.succ.pop(node):
+            self.pred[succ].discard(node)
+        for pred in self.pred.pop(node):
+            self.succ[pred].discard(node)
+        del self.ord[node]
+
+    def add_edge(self, source: str, target: str) -> bool:
+        """加入边 source -> target
+
+        Returns:
+            边已存在时返回 False
+
+        Raises:
+            CycleError: 加入后会形成环（此时索引保持不变）
+        """
+        if source == target:
+            raise CycleError(f"Self loop on {source}")
+        self.add_node(source)
+        self.add_node(target)
+        if target in self.succ[source]:
+            return False
+
+        lower, upper = self.ord[target], self.ord[source]
+        if lower < upper:
+            forward = self._search_forward(target, upper, source)
+            backward = self._search_backward(source, lower)
+            self._reorder(backward, forward)
+
+        self.succ[source].add(target)
+        self.pred[target].add(source)
+        return True
+
+    def remove_edge(self, source: str, target: str) -> None:
+        """删除边（删除不会破坏拓扑序）"""
+        if source in self.succ:
+            self.succ[source].discard(target)
+        if target in self.pred:
+            self.pred[target].discard(source)
+
+    def _search_forward(self, start: str, upper: int, source: str) -> List[str]:
+        """从 start 出发沿出边搜索序号小于 upper 的节点，到达 source 则说明有环"""
+        visited = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for succ in self.succ[node]:
+                if succ == source:
+                    raise CycleError(f"Edge {source} -> {start} would create a cycle")
+                if succ not in visited and self.ord[succ] < upper:
+                    visited.add(succ)
+                    stack.append(succ)
+        return list(visited)
+
+    def _search_backward(self, start: str, lower: int) -> List[str]:
+        """从 start 出发沿入边搜索序号大于 lower 的节点"""
+        visited = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for pred in self.pred[node]:
+                if pred not in visited and self.ord[pred] > lower:
+                    visited.add(pred)
+                    stack.append(pred)
+        return list(visited)
+
+    def _reorder(self, backward: List[str], forward: List[str]) -> None:
+        """把后向集合整体移到前向集合之前，复用这些节点原有的序号"""
+        key = self.ord.__getitem__
+        backward.sort(key=key)
+        forward.sort(key=key)
+        nodes = backward + forward
+        slots = sorted(self.ord[node] for node in nodes)
+        for node, slot in zip(nodes, slots):
+            self.ord[node] = slot
+
+    def topological_order(self) -> List[str]:
+        """按当前拓扑序返回所有节点"""
+        return sorted(self.ord, key=self.ord.__getitem__)
+
+
+class CompactGraph:
+    """紧凑的只读有向图（CSR 存储）
+
+    节点 ID 按字典序映射为连续整数，正向和反向邻接表分别以 CSR 形式
+    （offsets + targets 两个 int32 数组）保存，邻居天然按节点 ID 排序。
+    相比为每个请求构建 networkx.DiGraph（每个节点/边一个字典），
+    内存占用和构建时间都小得多，也不依赖 networkx。
+    """
+
+    def __init__(self, ids: List[str], out_offsets: array, out_targets: array,
+                 in_offsets: array, in_targets: array):
+        self.ids = ids
+        self.index: Dict[str, int] = {node: i for i, node in enumerate(ids)}
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+
+    @classmethod
+    def from_edges(cls, nodes: Iterable[str], edges: Iterable[Tuple[str, str]]) -> "CompactGraph":
+        """从节点和边构建（边的端点会自动加入节点集合，重复的边只保留一条）"""
+        edge_list = list(edges)
+        id_set = set(nodes)
+        for source, target in edge_list:
+            id_set.add(source)
+            id_set.add(target)
+        ids = sorted(id_set)
+        index = {node: i for i, node in enumerate(ids)}
+        n = len(ids)
+        # 边编码为 source * n + target 的单个整数，排序即按 (起点, 终点) 排序
+        codes = sorted({index[source] * n + index[target] for source, target in edge_list})
+        sources = [code // n for code in codes]
+        targets = [code % n for code in codes]
+
+        out_counts = [0] * (n + 1)
+        in_counts = [0] * (n + 1)
+        for source in sources:
+            out_counts[source + 1] += 1
+        for target in targets:
+            in_counts[target + 1] += 1
+        out_offsets = list(accumulate(out_counts))
+        in_offsets = list(accumulate(in_counts))
+
+        # 边已按起点排序，按终点分桶后每个桶内的起点仍然有序
+        in_targets = [0] * len(codes)
+        cursor = in_offsets[:-1]
+        for source, target in zip(sources, targets):
+            in_targets[cursor[target]] = source
+            cursor[target] += 1
+        return cls(ids, array("i", out_offsets), array("i", targets),
+                   array("i", in_offsets), array("i", in_targets))
+
+    @classmethod
+    def from_project(cls, project: Project) -> "CompactGraph":
+        nodes = (node.id for chapter in project.chapters
+                 for section in chapter.sections for node in section.nodes)
+        return cls.from_edges(nodes, ((edge.source, edge.target) for edge in project.edges))
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.out_targets)
+
+    def successors(self, i: int) -> array:
+        return self.out_targets[self.out_offsets[i]:self.out_offsets[i + 1]]
+
+    def predecessors(self, i: int) -> array:
+        return self.in_targets[self.in_offsets[i]:self.in_offsets[i + 1]]
+
+    def out_degree(self, i: int) -> int:
+        return self.out_offsets[i + 1] - self.out_offsets[i]
+
+    def in_degree(self, i: int) -> int:
+        return self.in_offsets[i + 1] - self.in_offsets[i]
+
+    def successor_ids(self, node: str) -> List[str]:
+        i = self.index.get(node)
+        return [] if i is None else [self.ids[j] for j in self.successors(i)]
+
+    def predecessor_ids(self, node: str) -> List[str]:
+        i = self.index.get(node)
+        return [] if i is None else [self.ids[j] for j in self.predecessors(i)]
+
+    def topological_order(self) -> List[int]:
+        """Kahn 算法拓扑排序，返回节点下标；图中存在环时抛出 CycleError"""
+        n = len(self.ids)
+        in_offsets, out_offsets, out_targets = self.in_offsets, self.out_offsets, self.out_targets
+        in_degree = [in_offsets[i + 1] - in_offsets[i] for i in range(n)]
+        order = [i for i in range(n) if in_degree[i] == 0]
+        head = 0
+        while head < len(order):
+            i = order[head]
+            head += 1
+            for j in out_targets[out_offsets[i]:out_offsets[i + 1]]:
+                in_degree[j] -= 1
+                if in_degree[j] == 0:
+                    order.append(j)
+        if len(order) != n:
+            raise CycleError("Graph contains a cycle")
+        return order
+
+    def is_dag(self) -> bool:
+        try:
+            self.topological_order()
+        except CycleError:
+            return False
+        return True
+
+    def descendants(self, node: str, max_depth: Optional[int] = None) -> List[str]:
+        """广度优先求后代（可限制深度），按距离由近到远排列"""
+        return self._search(self.out_offsets, self.out_targets, node, max_depth)
+
+    def ancestors(self, node: str, max_depth: Optional[int] = None) -> List[str]:
+        """广度优先求祖先（可限制深度），按距离由近到远排列"""
+        return self._search(self.in_offsets, self.in_targets, node, max_depth)
+
+    def _search(self, offsets: array, targets: array, node: str, max_depth: Optional[int]) -> List[str]:
+        start = self.index.get(node)
+        if start is None:
+            return []
+        seen = bytearray(len(self.ids))
+        seen[start] = 1
+        frontier = [start]
+        result = []
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for i in frontier:
+                for j in targets[offsets[i]:offsets[i + 1]]:
+                    if not seen[j]:
+                        seen[j] = 1
+                        next_frontier.append(j)
+            result.extend(next_frontier)
+            frontier = next_frontier
+        ids = self.ids
+        return [ids[i] for i in result]
+
+    def induced_edges(self, nodes: Iterable[str]) -> List[Tuple[str, str]]:
+        """返回两端都在 nodes 中的边"""
+        members = bytearray(len(self.ids))
+        selected = [self.index[node] for node in nodes if node in self.index]
+        for i in selected:
+            members[i] = 1
+        ids = self.ids
+        return [(ids[i], ids[j]) for i in selected for j in self.successors(i) if members[j]]
+
+    def memory_bytes(self) -> int:
+        """图结构本身的内存（不含节点 ID 字符串，它们与项目共享）"""
+        total = sys.getsizeof(self.ids) + sys.getsizeof(self.index)
+        for arr in (self.out_offsets, self.out_targets, self.in_offsets, self.in_targets):
+            total += sys.getsizeof(arr)
+        return total
+
+    def to_networkx(self):
+        """转换为 networkx.DiGraph（可选依赖，仅用于调试或本模块未实现的算法）"""
+        import networkx as nx
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.ids)
+        graph.add_edges_from((self.ids[i], self.ids[j])
+                             for i in range(len(self.ids)) for j in self.successors(i))
+        return graph
+
+
+class ReachabilityIndex:
+    """传递闭包索引（只读快照）
+
+    每个节点分配一个位，祖先/后代集合以位集（Python 整数）保存，
+    祖先、后代和可达性查询只需一次字典查找，结果展开的代价与结果大小成正比。
+    同时保存排序后的邻接表（元组），提供与 CompactGraph 相同的查询接口，供子图和路径枚举直接使用。
+
+    快照发布后不再修改：with_* 方法返回应用了一次修改的新快照（写时复制），
+    读线程可以在写线程更新索引的同时安全地使用旧快照。
+    """
+
+    def __init__(self):
+        self.bit: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        self.desc: Dict[str, int] = {}
+        self.anc: Dict[str, int] = {}
+        self.succ: Dict[str, Tuple[str, ...]] = {}
+        self.pred: Dict[str, Tuple[str, ...]] = {}
+
+    @classmethod
+    def from_graph(cls, graph: CompactGraph) -> "ReachabilityIndex":
+        """按拓扑序一次遍历建立闭包：desc(x) = ∪ (s ∪ desc(s))，s 为 x 的后继
+
+        节点的位就是它在 CompactGraph 中的下标。
+        """
+        order = graph.topological_order()
+        ids = graph.ids
+        n = len(ids)
+        desc = [0] * n
+        anc = [0] * n
+        for i in reversed(order):
+            bits = 0
+            for j in graph.successors(i):
+                bits |= (1 << j) | desc[j]
+            desc[i] = bits
+        for i in order:
+            bits = 0
+            for j in graph.predecessors(i):
+                bits |= (1 << j) | anc[j]
+            anc[i] = bits
+
+        index = cls()
+        index.names = list(ids)
+        index.bit = dict(graph.index)
+        index.desc = dict(zip(ids, desc))
+        index.anc = dict(zip(ids, anc))
+        index.succ = {node: tuple(ids[j] for j in graph.successors(i)) for i, node in enumerate(ids)}
+        index.pred = {node: tuple(ids[j] for j in graph.predecessors(i)) for i, node in enumerate(ids)}
+        return index
+
+    @classmethod
+    def from_project(cls, project: Project) -> "ReachabilityIndex":
+        """从项目构建（项目的边中存在环时抛出 CycleError）"""
+        return cls.from_graph(CompactGraph.from_project(project))
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.bit
+
+    def successor_ids(self, node: str) -> Tuple[str, ...]:
+        return self.succ.get(node, ())
+
+    def predecessor_ids(self, node: str) -> Tuple[str, ...]:
+        return self.pred.get(node, ())
+
+    def ancestors(self, node: str, max_depth: Optional[int] = None) -> List[str]:
+        """祖先节点（直接查位集；限制深度时退回广度优先搜索）"""
+        if max_depth is None:
+            return self._decode(self.anc.get(node, 0))
+        return reachable(self.predecessor_ids, node, max_depth)
+
+    def descendants(self, node: str, max_depth: Optional[int] = None) -> List[str]:
+        """后代节点（直接查位集；限制深度时退回广度优先搜索）"""
+        if max_depth is None:
+            return self._decode(self.desc.get(node, 0))
+        return reachable(self.successor_ids, node, max_depth)
+
+    def induced_edges(self, nodes: Iterable[str]) -> List[Tuple[str, str]]:
+        """返回两端都在 nodes 中的边"""
+        members = set(nodes)
+        return [(source, target) for source in members
+                for target in self.succ.get(source, ()) if target in members]
+
+    def reaches(self, source: str, target: str) -> bool:
+        """source 是否能到达 target"""
+        return target in self.bit and bool(self.desc.get(source, 0) >> self.bit[target] & 1)
+
+    def memory_bytes(self) -> int:
+        """索引占用内存的估算值（位集 + 字典与邻接表本身）"""
+        total = sum(sys.getsizeof(bits) for bits in self.desc.values())
+        total += sum(sys.getsizeof(bits) for bits in self.anc.values())
+        total += sum(sys.getsizeof(t) for t in self.succ.values())
+        total += sum(sys.getsizeof(t) for t in self.pred.values())
+        for container in (self.bit, self.names, self.desc, self.anc, self.succ, self.pred):
+            total += sys.getsizeof(container)
+        return total
+
+    def with_node_added(self, node: str) -> "ReachabilityIndex":
+        index = self._copy()
+        index._add_node(node)
+        return index
+
+    def with_edge_added(self, source: str, target: str) -> "ReachabilityIndex":
+        """加入边：source 及其祖先获得 target 及其后代，反之亦然"""
+        index = self._copy()
+        for node in (source, target):
+            if node not in index.bit:
+                index._add_node(node)
+        if target in index.succ[source]:
+            return index
+        index.succ[source] = tuple(sorted(index.succ[source] + (target,)))
+        index.pred[target] = tuple(sorted(index.pred[target] + (source,)))
+
+        gained_desc = (1 << index.bit[target]) | index.desc[target]
+        for node in index._decode(index.anc[source]) + [source]:
+            index.desc[node] |= gained_desc
+        gained_anc = (1 << index.bit[source]) | index.anc[source]
+        for node in index._decode(index.desc[target]) + [target]:
+            index.anc[node] |= gained_anc
+        return index
+
+    def with_edge_removed(self, source: str, target: str) -> "ReachabilityIndex":
+        """删除边：只重算 source 及其祖先的后代集、target 及其后代的祖先集"""
+        if target not in self.succ.get(source, ()):
+            return self
+        index = self._copy()
+        index.succ[source] = tuple(n for n in index.succ[source] if n != target)
+        index.pred[target] = tuple(n for n in index.pred[target] if n != source)
+        index._recompute(index._decode(self.anc[source]) + [source],
+                         index._decode(self.desc[target]) + [target])
+        return index
+
+    def with_node_removed(self, node: str) -> "ReachabilityIndex":
+        """删除节点及其边，重算其祖先的后代集和后代的祖先集"""
+        if node not in self.bit:
+            return self
+        index = self._copy()
+        for succ in index.succ.pop(node):
+            index.pred[succ] = tuple(n for n in index.pred[succ] if n != node)
+        for pred in index.pred.pop(node):
+            index.succ[pred] = tuple(n for n in index.succ[pred] if n != node)
+        upstream = index._decode(self.anc[node])
+        downstream = index._decode(self.desc[node])
+        index.names[index.bit.pop(node)] = None
+        del index.desc[node]
+        del index.anc[node]
+        index._recompute(upstream, downstream)
+        return index
+
+    def _recompute(self, upstream: List[str], downstream: List[str]) -> None:
+        """重算受影响节点的闭包
+
+        在 DAG 中 x -> y 意味着 desc(x) 严格包含 desc(y)，因此按旧后代集大小升序
+        就是逆拓扑序（祖先集同理），不需要额外维护拓扑序。
+        """
+        upstream.sort(key=lambda n: _popcount(self.desc[n]))
+        for node in upstream:
+            self.desc[node] = self._union(self.succ[node], self.desc)
+        downstream.sort(key=lambda n: _popcount(self.anc[n]))
+        for node in downstream:
+            self.anc[node] = self._union(self.pred[node], self.anc)
+
+    def _union(self, neighbors: Iterable[str], closure: Dict[str, int]) -> int:
+        bits = 0
+        for neighbor in neighbors:
+            bits |= (1 << self.bit[neighbor]) | closure[neighbor]
+        return bits
+
+    def _add_node(self, node: str) -> None:
+        self.bit[node] = len(self.names)
+        self.names.append(node)
+        self.desc[node] = 0
+        self.anc[node] = 0
+        self.succ[node] = ()
+        self.pred[node] = ()
+
+    def _decode(self, bits: int) -> List[str]:
+        """把位集展开为节点 ID 列表（借助二进制字符串在 C 层查找置位）"""
+        if not bits:
+            return []
+        digits = bin(bits)
+        top = len(digits) - 1
+        names = self.names
+        result = []
+        i = digits.find("1", 2)
+        while i != -1:
+            result.append(names[top - i])
+            i = digits.find("1", i + 1)
+        return result
+
+    def _copy(self) -> "ReachabilityIndex":
+        index = ReachabilityIndex()
+        index.bit = dict(self.bit)
+        index.names = list(self.names)
+        index.desc = dict(self.desc)
+        index.anc = dict(self.anc)
+        index.succ = dict(self.succ)
+        index.pred = dict(self.pred)
+        return index
+
+
+def _popcount(bits: int) -> int:
+    return bits.bit_count() if hasattr(bits, "bit_count") else bin(bits).count("1")
+
+
+class IndexCache:
+    """按项目缓存图索引（LRU，使用项目 version 校验）
+
+    与 ProjectCache 相同，只有缓存版本与项目版本一致才会复用，未命中时用 builder 从项目重建。
+    不改变图结构的写入由存储层通过 carry_indexes 把索引推进到新版本，不会引起重建。
+    max_bytes 大于 0 时按索引的 memory_bytes() 计量内存，总量超出时淘汰最久未用的项，
+    单个超出预算的索引不缓存。
+    提供 key 时，版本不一致但 key(project) 与建立索引时相同的缓存项仍然有效（推进到新版本），
+    用于只依赖项目部分内容的结果。
+    所有修改都在存储层的写线程上执行，这里的锁只保护缓存字典本身。
+    """
+
+    def __init__(self, builder: Callable[[Project], object], max_entries: int, max_bytes: int = 0,
+                 key: Optional[Callable[[Project], str]] = None):
+        self.builder = builder
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.key = key
+        self._entries: "OrderedDict[str, Tuple[int, object, int, Optional[str]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, project: Project):
+        """返回与项目当前版本一致的索引，必要时从项目重建
+
+        Raises:
+            CycleError: 项目已有的边中存在环（如导入的数据）
+        """
+        with self._lock:
+            entry = self._entries.get(project.id)
+            if entry is not None and entry[0] == project.version:
+                self._entries.move_to_end(project.id)
+                self.hits += 1
+                return entry[1]
+
+        key = self.key(project) if self.key else None
+        with self._lock:
+            entry = self._entries.get(project.id)
+            if key is not None and entry is not None and entry[3] == key and entry[0] < project.version:
+                self._entries[project.id] = (project.version,) + entry[1:]
+                self._entries.move_to_end(project.id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        index = self.builder(project)
+        self.put(project.id, project.version, index, key)
+        return index
+
+    def peek(self, project: Project):
+        """只查缓存：返回与项目当前版本一致的索引，没有时返回 None（不重建）"""
+        with self._lock:
+            entry = self._entries.get(project.id)
+            if entry is not None and entry[0] == project.version:
+                self._entries.move_to_end(project.id)
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def put(self, project_id: str, version: int, index, key: Optional[str] = None) -> None:
+        """写入（或推进）项目的索引版本；不会用旧版本覆盖新版本"""
+        if self.max_entries <= 0:
+            return
+        size = self._size(index)
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is not None and entry[0] > version:
+                return
+            self._store(project_id, version, index, size, key)
+
+    def advance(self, project_id: str, old_version: int, new_version: int,
+                apply: Callable[[object], Optional[object]]) -> None:
+        """在缓存的索引上应用一次修改并推进版本号（版本不匹配时丢弃）
+
+        apply 返回新对象时用它替换缓存项（写时复制），返回 None 表示已原地修改。
+        """
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None:
+                return
+            if entry[0] != old_version:
+                self._remove(project_id)
+                return
+            updated = apply(entry[1])
+            if updated is None:
+                self._entries[project_id] = (new_version,) + entry[1:]
+            else:
+                self._store(project_id, new_version, updated, self._size(updated), entry[3])
+
+    def invalidate(self, project_id: str) -> None:
+        with self._lock:
+            if project_id in self._entries:
+                self._remove(project_id)
+
+    def _size(self, index) -> int:
+        if self.max_bytes > 0 and hasattr(index, "memory_bytes"):
+            return index.memory_bytes()
+        return 0
+
+    def _store(self, project_id: str, version: int, index, size: int, key: Optional[str]) -> None:
+        if project_id in self._entries:
+            self._remove(project_id)
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        self._entries[project_id] = (version, index, size, key)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, project_id: str) -> None:
+        size = self._entries.pop(project_id)[2]
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            indexes = [entry[1] for entry in self._entries.values()]
+            stats = {"entries": len(indexes), "hits": self.hits, "misses": self.misses,
+                     "evictions": self.evictions}
+            if self.max_bytes > 0:
+                stats["max_bytes"] = self.max_bytes
+        if indexes and hasattr(indexes[0], "memory_bytes"):
+            stats["memory_bytes"] = sum(index.memory_bytes() for index in indexes)
+        return stats
+
+
+def graph_fingerprint(edges: Iterable[Tuple[str, str]]) -> str:
+    """边集合的短指纹（与边的顺序无关），用于判断路径游标是否仍然有效"""
+    digest = hashlib.blake2b(digest_size=8)
+    for source, target in sorted(edges):
+        digest.update(f"{source}\x00{target}\x01".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def structure_fingerprint(project: Project) -> str:
+    """边集合加上章节/部分/节点顺序的指纹（坐标、名称、内容和边标签不参与）
+
+    整图指标和布局只依赖这两部分，用作它们的缓存键，拖拽和改名不会使缓存失效。
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for chapter in project.chapters:
+        digest.update(f"c{chapter.id}\x01".encode("utf-8"))
+        for section in chapter.sections:
+            digest.update(f"s{section.id}\x01".encode("utf-8"))
+            for node in section.nodes:
+                digest.update(f"n{node.id}\x01".encode("utf-8"))
+    return graph_fingerprint((edge.source, edge.target) for edge in project.edges) + digest.hexdigest()
+
+
+def reachable(neighbors: Callable[[str], Sequence[str]], start: str,
+              max_depth: Optional[int] = None) -> List[str]:
+    """广度优先求从 start 可达的节点（不含 start），可限制最大深度"""
+    seen = {start}
+    result = []
+    frontier = [start]
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_frontier = []
+        for node in frontier:
+            for neighbor in neighbors(node):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    result.append(neighbor)
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return result
+
+
+def iter_paths(neighbors: Callable[[str], Sequence[str]], start: str, after: Optional[List[str]] = None,
+               max_depth: Optional[int] = None) -> Iterator[List[str]]:
+    """按先序深度优先顺序枚举从 start 出发的所有简单路径（至少包含一条边）
+
+    Args:
+        neighbors: 返回节点邻居的函数，邻居必须按节点 ID 排序
+                   （如 CompactGraph.successor_ids、ReachabilityIndex.successor_ids）
+        after: 上一次产生的路径，从它之后继续枚举
+        max_depth: 路径最多包含的边数
+
+    Raises:
+        ValueError: after 不是从 start 出发的有效路径
+    """
+    path = [start]
+    # indices[i] 是 path[i] 下一个待访问的邻居下标
+    indices = [0]
+    if after:
+        if after[0] != start:
+            raise ValueError("Path cursor does not start at the focus node")
+        path = list(after)
+        indices = []
+        for parent, child in zip(after, after[1:]):
+            siblings = neighbors(parent)
+            i = bisect_left(siblings, child)
+            if i >= len(siblings) or siblings[i] != child:
+                raise ValueError(f"Path cursor references a missing edge {parent} -> {child}")
+            indices.append(i + 1)
+        indices.append(0)
+    on_path = set(path)
+
+    while path:
+        children = neighbors(path[-1])
+        i = indices[-1]
+        if i < len(children) and (max_depth is None or len(path) <= max_depth):
+            indices[-1] = i + 1
+            child = children[i]
+            if child in on_path:
+                continue
+            path.append(child)
+            indices.append(0)
+            on_path.add(child)
+            yield list(path)
+        else:
+            on_path.discard(path.pop())
+            indices.pop()
+
+
+def graph_metrics(graph: CompactGraph, groups: Dict[str, str]) -> Dict:
+    """一次拓扑遍历计算整图指标，O(V+E)
+
+    Args:
+        graph: 项目的 CSR 图（存在环时抛出 CycleError）
+        groups: 节点 ID -> 所属分组（章节）ID，用于统计分组内部边与跨分组边；
+                不在 groups 中的节点不参与分组统计
+
+    Returns:
+        levels（节点层级 = 从任一根节点出发的最长路径边数）、level_sizes、depth、
+        critical_path（最长前置链）、in_degree/out_degree、roots/leaves、
+        components（弱连通分量，按大小降序）、group_edges（每组内部/出/入边数）、
+        cross_links（跨分组边计数 {(源组, 目标组): 数量}）
+    """
+    order = graph.topological_order()
+    ids = graph.ids
+    n = len(ids)
+    out_offsets, out_targets = graph.out_offsets, graph.out_targets
+
+    # 层级与最长路径：按拓扑序松弛后继，best[j] 记录把 j 推到当前层级的前驱
+    level = [0] * n
+    best = [-1] * n
+    # 弱连通分量：带路径压缩的并查集
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    group_of = [groups.get(node) for node in ids]
+    group_edges: Dict[str, Dict[str, int]] = {}
+    cross_links: Dict[Tuple[str, str], int] = {}
+
+    def counters(group: str) -> Dict[str, int]:
+        if group not in group_edges:
+            group_edges[group] = {"internal": 0, "outgoing": 0, "incoming": 0}
+        return group_edges[group]
+
+    for i in order:
+        next_level = level[i] + 1
+        source_group = group_of[i]
+        for j in out_targets[out_offsets[i]:out_offsets[i + 1]]:
+            if level[j] < next_level:
+                level[j] = next_level
+                best[j] = i
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[root_j] = root_i
+            target_group = group_of[j]
+            if source_group is None or target_group is None:
+                continue
+            if source_group == target_group:
+                counters(source_group)["internal"] += 1
+            else:
+                counters(source_group)["outgoing"] += 1
+                counters(target_group)["incoming"] += 1
+                key = (source_group, target_group)
+                cross_links[key] = cross_links.get(key, 0) + 1
+
+    critical_path = []
+    if n:
+        end = max(range(n), key=level.__getitem__)
+        while end != -1:
+            critical_path.append(ids[end])
+            end = best[end]
+        critical_path.reverse()
+
+    depth = max(level) + 1 if n else 0
+    level_sizes = [0] * depth
+    for value in level:
+        level_sizes[value] += 1
+
+    members: Dict[int, List[str]] = {}
+    for i in range(n):
+        members.setdefault(find(i), []).append(ids[i])
+    components = sorted(members.values(), key=lambda nodes: (-len(nodes), nodes[0]))
+
+    in_offsets = graph.in_offsets
+    in_degree = {ids[i]: in_offsets[i + 1] - in_offsets[i] for i in range(n)}
+    out_degree = {ids[i]: out_offsets[i + 1] - out_offsets[i] for i in range(n)}
+    return {
+        "levels": dict(zip(ids, level)),
+        "level_sizes": level_sizes,
+        "depth": depth,
+        "critical_path": critical_path,
+        "in_degree": in_degree,
+        "out_degree": out_degree,
+        "roots": [node for node in ids if in_degree[node] == 0],
+        "leaves": [node for node in ids if out_degree[node] == 0],
+        "components": components,
+        "group_edges": group_edges,
+        "cross_links": cross_links,
+    }
+
+
+def redundant_edges(graph: CompactGraph) -> List[Tuple[str, str]]:
+    """求传递归约中可以删除的冗余边（存在 u -> w -> ... -> v 时的 u -> v）
+
+    按逆拓扑序计算后代位集：u 的后继 w 的后代集合之并 via(u) 就是 u 经过至少两条边
+    可以到达的节点，u -> v 冗余当且仅当 v 在 via(u) 中。删除全部冗余边后可达关系不变。
+    节点的所有前驱处理完后立即释放它的位集，峰值内存取决于拓扑序上“尚未处理完”的宽度，
+    而不是整张图的闭包。项目数据中存在环时抛出 CycleError。
+
+    Returns:
+        冗余边 (源, 目标) 列表，按源节点、目标节点 ID 排序
+    """
+    order = graph.topological_order()
+    ids = graph.ids
+    out_offsets, out_targets, in_offsets = graph.out_offsets, graph.out_targets, graph.in_offsets
+    # 还有多少个前驱没有处理；降为 0 时该节点的位集不再需要
+    pending = [in_offsets[i + 1] - in_offsets[i] for i in range(len(ids))]
+    desc: Dict[int, int] = {}
+    result = []
+    for u in reversed(order):
+        successors = out_targets[out_offsets[u]:out_offsets[u + 1]]
+        via = 0
+        direct = 0
+        for w in successors:
+            via |= desc[w]
+            direct |= 1 << w
+        for v in successors:
+            if via >> v & 1:
+                result.append((u, v))
+        for w in successors:
+            pending[w] -= 1
+            if not pending[w]:
+                del desc[w]
+        if pending[u]:
+            desc[u] = via | direct
+    result.sort()
+    return [(ids[u], ids[v]) for u, v in result]
+
+
+def label_weights(graph: CompactGraph, edges: Iterable[Tuple[str, str, str]]) -> array:
+    """从边标签解析边权（标签为有限数字时生效，如 "2"、"0.5"），其余边的权为 1
+
+    Returns:
+        与 graph.out_targets 按位置对齐的 float64 数组；重复的边取第一条的标签
+    """
+    index = graph.index
+    out_offsets, out_targets = graph.out_offsets, graph.out_targets
+    weights = array("d", [1.0]) * len(out_targets)
+    assigned = bytearray(len(out_targets))
+    for source, target, label in edges:
+        try:
+            weight = float(label)
+        except ValueError:
+            continue
+        if weight != weight or weight in (float("inf"), float("-inf")):
+            continue
+        i = index[source]
+        k = bisect_left(out_targets, index[target], out_offsets[i], out_offsets[i + 1])
+        if not assigned[k]:
+            assigned[k] = 1
+            weights[k] = weight
+    return weights
+
+
+def best_path(graph: CompactGraph, source: str, target: str, longest: bool = False,
+              weights: Optional[array] = None) -> Optional[Tuple[List[str], float]]:
+    """求 source 到 target 的最短或最长路径
+
+    不带权的最短路径直接广度优先搜索，到达 target 即停止，图中有环也可以使用。
+    其余情况（带权、最长路径）只在“从 source 可达且能到达 target”的子图上做拓扑序动态规划：
+    先正向、再反向各搜索一次圈定子图（反向搜索时顺便统计子图内的入度），
+    代价与子图大小成正比，而不是整个图的 O(V+E)。子图中存在环时抛出 CycleError。
+
+    Args:
+        weights: label_weights 的结果；为 None 时每条边的权为 1
+
+    Returns:
+        (路径节点列表, 长度)，不可达时返回 None；source == target 时为 ([source], 0)
+    """
+    index = graph.index
+    start, goal = index[source], index[target]
+    ids = graph.ids
+    n = len(ids)
+    out_offsets, out_targets = graph.out_offsets, graph.out_targets
+    parent = array("i", [-1]) * n
+
+    if weights is None and not longest:
+        parent[start] = start
+        frontier = [start]
+        while frontier and parent[goal] < 0:
+            next_frontier = []
+            for i in frontier:
+                for j in out_targets[out_offsets[i]:out_offsets[i + 1]]:
+                    if parent[j] < 0:
+                        parent[j] = i
+                        next_frontier.append(j)
+            frontier = next_frontier
+        if parent[goal] < 0:
+            return None
+        path = _trace(parent, start, goal)
+        return [ids[i] for i in path], float(len(path) - 1)
+
+    # 圈定子图：正向可达标记为 1，其中能反向到达 target 的再标记为 2。
+    # 反向搜索经过的每条 i -> j（i 正向可达）都是子图中的边，顺便累计 j 的子图内入度
+    mark = bytearray(n)
+    mark[start] = 1
+    stack = [start]
+    while stack:
+        i = stack.pop()
+        for j in out_targets[out_offsets[i]:out_offsets[i + 1]]:
+            if not mark[j]:
+                mark[j] = 1
+                stack.append(j)
+    if not mark[goal]:
+        return None
+    in_offsets, in_targets = graph.in_offsets, graph.in_targets
+    in_degree = array("i", [0]) * n
+    mark[goal] = 2
+    size = 1
+    stack = [goal]
+    while stack:
+        j = stack.pop()
+        for i in in_targets[in_offsets[j]:in_offsets[j + 1]]:
+            if mark[i]:
+                in_degree[j] += 1
+                if mark[i] == 1:
+                    mark[i] = 2
+                    size += 1
+                    stack.append(i)
+    if in_degree[start]:
+        raise CycleError("Graph contains a cycle")
+
+    # 子图内的 Kahn 拓扑序，同时松弛出边
+    best = array("d", [0.0]) * n
+    parent[start] = start
+    order = [start]
+    for i in order:
+        base = best[i]
+        for k in range(out_offsets[i], out_offsets[i + 1]):
+            j = out_targets[k]
+            if mark[j] != 2:
+                continue
+            length = base + (1.0 if weights is None else weights[k])
+            if parent[j] < 0 or (length > best[j] if longest else length < best[j]):
+                best[j] = length
+                parent[j] = i
+            in_degree[j] -= 1
+            if not in_degree[j]:
+                order.append(j)
+    if len(order) != size:
+        raise CycleError("Graph contains a cycle")
+    return [ids[i] for i in _trace(parent, start, goal)], best[goal]
+
+
+def _trace(parent: array, start: int, goal: int) -> List[int]:
+    path = [goal]
+    while path[-1] != start:
+        path.append(parent[path[-1]])
+    path.reverse()
+    return path
+
+
+# 全局图索引缓存：dag_indexes 只在写线程上使用（加边环检测），
+# graph_indexes（只读 CSR 图）和 reach_indexes（闭包快照）供读线程查询；闭包按内存预算淘汰
+dag_indexes = IndexCache(DynamicDAG.from_project, max_entries=settings.project_cache_max_entries)
+graph_indexes = IndexCache(CompactGraph.from_project, max_entries=settings.project_cache_max_entries)
+reach_indexes = IndexCache(lambda project: ReachabilityIndex.from_graph(graph_indexes.get(project)),
+                           max_entries=settings.project_cache_max_entries,
+                           max_bytes=settings.graph_reachability_cache_max_bytes)
+
+
+def carry_indexes(project_id: str, old_version: int, new_version: int) -> None:
+    """节点集合和边集合都没有变化的写入（拖拽、改名、改内容、调整顺序等）后，把缓存的图索引推进到新版本
+
+    拓扑序、闭包和 CSR 图都只由节点与边决定（CSR 的节点下标按 ID 字典序分配），
+    与章节/部分/节点的顺序无关，直接沿用。
+    """
+    def keep(index):
+        return None
+
+    dag_indexes.advance(project_id, old_version, new_version, keep)
+    reach_indexes.advance(project_id, old_version, new_version, keep)
+    graph_indexes.advance(project_id, old_version, new_version, keep)
@@ -0,0 +1,240 @@
+"""分层 DAG 布局模块（Sugiyama 风格）
+
+在服务端计算知识图谱的层次布局，前端只负责绘制：
+    1. 分层：按拓扑序做最长路径分层，每条边都从上层指向下层，再把出边多于入边的节点
+       下移，以缩短边的总跨度；
+       跨越多层的边拆成经过中间层的虚拟节点链，使每条边只连接相邻两层。
+    2. 减少交叉：逐层按邻居在相邻层中位置的重心（barycenter）重新排序，上下交替扫描。
+       排序时以章节/部分为块：同一部分的节点在每一层中保持相邻，块按成员的平均重心排列。
+    3. 坐标分配：先按顺序等距排布（不同部分之间留出额外间距），再迭代地把每个节点
+       拉向相邻层邻居的平均 x 坐标，同时保持层内顺序和最小间距。
+
+结果按图结构（边集合与章节/部分/节点顺序）缓存（见 services.GraphService.get_graph_layout）。
+"""
+from typing import Dict, List, Tuple
+
+from knowledge_dag.graph import CompactGraph
+
+# 布局参数（与前端 vis-network 原来的 levelSeparation / nodeSpacing 保持一致）
+LAYER_GAP = 200.0
+NODE_GAP = 150.0
+GROUP_GAP = 100.0
+ORDER_SWEEPS = 4
+POSITION_SWEEPS = 4
+
+
+def layered_layout(graph: CompactGraph, groups: Dict[str, Tuple[int, int, int]],
+                   sweeps: int = ORDER_SWEEPS) -> Dict:
+    """计算分层布局
+
+    Args:
+        graph: 项目的 CSR 图（存在环时抛出 CycleError）
+        groups: 节点 ID -> (章节序号, 部分序号, 部分内序号)，决定分块和初始顺序；
+                不在 groups 中的节点排在每层最后
+        sweeps: 减少交叉的上下扫描轮数
+
+    Returns:
+        {"nodes": {节点ID: (x, y, 层)}, "bends": {(源, 目标): [(x, y), ...]},
+         "layer_count", "width", "height", "crossings"}
+        bends 只包含跨越多层的边，给出它经过各中间层的拐点。
+    """
+    order = graph.topological_order()
+    ids = graph.ids
+    n = len(ids)
+    out_offsets, out_targets = graph.out_offsets, graph.out_targets
+
+    # 1. 最长路径分层
+    layer = [0] * n
+    for i in order:
+        next_layer = layer[i] + 1
+        for j in out_targets[out_offsets[i]:out_offsets[i + 1]]:
+            if layer[j] < next_layer:
+                layer[j] = next_layer
+    # 出边多于入边的节点下移到紧贴最近的后继：出边各缩短 d 层、入边各伸长 d 层，总跨度减少。
+    # 按逆拓扑序处理，后继的层已确定，前驱仍在上方，约束始终成立
+    in_offsets = graph.in_offsets
+    for i in reversed(order):
+        start, end = out_offsets[i], out_offsets[i + 1]
+        if end - start > in_offsets[i + 1] - in_offsets[i]:
+            lowest = min(layer[j] for j in out_targets[start:end]) - 1
+            if lowest > layer[i]:
+                layer[i] = lowest
+    layer_count = max(layer) + 1 if n else 0
+
+    missing = (len(ids), 0, 0)
+    keys = [groups.get(node, missing) for node in ids]
+    # 块号：同一 (章节, 部分) 的节点属于同一块
+    block_ids: Dict[Tuple[int, int], int] = {}
+    for key in sorted({key[:2] for key in keys}):
+        block_ids[key] = len(block_ids)
+    block = [block_ids[key[:2]] for key in keys]
+    rank = [key[2] for key in keys]
+
+    # 拆分长边：虚拟节点继承源节点的块，保证同一部分发出的长边在块内走线
+    up: List[List[int]] = [[] for _ in range(n)]
+    down: List[List[int]] = [[] for _ in range(n)]
+    chains: Dict[Tuple[int, int], List[int]] = {}
+    for i in range(n):
+        for j in out_targets[out_offsets[i]:out_offsets[i + 1]]:
+            previous = i
+            chain = []
+            for level in range(layer[i] + 1, layer[j]):
+                dummy = len(layer)
+                layer.append(level)
+                block.append(block[i])
+                rank.append(rank[i])
+                up.append([previous])
+                down.append([])
+                down[previous].append(dummy)
+                chain.append(dummy)
+                previous = dummy
+            down[previous].append(j)
+            up[j].append(previous)
+            if chain:
+                chains[(i, j)] = chain
+
+    total = len(layer)
+    layers: List[List[int]] = [[] for _ in range(layer_count)]
+    for v in sorted(range(total), key=lambda v: (block[v], rank[v], v)):
+        layers[layer[v]].append(v)
+    pos = [0] * total
+    for members in layers:
+        for k, v in enumerate(members):
+            pos[v] = k
+
+    # 2. 按块的重心排序减少交叉；重心法不保证单调下降，保留交叉最少的一轮结果
+    best = _total_crossings(layers, down, pos)
+    best_layers = [list(members) for members in layers]
+    for _ in range(sweeps):
+        if not best:
+            break
+        for current in range(1, layer_count):
+            _reorder(layers[current], up, block, pos)
+        for current in range(layer_count - 2, -1, -1):
+            _reorder(layers[current], down, block, pos)
+        crossings = _total_crossings(layers, down, pos)
+        if crossings < best:
+            best = crossings
+            best_layers = [list(members) for members in layers]
+    layers = best_layers
+    for members in layers:
+        for k, v in enumerate(members):
+            pos[v] = k
+
+    # 3. 坐标分配
+    x = [0.0] * total
+    for members in layers:
+        offset = 0.0
+        for v, gap in zip(members, [0.0] + _gaps(members, block)):
+            offset += gap
+            x[v] = offset
+        for v in members:
+            x[v] -= offset / 2
+    for _ in range(POSITION_SWEEPS):
+        for current in range(1, layer_count):
+            _align(layers[current], up, block, x)
+        for current in range(layer_count - 2, -1, -1):
+            _align(layers[current], down, block, x)
+
+    left = min(x) if total else 0.0
+    right = max(x) if total else 0.0
+    nodes = {ids[i]: (x[i] - left, layer[i] * LAYER_GAP, layer[i]) for i in range(n)}
+    bends = {
+        (ids[i], ids[j]): [(x[v] - left, layer[v] * LAYER_GAP) for v in chain]
+        for (i, j), chain in chains.items()
+    }
+    return {
+        "nodes": nodes,
+        "bends": bends,
+        "layer_count": layer_count,
+        "width": right - left,
+        "height": max(layer_count - 1, 0) * LAYER_GAP,
+        "crossings": best,
+    }
+
+
+def _total_crossings(layers: List[List[int]], down: List[List[int]], pos: List[int]) -> int:
+    return sum(count_crossings(layers[k], layers[k + 1], down, pos) for k in range(len(layers) - 1))
+
+
+def _reorder(members: List[int], neighbors: List[List[int]], block: List[int], pos: List[int]) -> None:
+    """按相邻层邻居位置的重心重排一层（块内节点相邻，块按成员平均重心排列）"""
+    barycenter: Dict[int, float] = {}
+    block_sum: Dict[int, float] = {}
+    block_count: Dict[int, int] = {}
+    for v in members:
+        adjacent = neighbors[v]
+        if len(adjacent) == 1:
+            value = pos[adjacent[0]]
+        elif adjacent:
+            value = sum(pos[u] for u in adjacent) / len(adjacent)
+        else:
+            # 没有邻居的节点保持当前位置
+            value = pos[v]
+        barycenter[v] = value
+        b = block[v]
+        block_sum[b] = block_sum.get(b, 0.0) + value
+        block_count[b] = block_count.get(b, 0) + 1
+    block_center = {b: total / block_count[b] for b, total in block_sum.items()}
+    members.sort(key=lambda v: (block_center[block[v]], block[v], barycenter[v], pos[v]))
+    for k, v in enumerate(members):
+        pos[v] = k
+
+
+def _gaps(members: List[int], block: List[int]) -> List[float]:
+    """层内相邻两个节点之间的最小间距（跨部分时额外留出 GROUP_GAP）"""
+    return [NODE_GAP if block[left] == block[right] else NODE_GAP + GROUP_GAP
+            for left, right in zip(members, members[1:])]
+
+
+def _align(members: List[int], neighbors: List[List[int]], block: List[int], x: List[float]) -> None:
+    """把一层节点拉向邻居的平均 x 坐标，保持层内顺序与最小间距
+
+    分别从左向右、从右向左压紧得到两个合法排布，取平均：
+    两者都满足 x[k+1] - x[k] >= 间距，平均后仍然满足。
+    """
+    if not members:
+        return
+    desired = []
+    for v in members:
+        adjacent = neighbors[v]
+        if len(adjacent) == 1:
+            desired.append(x[adjacent[0]])
+        elif adjacent:
+            desired.append(sum(x[u] for u in adjacent) / len(adjacent))
+        else:
+            desired.append(x[v])
+    gaps = _gaps(members, block)
+    forward = list(desired)
+    previous = forward[0]
+    for k in range(1, len(forward)):
+        previous = forward[k] = max(forward[k], previous + gaps[k - 1])
+    backward = desired
+    following = backward[-1]
+    for k in range(len(backward) - 2, -1, -1):
+        following = backward[k] = min(backward[k], following - gaps[k])
+    for v, left, right in zip(members, forward, backward):
+        x[v] = (left + right) / 2
+
+
+def count_crossings(upper: List[int], lower: List[int], down: List[List[int]], pos: List[int]) -> int:
+    """统计相邻两层之间的边交叉数（按上层顺序展开下层端点，用树状数组数逆序对）"""
+    size = len(lower)
+    tree = [0] * (size + 1)
+    crossings = 0
+    seen = 0
+    for v in upper:
+        for k in sorted(pos[u] for u in down[v]):
+            # 已出现的端点中位置大于 k 的数量
+            i = k + 1
+            not_greater = 0
+            while i > 0:
+                not_greater += tree[i]
+                i -= i & -i
+            crossings += seen - not_greater
+            i = k + 1
+            while i <= size:
+                tree[i] += 1
+                i += i & -i
+            seen += 1
+    return crossings
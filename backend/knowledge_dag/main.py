@@ -5,17 +5,26 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from knowledge_dag.config import settings
 from knowledge_dag.routes import router
-from knowledge_dag.storage import storage
+from knowledge_dag.async_storage import async_storage
 from knowledge_dag.models import Project, Chapter, Section, Node, Edge
+from contextlib import asynccontextmanager
 from datetime import datetime
 import traceback
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：退出时等待写队列清空并关闭数据库连接池"""
+    yield
+    async_storage.close()
+
+
 def create_app() -> FastAPI:
     """创建 FastAPI 应用"""
     app = FastAPI(
         title=settings.api_title,
         version=settings.api_version,
+        lifespan=lifespan,
     )
     
     # CORS 配置
@@ -25,6 +34,7 @@ def create_app() -> FastAPI:
         allow_credentials=settings.cors_allow_credentials,
         allow_methods=settings.cors_allow_methods,
         allow_headers=settings.cors_allow_headers,
+        expose_headers=["ETag"],  # 前端需要读取项目版本的 ETag 做条件请求
     )
     
     # 注册路由
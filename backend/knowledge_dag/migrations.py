@@ -0,0 +1,320 @@
+"""数据库结构迁移模块
+
+使用 SQLite 的 PRAGMA user_version 记录当前结构版本。
+MIGRATIONS 中的步骤按顺序编号，只会执行编号大于当前版本的步骤；
+结构已是最新时只需一次 PRAGMA 查询即可跳过。
+
+每个步骤都是幂等的（先检查表/列是否存在再修改），
+因此从未记录版本号的旧数据库（user_version = 0）也能安全地从头执行。
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+def _columns(cursor, table: str) -> List[str]:
+    """获取表的列名列表"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _add_column(cursor, table: str, column: str, definition: str) -> bool:
+    """列不存在时添加列，返回是否真正添加"""
+    if column in _columns(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def _create_base_tables(cursor) -> None:
+    """创建基础表结构"""
+    # 项目表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS projects (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+    # 章节表
+    # 使用复合主键 (project_id, id) 确保项目内章节ID唯一
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chapters (
+            project_id TEXT NOT NULL,
+            id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER,
+            PRIMARY KEY (project_id, id),
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+        )
+    """)
+
+    # 部分表（使用复合主键确保项目内部分ID唯一）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sections (
+            project_id TEXT NOT NULL,
+            chapter_id TEXT NOT NULL,
+            id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER,
+            x REAL,
+            y REAL,
+            PRIMARY KEY (project_id, chapter_id, id),
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+            FOREIGN KEY (project_id, chapter_id) REFERENCES chapters(project_id, id) ON DELETE CASCADE
+        )
+    """)
+
+    # 节点表（使用复合主键确保项目内节点ID唯一）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS nodes (
+            project_id TEXT NOT NULL,
+            chapter_id TEXT NOT NULL,
+            section_id TEXT NOT NULL,
+            id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            content TEXT DEFAULT '',
+            position INTEGER,
+            x REAL,
+            y REAL,
+            PRIMARY KEY (project_id, chapter_id, section_id, id),
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+            FOREIGN KEY (project_id, chapter_id, section_id) REFERENCES sections(project_id, chapter_id, id) ON DELETE CASCADE
+        )
+    """)
+
+    # 边表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS edges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id TEXT NOT NULL,
+            source TEXT NOT NULL,
+            target TEXT NOT NULL,
+            label TEXT DEFAULT '',
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+            UNIQUE(project_id, source, target)
+        )
+    """)
+
+
+def _add_section_geometry(cursor) -> None:
+    """为 sections 表添加 x, y, width, height 列"""
+    for column in ('x', 'y', 'width', 'height'):
+        _add_column(cursor, 'sections', column, 'REAL')
+
+
+def _add_hierarchy_columns(cursor) -> None:
+    """为旧数据库的 sections/nodes 表添加 project_id、chapter_id 列并回填"""
+    if _add_column(cursor, 'sections', 'project_id', 'TEXT'):
+        # 为现有数据填充 project_id（通过 chapter_id 关联）
+        cursor.execute("""
+            UPDATE sections
+            SET project_id = (
+                SELECT project_id FROM chapters
+                WHERE chapters.id = sections.chapter_id
+            )
+            WHERE project_id IS NULL
+        """)
+
+    if _add_column(cursor, 'nodes', 'project_id', 'TEXT'):
+        # 为现有数据填充 project_id（通过 section_id -> chapter_id -> project_id 关联）
+        cursor.execute("""
+            UPDATE nodes
+            SET project_id = (
+                SELECT chapters.project_id
+                FROM sections
+                JOIN chapters ON sections.chapter_id = chapters.id
+                WHERE sections.id = nodes.section_id
+            )
+            WHERE project_id IS NULL
+        """)
+
+    if _add_column(cursor, 'nodes', 'chapter_id', 'TEXT'):
+        # 为现有数据填充 chapter_id（通过 section_id 关联）
+        cursor.execute("""
+            UPDATE nodes
+            SET chapter_id = (
+                SELECT chapter_id FROM sections
+                WHERE sections.id = nodes.section_id
+            )
+            WHERE chapter_id IS NULL
+        """)
+
+
+def _add_node_xy(cursor) -> None:
+    """为 nodes 表添加 x, y 列"""
+    _add_column(cursor, 'nodes', 'x', 'REAL')
+    _add_column(cursor, 'nodes', 'y', 'REAL')
+
+
+def _add_chapter_layout(cursor) -> None:
+    """为 chapters 表添加 layout 列"""
+    _add_column(cursor, 'chapters', 'layout', "TEXT DEFAULT 'row'")
+
+
+def _add_project_version(cursor) -> None:
+    """为 projects 表添加 version 列（每次写入递增，用于缓存校验）"""
+    _add_column(cursor, 'projects', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def _add_chapter_and_node_geometry(cursor) -> None:
+    """为 chapters 表添加 x, y, width, height 列，为 nodes 表添加 width, height 列"""
+    for column in ('x', 'y', 'width', 'height'):
+        _add_column(cursor, 'chapters', column, 'REAL')
+    for column in ('width', 'height'):
+        _add_column(cursor, 'nodes', column, 'REAL')
+
+
+def _create_indexes(cursor) -> None:
+    """创建索引以提升查询性能"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_project ON chapters(project_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sections_project ON sections(project_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sections_chapter ON sections(project_id, chapter_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_project ON nodes(project_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_section ON nodes(project_id, chapter_id, section_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_id ON nodes(project_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_edges_project ON edges(project_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_edges_source ON edges(project_id, source)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_edges_target ON edges(project_id, target)")
+
+
+def _create_change_log(cursor) -> None:
+    """创建变更日志表（每次写入项目时在同一事务中追加一条 ProjectDelta）
+
+    合并后的条目覆盖 (base_version, version] 区间，因此 base_version 不一定等于 version - 1。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            project_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            base_version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL,
+            delta TEXT NOT NULL,
+            PRIMARY KEY (project_id, version),
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+
+def _create_geometry_index(cursor) -> None:
+    """创建几何 R*Tree 索引（视口查询使用），并为已有项目建立索引
+
+    geometry_items 为章节/部分/节点（section_id/node_id 为空字符串表示上一级）分配整数 rid，
+    geometry_rtree 按 rid 存放项目坐标系中的包围盒；第三维 p0 = p1 为项目编号，
+    不同项目的包围盒在 R*Tree 中互不重叠。删除 geometry_items 行时触发器同步删除 R*Tree 行。
+    只有自身及所有上级都有 x/y 的行才会被索引；width/height 为空时按 0 处理。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS geometry_projects (
+            pkey INTEGER PRIMARY KEY,
+            project_id TEXT NOT NULL UNIQUE,
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS geometry_items (
+            rid INTEGER PRIMARY KEY,
+            project_id TEXT NOT NULL,
+            chapter_id TEXT NOT NULL,
+            section_id TEXT NOT NULL DEFAULT '',
+            node_id TEXT NOT NULL DEFAULT '',
+            UNIQUE (project_id, chapter_id, section_id, node_id),
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS geometry_rtree USING rtree(id, x0, x1, y0, y1, p0, p1)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS geometry_items_delete AFTER DELETE ON geometry_items
+        BEGIN
+            DELETE FROM geometry_rtree WHERE id = OLD.rid;
+        END
+    """)
+
+    cursor.execute("DELETE FROM geometry_items")
+    cursor.execute("DELETE FROM geometry_rtree")
+    cursor.execute("INSERT OR IGNORE INTO geometry_projects (project_id) SELECT id FROM projects")
+    boxes = (
+        ("c.id", "''", "''", "c.x", "c.y", "c.width", "c.height", "chapters c", ""),
+        ("s.chapter_id", "s.id", "''", "c.x + s.x", "c.y + s.y", "s.width", "s.height", "sections s", """
+            JOIN chapters c ON c.project_id = s.project_id AND c.id = s.chapter_id"""),
+        ("n.chapter_id", "n.section_id", "n.id", "c.x + s.x + n.x", "c.y + s.y + n.y", "n.width", "n.height",
+         "nodes n", """
+            JOIN sections s ON s.project_id = n.project_id AND s.chapter_id = n.chapter_id AND s.id = n.section_id
+            JOIN chapters c ON c.project_id = n.project_id AND c.id = n.chapter_id"""),
+    )
+    for chapter_id, section_id, node_id, x, y, width, height, source, joins in boxes:
+        alias = source.split()[-1]
+        cursor.execute(f"""
+            INSERT INTO geometry_items (project_id, chapter_id, section_id, node_id)
+            SELECT {alias}.project_id, {chapter_id}, {section_id}, {node_id} FROM {source} {joins}
+            WHERE ({x}) IS NOT NULL AND ({y}) IS NOT NULL
+        """)
+        cursor.execute(f"""
+            INSERT INTO geometry_rtree (id, x0, x1, y0, y1, p0, p1)
+            SELECT g.rid, {x}, {x} + COALESCE({width}, 0), {y}, {y} + COALESCE({height}, 0), p.pkey, p.pkey
+            FROM {source} {joins}
+            JOIN geometry_projects p ON p.project_id = {alias}.project_id
+            JOIN geometry_items g ON g.project_id = {alias}.project_id AND g.chapter_id = {chapter_id}
+                AND g.section_id = {section_id} AND g.node_id = {node_id}
+            WHERE ({x}) IS NOT NULL AND ({y}) IS NOT NULL
+        """)
+
+
+# 迁移步骤：(版本号, 名称, 执行函数)，版本号必须连续递增，已发布的步骤不得修改
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "create_base_tables", _create_base_tables),
+    (2, "add_section_geometry", _add_section_geometry),
+    (3, "add_hierarchy_columns", _add_hierarchy_columns),
+    (4, "add_node_xy", _add_node_xy),
+    (5, "add_chapter_layout", _add_chapter_layout),
+    (6, "add_project_version", _add_project_version),
+    (7, "add_chapter_and_node_geometry", _add_chapter_and_node_geometry),
+    (8, "create_indexes", _create_indexes),
+    (9, "create_change_log", _create_change_log),
+    (10, "create_geometry_index", _create_geometry_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """读取数据库当前结构版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_migrations(conn: sqlite3.Connection) -> List[Tuple[int, str, Callable]]:
+    """返回尚未执行的迁移步骤"""
+    current = get_schema_version(conn)
+    return [step for step in MIGRATIONS if step[0] > current]
+
+
+def migrate(conn: sqlite3.Connection) -> List[str]:
+    """执行所有未完成的迁移步骤
+
+    每个步骤在独立的 IMMEDIATE 事务中执行，并在同一事务中写入新的 user_version；
+    获取写锁后会重新读取版本号，多个进程同时启动时不会重复执行。
+    执行出错时回滚当前步骤并抛出异常，不再静默忽略。
+
+    Returns:
+        本次执行的步骤名称列表（结构已是最新时为空列表）
+    """
+    if get_schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(name)
+    return applied
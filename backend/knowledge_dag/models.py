@@ -1,6 +1,6 @@
 """Pydantic 数据模型定义"""
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple, Union
 from datetime import datetime
 
 
@@ -89,12 +89,34 @@ class Edge(BaseModel):
         return v.strip()
 
 
+class EdgeIndex:
+    """项目边的哈希索引：(source, target) -> Edge
+    
+    由 Project.edge_index() 按需构建并绑定到构建时的 edges 列表对象；
+    列表被整体替换（如 clone_project 复制出的新项目）或长度对不上时自动重建。
+    邻接关系不在这里重复保存，按版本缓存的 DynamicDAG / CompactGraph 已经提供。
+    """
+    __slots__ = ("edges", "size", "by_pair")
+    
+    def __init__(self, edges: List[Edge]):
+        self.edges = edges
+        self.size = len(edges)
+        # 重复的 (source, target) 只索引第一条，与存储层的去重规则一致
+        self.by_pair: Dict[Tuple[str, str], Edge] = {}
+        for edge in edges:
+            self.by_pair.setdefault((edge.source, edge.target), edge)
+    
+    def is_current(self, edges: List[Edge]) -> bool:
+        return self.edges is edges and len(edges) == self.size
+
+
 class Project(BaseModel):
     """项目模型"""
     id: str = Field(..., description="项目唯一标识")
     name: str = Field(..., min_length=1, max_length=200, description="项目名称")
     created_at: str = Field(..., description="创建时间")
     updated_at: str = Field(..., description="更新时间")
+    version: int = Field(default=0, description="版本号（每次保存递增）")
     chapters: List[Chapter] = Field(default_factory=list, description="章节列表")
     edges: List[Edge] = Field(
         default_factory=list, 
@@ -114,6 +136,55 @@ class Project(BaseModel):
     def validate_edges(cls, v: List[Edge]) -> List[Edge]:
         """验证边的格式"""
         return v
+    
+    _edge_index: Optional[EdgeIndex] = PrivateAttr(default=None)
+    
+    def edge_index(self) -> EdgeIndex:
+        """获取边索引（每个加载出的项目首次使用时构建一次）"""
+        index = self._edge_index
+        if index is None or not index.is_current(self.edges):
+            index = self._edge_index = EdgeIndex(self.edges)
+        return index
+    
+    def find_edge(self, source: str, target: str) -> Optional[Edge]:
+        """按 (source, target) 查找边，O(1)"""
+        return self.edge_index().by_pair.get((source, target))
+    
+    def add_edge(self, edge: Edge) -> None:
+        """追加一条边，已构建的索引同步更新"""
+        index = self._edge_index
+        if index is not None and index.is_current(self.edges):
+            index.by_pair.setdefault((edge.source, edge.target), edge)
+            index.size += 1
+        self.edges.append(edge)
+    
+    def remove_edges(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """删除指定的 (source, target) 边（包括重复项），返回删除的条数"""
+        pairs = set(pairs)
+        return self._filter_edges(lambda edge: (edge.source, edge.target) in pairs)
+    
+    def remove_node_edges(self, node_ids: Iterable[str]) -> int:
+        """删除与这些节点相连的所有边，返回删除的条数"""
+        node_ids = set(node_ids)
+        return self._filter_edges(lambda edge: edge.source in node_ids or edge.target in node_ids)
+    
+    def _filter_edges(self, remove) -> int:
+        """一次遍历过滤边列表（成员判断都是集合查找），已构建的索引同步移除被删的边"""
+        kept = []
+        removed = []
+        for edge in self.edges:
+            (removed if remove(edge) else kept).append(edge)
+        if not removed:
+            return 0
+        index = self._edge_index
+        if index is not None and index.is_current(self.edges):
+            for edge in removed:
+                if index.by_pair.get((edge.source, edge.target)) is edge:
+                    del index.by_pair[(edge.source, edge.target)]
+            index.edges = kept
+            index.size = len(kept)
+        self.edges = kept
+        return len(removed)
 
 
 # --- 请求模型 ---
@@ -314,6 +385,10 @@ class ReorderChaptersRequest(BaseModel):
     """重排序章节请求"""
     chapter_ids: List[str] = Field(..., description="章节ID列表，按新顺序排列")
 
+class NodeContentsRequest(BaseModel):
+    """批量获取节点内容请求"""
+    node_ids: List[str] = Field(..., min_length=1, max_length=1000, description="节点ID列表")
+
 
 class UpdateNodePositionRequest(BaseModel):
     """更新节点位置请求"""
@@ -356,12 +431,173 @@ class UpdateEdgeRequest(BaseModel):
         return v.strip()
 
 
+class GraphAnalysisBatchRequest(BaseModel):
+    """批量图谱分析请求"""
+    focus_nodes: Union[Literal["all"], List[str]] = Field(..., description='焦点节点ID列表，"all" 表示项目中的全部节点')
+    max_depth: Optional[int] = Field(default=None, ge=1, description="祖先/后代的最大搜索深度")
+    
+    @field_validator('focus_nodes')
+    @classmethod
+    def validate_focus_nodes(cls, v):
+        """验证焦点节点列表（去除空白和重复，保持顺序）"""
+        if v == "all":
+            return v
+        return list(dict.fromkeys(node.strip() for node in v if node.strip()))
+
+
 class GraphAnalysisResponse(BaseModel):
     """图谱分析响应"""
     highlight: List[str] = Field(default_factory=list, description="需要高亮的节点ID列表")
-    paths: List[List[str]] = Field(default_factory=list, description="路径列表")
+    edges: List[Tuple[str, str]] = Field(default_factory=list, description="高亮节点之间的边 [source, target]")
+    paths: List[List[str]] = Field(default_factory=list, description="路径列表（仅在 include_paths 时返回）")
     ancestors: List[str] = Field(default_factory=list, description="祖先节点列表")
     descendants: List[str] = Field(default_factory=list, description="后代节点列表")
+    truncated: bool = Field(default=False, description="路径枚举是否因数量或时间限制被截断")
+    cursor: Optional[str] = Field(default=None, description="截断时用于流式接口继续枚举的游标")
+
+
+class GraphPathResponse(BaseModel):
+    """两个节点之间的最短/最长路径"""
+    source: str = Field(..., description="起点节点ID")
+    target: str = Field(..., description="终点节点ID")
+    mode: Literal["shortest", "longest"] = Field(..., description="shortest 为最少/最小权的前置链，longest 为最长前置链")
+    weighted: bool = Field(..., description="是否按边权计算（标签为数字的边以该数字为权，其余边权为 1）")
+    found: bool = Field(..., description="起点是否能到达终点")
+    length: Optional[float] = Field(default=None, description="路径长度（不带权时为边数）")
+    path: List[str] = Field(default_factory=list, description="路径上的节点ID（含起点和终点）")
+
+
+class ChapterLinkMetrics(BaseModel):
+    """章节的连接统计"""
+    chapter_id: str = Field(..., description="章节ID")
+    internal_edges: int = Field(default=0, description="两端都在本章节内的边数")
+    outgoing_edges: int = Field(default=0, description="从本章节指向其他章节的边数")
+    incoming_edges: int = Field(default=0, description="从其他章节指向本章节的边数")
+
+
+class ChapterCrossLink(BaseModel):
+    """两个章节之间的跨章节边数"""
+    source_chapter: str = Field(..., description="源章节ID")
+    target_chapter: str = Field(..., description="目标章节ID")
+    count: int = Field(..., description="边数")
+
+
+class GraphMetricsResponse(BaseModel):
+    """整图指标响应"""
+    version: int = Field(..., description="计算指标时的项目版本号")
+    node_count: int = Field(..., description="节点数")
+    edge_count: int = Field(..., description="边数")
+    depth: int = Field(..., description="层数（最长前置链包含的节点数）")
+    levels: Dict[str, int] = Field(default_factory=dict, description="节点层级（从根节点出发的最长路径边数）")
+    level_sizes: List[int] = Field(default_factory=list, description="每一层的节点数")
+    critical_path: List[str] = Field(default_factory=list, description="最长前置链（关键路径）")
+    in_degree: Dict[str, int] = Field(default_factory=dict, description="节点入度")
+    out_degree: Dict[str, int] = Field(default_factory=dict, description="节点出度")
+    roots: List[str] = Field(default_factory=list, description="没有前置的节点")
+    leaves: List[str] = Field(default_factory=list, description="没有后续的节点")
+    components: List[List[str]] = Field(default_factory=list, description="弱连通分量（按大小降序）")
+    chapters: List[ChapterLinkMetrics] = Field(default_factory=list, description="每个章节的连接统计（按章节顺序）")
+    cross_links: List[ChapterCrossLink] = Field(default_factory=list, description="跨章节边计数（按数量降序）")
+
+
+class NodeLayout(BaseModel):
+    """节点的布局坐标"""
+    id: str = Field(..., description="节点ID")
+    x: float = Field(..., description="横坐标")
+    y: float = Field(..., description="纵坐标（= 层 * 层间距）")
+    layer: int = Field(..., description="所在层（0 为最上层）")
+
+
+class EdgeLayout(BaseModel):
+    """跨越多层的边经过的拐点"""
+    source: str = Field(..., description="源节点ID")
+    target: str = Field(..., description="目标节点ID")
+    points: List[Tuple[float, float]] = Field(default_factory=list, description="依次经过的中间层拐点 [x, y]")
+
+
+class GraphLayoutResponse(BaseModel):
+    """分层布局响应"""
+    version: int = Field(..., description="计算布局时的项目版本号")
+    layer_count: int = Field(..., description="层数")
+    width: float = Field(..., description="布局宽度")
+    height: float = Field(..., description="布局高度")
+    crossings: int = Field(..., description="边交叉数")
+    nodes: List[NodeLayout] = Field(default_factory=list, description="节点坐标（按项目中的节点顺序）")
+    edges: List[EdgeLayout] = Field(default_factory=list, description="跨越多层的边的拐点（只跨一层的边为直线，不列出）")
+
+
+class TransitiveReductionResponse(BaseModel):
+    """传递归约（冗余边）报告"""
+    dry_run: bool = Field(..., description="为真时只报告，不删除")
+    version: int = Field(..., description="报告对应的项目版本号（删除时为删除后的版本号）")
+    edge_count: int = Field(..., description="归约前的边数")
+    redundant_count: int = Field(..., description="冗余边数量")
+    removed_count: int = Field(default=0, description="实际删除的边数")
+    redundant_edges: List[Edge] = Field(default_factory=list, description="冗余边（存在其他路径连接两端的边）")
+
+
+class ProjectDelta(BaseModel):
+    """项目的一次变更（与数据库表一一对应的行级差异）
+    
+    upserts 中的行按主键合并到已有对象上（不存在时新建），只有位置/尺寸变化时
+    行中只包含主键和几何字段；deletes 中只包含主键。
+    主键：chapters 为 id，sections 为 (chapter_id, id)，nodes 为 (chapter_id, section_id, id)，
+    edges 为 (source, target)。
+    """
+    project_id: str = Field(..., description="项目ID")
+    base_version: int = Field(..., description="变更前的版本号（客户端持有的版本与之相同时才能直接应用）")
+    version: int = Field(..., description="变更后的版本号")
+    updated_at: str = Field(..., description="变更后的更新时间")
+    name: Optional[str] = Field(default=None, description="新的项目名称（未修改时为空）")
+    upserts: Dict[str, List[Dict[str, Any]]] = Field(default_factory=dict, description="{表名: 新增或修改的行}")
+    deletes: Dict[str, List[Dict[str, str]]] = Field(default_factory=dict, description="{表名: 删除的行的主键}")
+
+
+class NodeContentsResponse(BaseModel):
+    """批量获取节点内容响应（配合项目骨架按需加载笔记）"""
+    project_id: str = Field(..., description="项目ID")
+    version: int = Field(..., description="读取时项目的版本号")
+    contents: Dict[str, str] = Field(default_factory=dict, description="{节点ID: 内容}")
+    missing: List[str] = Field(default_factory=list, description="不存在的节点ID")
+
+
+class ChapterResponse(BaseModel):
+    """单个章节响应（含与章节内节点相连的边）"""
+    project_id: str = Field(..., description="项目ID")
+    version: int = Field(..., description="读取时项目的版本号")
+    chapter: Chapter = Field(..., description="章节（含部分和节点）")
+    edges: List[Edge] = Field(default_factory=list, description="至少一个端点在该章节内的边")
+
+
+class ViewportResponse(BaseModel):
+    """视口查询响应
+    
+    chapters 是裁剪后的项目树：只包含包围盒与矩形相交的节点、相交或含有相交节点的部分，
+    以及相交或含有这些部分/节点的章节。只有查询矩形使用项目坐标系（下级的 x/y 依次加上上级的 x/y）；
+    返回的行与完整项目中相同，x/y 仍是相对于上级的坐标。
+    """
+    project_id: str = Field(..., description="项目ID")
+    version: int = Field(..., description="读取时项目的版本号")
+    x0: float = Field(..., description="矩形左边界")
+    y0: float = Field(..., description="矩形上边界")
+    x1: float = Field(..., description="矩形右边界")
+    y1: float = Field(..., description="矩形下边界")
+    chapters: List[Chapter] = Field(default_factory=list, description="视口内的章节/部分/节点")
+    edges: List[Edge] = Field(default_factory=list, description="以视口内节点为端点的边")
+
+
+class ProjectChanges(BaseModel):
+    """变更日志查询结果（GET /projects/{id}/changes）
+    
+    changes 按版本号升序排列，依次应用到版本为 since 的副本上即可得到版本为 version 的项目；
+    合并过的条目覆盖多个版本（base_version < version - 1），对区间内任一版本应用结果都相同。
+    """
+    project_id: str = Field(..., description="项目ID")
+    since: int = Field(..., description="请求的起始版本号")
+    version: int = Field(..., description="应用 changes 后到达的版本号")
+    latest_version: int = Field(..., description="项目当前的版本号")
+    has_more: bool = Field(default=False, description="是否还有更多变更（以 version 作为 since 继续请求）")
+    changes: List[ProjectDelta] = Field(default_factory=list, description="按版本号升序排列的变更")
 
 
 class NodeLocationResponse(BaseModel):
@@ -1,68 +1,187 @@
 """API 路由模块"""
-from fastapi import APIRouter, HTTPException, Request
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from functools import partial
+from typing import Dict, Optional, Set
 
 from knowledge_dag.models import (
     CreateProjectRequest, UpdateProjectRequest, AddChapterRequest, AddSectionRequest,
     AddNodeRequest, UpdateNodeRequest, AddEdgeRequest, UpdateEdgeRequest,
     ReorderNodesRequest, ReorderSectionsRequest, ReorderChaptersRequest,
     UpdateNodePositionRequest, UpdateSectionPositionRequest, NodeLocationResponse,
-    UpdateChapterRequest, UpdateSectionRequest
+    UpdateChapterRequest, UpdateSectionRequest, GraphAnalysisBatchRequest, NodeContentsRequest
 )
+from knowledge_dag.async_storage import async_storage
 from knowledge_dag.services import (
     ProjectService, ChapterService, SectionService,
-    NodeService, GraphService, ExportService
+    NodeService, GraphService, ExportService, MaintenanceService
 )
 from fastapi import UploadFile, File
 
 router = APIRouter()
 
 
+def _json(result, headers: Optional[Dict[str, str]] = None,
+          include: Optional[Dict] = None, exclude: Optional[Dict] = None):
+    """把服务返回的模型直接序列化为 JSON 响应
+    
+    路由是 async 的，FastAPI 默认的 jsonable_encoder 会在事件循环中逐字段转换整棵项目树
+    （数百个节点即需数十毫秒）；model_dump_json 由 pydantic-core 完成，输出相同但快一个数量级。
+    include/exclude 原样传给 model_dump_json，用于字段选择和项目骨架。
+    """
+    if isinstance(result, BaseModel):
+        return Response(content=result.model_dump_json(include=include, exclude=exclude),
+                        media_type="application/json", headers=headers)
+    return result
+
+
+def _etag_headers(version: int) -> Dict[str, str]:
+    """项目的强 ETag 即带引号的版本号（每次写入递增）；no-cache 要求浏览器每次都先验证"""
+    return {"ETag": f'"{version}"', "Cache-Control": "no-cache"}
+
+
+def _parse_etags(header: Optional[str], weak: bool) -> Optional[Set[int]]:
+    """解析 If-Match / If-None-Match 中的版本号
+    
+    没有该请求头或为 "*" 时返回 None（不做条件判断）。weak 为 False 时按强比较，
+    忽略 W/ 前缀的弱 ETag；格式不符的值同样忽略，可能得到空集合（任何版本都不匹配）。
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.add(int(tag[1:-1]))
+    return versions
+
+
+class _MutationOptions:
+    """修改类接口的通用选项
+    
+    - 响应模式：?response=delta 或请求头 Prefer: return=minimal 时只返回变更
+    - If-Match：带上项目 ETag 时，项目已被其他请求修改则拒绝写入（412）
+    """
+    
+    def __init__(self, request: Request,
+                 response: Optional[str] = Query(None, description="设为 delta 时只返回本次变更")):
+        self.delta = response == "delta" or "return=minimal" in request.headers.get("prefer", "")
+        self.if_match = _parse_etags(request.headers.get("if-match"), weak=False)
+
+
+async def _mutate(options: _MutationOptions, func, project_id: str, *args):
+    """在写线程上执行修改并返回响应（ETag 为修改后的版本）
+    
+    默认返回修改后的整个项目；options.delta 为真时只返回本次写入的行级变更（ProjectDelta），
+    响应大小和序列化耗时只与变更的行数有关，与项目规模无关。
+    If-Match 检查与修改在同一个写线程单元中执行，两者之间不会插入其他写入。
+    """
+    call = partial(func, project_id, *args)
+    if options.if_match is not None:
+        call = partial(ProjectService.run_if_match, project_id, options.if_match, call)
+    if options.delta:
+        call = partial(ProjectService.run_with_delta, call)
+    result = await async_storage.run_write(call)
+    return _json(result, headers=_etag_headers(result.version))
+
+
 @router.get("/")
-def root():
+async def root():
     """根路径"""
     return {"message": "Knowledge DAG Builder API", "version": "1.0.0"}
 
 
+@router.get("/storage/stats")
+async def get_storage_stats():
+    """获取存储层运行指标"""
+    return MaintenanceService.get_storage_stats()
+
+
 @router.get("/projects")
-def get_projects():
-    """获取所有项目列表"""
-    return ProjectService.get_all_projects()
+async def get_projects(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    with_counts: bool = False
+):
+    """获取项目列表（支持分页、按 updated_at 等字段排序、附带统计数量）"""
+    return _json(await async_storage.run_read(ProjectService.get_all_projects, limit, offset, sort, order, with_counts))
 
 
 @router.post("/projects")
-def create_project(request: CreateProjectRequest):
+async def create_project(request: CreateProjectRequest):
     """创建新项目"""
-    return ProjectService.create_project(request)
+    return _json(await async_storage.run_write(ProjectService.create_project, request))
+
+
+async def _conditional_project(project_id: str, request: Request, content: bool,
+                               include: Optional[Dict] = None, exclude: Optional[Dict] = None):
+    """按 If-None-Match 条件读取项目，并按 include/exclude 序列化（content 为 False 时不读取节点 content 列）"""
+    versions = _parse_etags(request.headers.get("if-none-match"), weak=True)
+    version, project = await async_storage.run_read(
+        ProjectService.get_project_if_changed, project_id, versions, content
+    )
+    if project is None:
+        return Response(status_code=304, headers=_etag_headers(version))
+    return _json(project, headers=_etag_headers(version), include=include, exclude=exclude)
 
 
 @router.get("/projects/{project_id}")
-def get_project(project_id: str):
-    """获取项目详情"""
-    return ProjectService.get_project(project_id)
+async def get_project(project_id: str, request: Request, fields: Optional[str] = None):
+    """获取项目详情（带 ETag；If-None-Match 命中当前版本时返回 304，不加载也不序列化项目树）
+    
+    fields 为逗号分隔的字段路径（如 name,edges,chapters.sections.nodes.name），只返回选中的字段。
+    """
+    include = ProjectService.parse_fields(fields)
+    return await _conditional_project(project_id, request, ProjectService.selects_content(include), include=include)
+
+
+@router.get("/projects/{project_id}/viewport")
+async def get_viewport(project_id: str, x0: float, y0: float, x1: float, y1: float):
+    """视口查询：只返回包围盒与矩形 [x0, x1] × [y0, y1] 相交的部分/节点及相连的边（矩形为项目坐标系，返回相对坐标）"""
+    return _json(await async_storage.run_read(ProjectService.get_viewport, project_id, x0, y0, x1, y1))
+
+
+@router.get("/projects/{project_id}/skeleton")
+async def get_project_skeleton(project_id: str, request: Request):
+    """项目骨架：除节点 content 外的完整项目（content 通过 POST /nodes/contents 按需获取）"""
+    return await _conditional_project(project_id, request, False, exclude=ProjectService.SKELETON_EXCLUDE)
+
+
+@router.get("/projects/{project_id}/changes")
+async def get_project_changes(project_id: str, since: int, limit: int = 1000, compact: bool = False):
+    """增量同步：返回版本 since 之后按版本排序的行级变更（日志已不完整时返回 410，需重新获取项目）"""
+    return _json(await async_storage.run_read(ProjectService.get_changes, project_id, since, limit, compact))
 
 
 @router.put("/projects/{project_id}")
-def update_project(project_id: str, request: UpdateProjectRequest):
+async def update_project(project_id: str, request: UpdateProjectRequest, options: _MutationOptions = Depends()):
     """更新项目名称"""
-    return ProjectService.update_project(project_id, request.name)
+    return await _mutate(options, ProjectService.update_project, project_id, request.name)
 
 
 @router.delete("/projects/{project_id}")
-def delete_project(project_id: str):
+async def delete_project(project_id: str):
     """删除项目"""
-    ProjectService.delete_project(project_id)
+    await async_storage.run_write(ProjectService.delete_project, project_id)
     return {"message": "Project deleted"}
 
 
 @router.post("/projects/{project_id}/chapters")
-def add_chapter(project_id: str, request: AddChapterRequest):
+async def add_chapter(project_id: str, request: AddChapterRequest, options: _MutationOptions = Depends()):
     """添加章节"""
-    return ChapterService.add_chapter(project_id, request)
+    return await _mutate(options, ChapterService.add_chapter, project_id, request)
 
 
 @router.put("/projects/{project_id}/chapters/position")
-async def update_chapter_position(project_id: str, request: Request):
+async def update_chapter_position(project_id: str, request: Request,
+                                  options: _MutationOptions = Depends()):
     """更新章节位置和尺寸（宽容模式，直接读取原始 JSON 避免验证冲突）"""
     import traceback, json
     payload = {}
@@ -73,7 +192,7 @@ async def update_chapter_position(project_id: str, request: Request):
         except Exception:
             payload = {}
         print(f"\n[chapters/position] project_id={project_id}, payload={payload}")
-        return ChapterService.update_chapter_position_payload(project_id, payload)
+        return await _mutate(options, ChapterService.update_chapter_position_payload, project_id, payload)
     except Exception as e:
         print(f"\n{'='*60}")
         print(f"ERROR in update_chapter_position:")
@@ -85,24 +204,32 @@ async def update_chapter_position(project_id: str, request: Request):
         print(f"{'='*60}\n")
         raise
 
+@router.get("/projects/{project_id}/chapters/{chapter_id}")
+async def get_chapter(project_id: str, chapter_id: str):
+    """获取单个章节（含部分、节点及与章节内节点相连的边），不返回整个项目"""
+    return _json(await async_storage.run_read(ChapterService.get_chapter, project_id, chapter_id))
+
+
 @router.put("/projects/{project_id}/chapters/{chapter_id}")
-def update_chapter(project_id: str, chapter_id: str, request: UpdateChapterRequest):
+async def update_chapter(project_id: str, chapter_id: str, request: UpdateChapterRequest,
+                         options: _MutationOptions = Depends()):
     """更新章节名称和布局"""
-    return ChapterService.update_chapter(project_id, chapter_id, request)
+    return await _mutate(options, ChapterService.update_chapter, project_id, chapter_id, request)
 
 @router.post("/projects/{project_id}/chapters/reorder")
-def reorder_chapters(project_id: str, request: ReorderChaptersRequest):
+async def reorder_chapters(project_id: str, request: ReorderChaptersRequest, options: _MutationOptions = Depends()):
     """重排序章节"""
-    return ChapterService.reorder_chapters(project_id, request)
+    return await _mutate(options, ChapterService.reorder_chapters, project_id, request)
 
 @router.delete("/projects/{project_id}/chapters/{chapter_id}")
-def delete_chapter(project_id: str, chapter_id: str):
+async def delete_chapter(project_id: str, chapter_id: str, options: _MutationOptions = Depends()):
     """删除章节"""
-    return ChapterService.delete_chapter(project_id, chapter_id)
+    return await _mutate(options, ChapterService.delete_chapter, project_id, chapter_id)
 
 
 @router.put("/projects/{project_id}/sections/position")
-async def update_section_position(project_id: str, request: Request):
+async def update_section_position(project_id: str, request: Request,
+                                  options: _MutationOptions = Depends()):
     """更新部分位置和尺寸（宽容模式，直接读取原始 JSON 避免验证冲突）"""
     import traceback, json
     payload = {}
@@ -113,7 +240,7 @@ async def update_section_position(project_id: str, request: Request):
         except Exception:
             payload = {}
         print(f"\n[sections/position] project_id={project_id}, payload={payload}")
-        return SectionService.update_section_position_payload(project_id, payload)
+        return await _mutate(options, SectionService.update_section_position_payload, project_id, payload)
     except Exception as e:
         print(f"\n{'='*60}")
         print(f"ERROR in update_section_position:")
@@ -127,89 +254,164 @@ async def update_section_position(project_id: str, request: Request):
 
 
 @router.post("/projects/{project_id}/sections")
-def add_section(project_id: str, request: AddSectionRequest):
+async def add_section(project_id: str, request: AddSectionRequest, options: _MutationOptions = Depends()):
     """添加部分"""
-    return SectionService.add_section(project_id, request)
+    return await _mutate(options, SectionService.add_section, project_id, request)
 
 
 @router.put("/projects/{project_id}/sections/{section_id}")
-def update_section(project_id: str, section_id: str, request: UpdateSectionRequest):
+async def update_section(project_id: str, section_id: str, request: UpdateSectionRequest,
+                         options: _MutationOptions = Depends()):
     """更新部分名称"""
-    return SectionService.update_section(project_id, section_id, request)
+    return await _mutate(options, SectionService.update_section, project_id, section_id, request)
 
 @router.post("/projects/{project_id}/sections/reorder")
-def reorder_sections(project_id: str, request: ReorderSectionsRequest):
+async def reorder_sections(project_id: str, request: ReorderSectionsRequest, options: _MutationOptions = Depends()):
     """重排序部分"""
-    return SectionService.reorder_sections(project_id, request)
+    return await _mutate(options, SectionService.reorder_sections, project_id, request)
 
 @router.delete("/projects/{project_id}/sections/{section_id}")
-def delete_section(project_id: str, section_id: str):
+async def delete_section(project_id: str, section_id: str, options: _MutationOptions = Depends()):
     """删除部分"""
-    return SectionService.delete_section(project_id, section_id)
+    return await _mutate(options, SectionService.delete_section, project_id, section_id)
 
 
 @router.post("/projects/{project_id}/nodes")
-def add_node(project_id: str, request: AddNodeRequest):
+async def add_node(project_id: str, request: AddNodeRequest, options: _MutationOptions = Depends()):
     """添加知识节点"""
-    return NodeService.add_node(project_id, request)
+    return await _mutate(options, NodeService.add_node, project_id, request)
+
+
+@router.post("/projects/{project_id}/nodes/contents")
+async def get_node_contents(project_id: str, request: NodeContentsRequest):
+    """批量获取节点内容（只读；用 POST 以便在请求体中传递大量节点ID）"""
+    return _json(await async_storage.run_read(ProjectService.get_node_contents, project_id, request.node_ids))
 
 
 @router.post("/projects/{project_id}/nodes/reorder")
-def reorder_nodes(project_id: str, request: ReorderNodesRequest):
+async def reorder_nodes(project_id: str, request: ReorderNodesRequest, options: _MutationOptions = Depends()):
     """重排序节点"""
-    return NodeService.reorder_nodes(project_id, request)
+    return await _mutate(options, NodeService.reorder_nodes, project_id, request)
 
 
 @router.put("/projects/{project_id}/nodes/position")
-def update_node_position(project_id: str, request: UpdateNodePositionRequest):
+async def update_node_position(project_id: str, request: UpdateNodePositionRequest,
+                               options: _MutationOptions = Depends()):
     """更新节点位置"""
-    return NodeService.update_node_position(project_id, request)
+    return await _mutate(options, NodeService.update_node_position, project_id, request)
 
 
 @router.put("/projects/{project_id}/nodes/{node_id}")
-def update_node(project_id: str, node_id: str, request: UpdateNodeRequest):
+async def update_node(project_id: str, node_id: str, request: UpdateNodeRequest,
+                      options: _MutationOptions = Depends()):
     """更新节点"""
-    return NodeService.update_node(project_id, node_id, request)
+    return await _mutate(options, NodeService.update_node, project_id, node_id, request)
 
 
 @router.delete("/projects/{project_id}/nodes/{node_id}")
-def delete_node(project_id: str, node_id: str):
+async def delete_node(project_id: str, node_id: str, options: _MutationOptions = Depends()):
     """删除节点"""
-    return NodeService.delete_node(project_id, node_id)
+    return await _mutate(options, NodeService.delete_node, project_id, node_id)
 
 
 @router.post("/projects/{project_id}/edges")
-def add_edge(project_id: str, request: AddEdgeRequest):
+async def add_edge(project_id: str, request: AddEdgeRequest, options: _MutationOptions = Depends()):
     """添加边（连接）"""
-    return GraphService.add_edge(project_id, request)
+    return await _mutate(options, GraphService.add_edge, project_id, request)
 
 
 @router.delete("/projects/{project_id}/edges")
-def delete_edge(project_id: str, request: AddEdgeRequest):
+async def delete_edge(project_id: str, request: AddEdgeRequest, options: _MutationOptions = Depends()):
     """删除边"""
-    return GraphService.delete_edge(project_id, request)
+    return await _mutate(options, GraphService.delete_edge, project_id, request)
 
 
 @router.put("/projects/{project_id}/edges")
-def update_edge(project_id: str, request: UpdateEdgeRequest):
+async def update_edge(project_id: str, request: UpdateEdgeRequest, options: _MutationOptions = Depends()):
     """更新边的标签"""
-    return GraphService.update_edge(project_id, request)
+    return await _mutate(options, GraphService.update_edge, project_id, request)
 
 
 @router.get("/projects/{project_id}/graph_analysis")
-def analyze_graph(project_id: str, focus_node: Optional[str] = None):
-    """分析图谱，返回选中节点的DAG路径"""
-    return GraphService.analyze_graph(project_id, focus_node)
+async def analyze_graph(
+    project_id: str,
+    focus_node: Optional[str] = None,
+    include_paths: bool = False,
+    max_paths: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    timeout_ms: Optional[int] = None
+):
+    """分析图谱，返回选中节点的祖先/后代子图（可选返回有上限的路径列表）"""
+    return _json(await async_storage.run_read(
+        GraphService.analyze_graph, project_id, focus_node,
+        include_paths, max_paths, max_depth, timeout_ms
+    ))
+
+
+@router.get("/projects/{project_id}/graph_analysis/paths")
+async def stream_graph_paths(
+    project_id: str,
+    focus_node: str,
+    cursor: Optional[str] = None,
+    max_depth: Optional[int] = None,
+    limit: Optional[int] = None
+):
+    """流式枚举选中节点的全部路径（NDJSON，最后一行给出续传游标）"""
+    lines = await async_storage.run_read(
+        GraphService.stream_paths, project_id, focus_node, cursor, max_depth, limit
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.post("/projects/{project_id}/graph_analysis/batch")
+async def analyze_graph_batch(project_id: str, request: GraphAnalysisBatchRequest):
+    """批量分析多个焦点节点（或全部节点），整批共用一次图构建，结果以 NDJSON 流式返回"""
+    lines = await async_storage.run_read(
+        GraphService.analyze_graph_batch, project_id, request.focus_nodes, request.max_depth
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.get("/projects/{project_id}/path")
+async def find_path(
+    project_id: str,
+    source: str = Query(..., alias="from"),
+    target: str = Query(..., alias="to"),
+    mode: str = "shortest",
+    weighted: bool = False
+):
+    """两个节点之间的最短/最长前置链（weighted=true 时以数字标签为边权）"""
+    return _json(await async_storage.run_read(
+        GraphService.find_path, project_id, source, target, mode, weighted
+    ))
+
+
+@router.get("/projects/{project_id}/graph_metrics")
+async def get_graph_metrics(project_id: str):
+    """整图指标：拓扑层级、关键路径、出入度、根/叶节点、连通分量、章节间连接数"""
+    return _json(await async_storage.run_read(GraphService.get_graph_metrics, project_id))
+
+
+@router.get("/projects/{project_id}/graph_layout")
+async def get_graph_layout(project_id: str):
+    """服务端分层布局坐标（按图结构缓存，前端直接绘制）"""
+    return _json(await async_storage.run_read(GraphService.get_graph_layout, project_id))
+
+
+@router.post("/projects/{project_id}/transitive_reduction")
+async def transitive_reduction(project_id: str, dry_run: bool = True):
+    """报告传递归约中的冗余边；dry_run=false 时在一个事务中删除它们"""
+    run = async_storage.run_read if dry_run else async_storage.run_write
+    return _json(await run(GraphService.transitive_reduction, project_id, dry_run))
 
 
 @router.get("/projects/{project_id}/export")
-def export_project(project_id: str):
+async def export_project(project_id: str):
     """导出项目为 YAML 格式"""
-    from fastapi.responses import Response
     import re
     
-    yaml_content = ExportService.export_to_yaml(project_id)
-    project = ProjectService.get_project(project_id)
+    yaml_content = await async_storage.run_read(ExportService.export_to_yaml, project_id)
+    project = await async_storage.run_read(ProjectService.get_project, project_id, readonly=True)
     
     # 创建完全 ASCII 安全的文件名
     # 只保留 ASCII 字母、数字、下划线和连字符
@@ -238,9 +440,9 @@ def export_project(project_id: str):
 
 
 @router.get("/projects/{project_id}/nodes/{node_id}/location")
-def get_node_location(project_id: str, node_id: str):
+async def get_node_location(project_id: str, node_id: str):
     """获取节点位置信息"""
-    project = ProjectService.get_project(project_id)
+    project = await async_storage.run_read(ProjectService.get_project, project_id, readonly=True)
     location = GraphService.find_node_location(project, node_id)
     if not location:
         raise HTTPException(status_code=404, detail="Node not found")
@@ -248,15 +450,16 @@ def get_node_location(project_id: str, node_id: str):
 
 
 @router.post("/projects/import")
-def import_project(file: UploadFile = File(...), project_name: Optional[str] = None):
+async def import_project(file: UploadFile = File(...), project_name: Optional[str] = None):
     """从 YAML 文件导入项目"""
     try:
         # 读取文件内容
-        content = file.file.read()
+        content = await file.read()
         yaml_content = content.decode('utf-8')
         
-        # 导入项目
-        project = ExportService.import_from_yaml(yaml_content, project_name)
+        # 导入项目：解析在读线程池中执行，只有最后的保存占用写线程
+        project = await async_storage.run_read(ExportService.parse_yaml_project, yaml_content, project_name)
+        await async_storage.add(project)
         
         return {
             "message": "项目导入成功",
@@ -1,12 +1,17 @@
 """业务逻辑服务模块"""
+import base64
+import json
+import math
+import time
 from datetime import datetime
-from typing import Optional, Dict, List
-import networkx as nx
+from itertools import chain
+from typing import Callable, Optional, Dict, Iterator, List, Set, Tuple
 import yaml
 from fastapi import HTTPException
 
 from knowledge_dag.models import (
-    Project, Chapter, Section, Node, Edge,
+    Project, Chapter, Section, Node, Edge, ChapterResponse, NodeContentsResponse, ProjectChanges,
+    ProjectDelta, ViewportResponse,
     CreateProjectRequest, AddChapterRequest, AddSectionRequest,
     AddNodeRequest, UpdateNodeRequest, AddEdgeRequest, UpdateEdgeRequest,
     ReorderNodesRequest, ReorderSectionsRequest, ReorderChaptersRequest,
@@ -14,29 +19,115 @@ from knowledge_dag.models import (
     UpdateChapterPositionRequest
 )
 from knowledge_dag.storage import storage
+from knowledge_dag.async_storage import async_storage
+from knowledge_dag.config import settings
+from knowledge_dag.layout import layered_layout
+from knowledge_dag.graph import (
+    CycleError, IndexCache, ReachabilityIndex, best_path, dag_indexes, graph_fingerprint, graph_indexes,
+    graph_metrics, iter_paths, label_weights, reach_indexes, redundant_edges, structure_fingerprint
+)
+
+# PyYAML 编译了 libyaml 时使用 C 实现的解析器，大文件导入快一个数量级
+YamlSafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 class ProjectService:
     """项目服务"""
     
+    # ?fields= 路径中可以继续选择子字段的列表字段：{模型: {字段: 元素模型}}
+    _NESTED_FIELDS = {
+        Project: {"chapters": Chapter, "edges": Edge},
+        Chapter: {"sections": Section},
+        Section: {"nodes": Node},
+    }
+    # 只选择列表元素的部分字段时自动带上的标识字段
+    _IDENTITY_FIELDS = {
+        Chapter: ("id",),
+        Section: ("id",),
+        Node: ("id",),
+        Edge: ("source", "target"),
+    }
+    # 项目骨架：除节点 content 以外的全部字段（model_dump 的 exclude 参数）
+    SKELETON_EXCLUDE = {"chapters": {"__all__": {"sections": {"__all__": {"nodes": {"__all__": {"content"}}}}}}}
+    
     @staticmethod
-    def get_all_projects() -> List[Dict]:
-        """获取所有项目列表"""
-        projects = storage.get_all()
-        return [
-            {
-                "id": project.id,
-                "name": project.name,
-                "created_at": project.created_at,
-                "updated_at": project.updated_at
-            }
-            for project in projects.values()
-        ]
+    def parse_fields(fields: Optional[str]) -> Optional[Dict]:
+        """解析 ?fields=，返回 model_dump 的 include 参数（为空时返回 None，即完整项目）
+        
+        fields 为逗号分隔的字段路径，如 "name,version,edges,chapters.name,chapters.sections.nodes.name"：
+        路径指向列表字段时包含整个子树；选择列表元素的子字段时自动带上元素的标识字段
+        （章节/部分/节点为 id，边为 source、target）。
+        """
+        if fields is None or not fields.strip():
+            return None
+        include: Dict = {}
+        for path in fields.split(","):
+            path = path.strip()
+            if not path:
+                continue
+            model, spec = Project, include
+            parts = path.split(".")
+            for depth, part in enumerate(parts):
+                if part not in model.model_fields:
+                    raise HTTPException(status_code=400, detail=f"Unknown field: {path}")
+                if depth == len(parts) - 1:
+                    spec[part] = True
+                    break
+                nested = ProjectService._NESTED_FIELDS.get(model, {}).get(part)
+                if nested is None:
+                    raise HTTPException(status_code=400, detail=f"Field {part} has no sub-fields: {path}")
+                current = spec.get(part)
+                if current is True:
+                    break
+                if current is None:
+                    current = spec[part] = {
+                        "__all__": {name: True for name in ProjectService._IDENTITY_FIELDS[nested]}
+                    }
+                model, spec = nested, current["__all__"]
+        return include or None
+    
+    @staticmethod
+    def selects_content(include: Optional[Dict]) -> bool:
+        """parse_fields 的结果是否包含节点 content（不包含时可以跳过读取 content 列）"""
+        spec = include
+        for part in ("chapters", "sections", "nodes", "content"):
+            if spec is None or spec is True:
+                return True
+            value = spec.get(part)
+            if value is None:
+                return False
+            spec = value if value is True else value["__all__"]
+        return True
+    
+    @staticmethod
+    def get_all_projects(limit: Optional[int] = None, offset: int = 0,
+                         sort: Optional[str] = None, order: str = "desc",
+                         with_counts: bool = False) -> List[Dict]:
+        """获取所有项目列表（只读取 projects 表，不加载项目树）"""
+        if sort is not None and sort not in storage.SUMMARY_SORT_FIELDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"sort must be one of: {', '.join(storage.SUMMARY_SORT_FIELDS)}"
+            )
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+        if limit is not None and limit < 0:
+            raise HTTPException(status_code=400, detail="limit must be >= 0")
+        if offset < 0:
+            raise HTTPException(status_code=400, detail="offset must be >= 0")
+        
+        return storage.list_summaries(
+            limit=limit,
+            offset=offset,
+            sort_by=sort,
+            descending=(order == "desc"),
+            with_counts=with_counts
+        )
     
     @staticmethod
     def create_project(request: CreateProjectRequest) -> Project:
         """创建新项目"""
-        project_id = f"proj_{len(storage.get_all()) + 1}_{int(datetime.now().timestamp())}"
+        project_id = f"proj_{storage.count() + 1}_{int(datetime.now().timestamp())}"
         now = datetime.now().isoformat()
         
         new_project = Project(
@@ -51,11 +142,150 @@ class ProjectService:
         return new_project
     
     @staticmethod
-    def get_project(project_id: str) -> Project:
-        """获取项目详情"""
-        if not storage.exists(project_id):
+    def get_project(project_id: str, readonly: bool = False) -> Project:
+        """获取项目详情
+        
+        readonly 为 True 时返回缓存中的共享对象（调用方不得修改），
+        否则返回可修改的独立副本。
+        """
+        try:
+            return storage.get(project_id, copy=not readonly)
+        except KeyError:
             raise HTTPException(status_code=404, detail="Project not found")
-        return storage.get(project_id)
+    
+    @staticmethod
+    def get_project_if_changed(project_id: str, known_versions: Optional[Set[int]] = None,
+                               content: bool = True) -> Tuple[int, Optional[Project]]:
+        """条件获取项目（If-None-Match）
+        
+        当前版本在 known_versions 中（客户端持有的就是最新数据）时只查询一次版本号，
+        返回 (版本, None)，不加载也不复制项目树；否则返回 (版本, 只读的共享项目)。
+        content 为 False 时响应不包含节点 content，缓存未命中时不读取 content 列。
+        """
+        if known_versions:
+            version = storage.get_version(project_id)
+            if version is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            if version in known_versions:
+                return version, None
+        try:
+            project = storage.get(project_id, copy=False, content=content)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return project.version, project
+    
+    @staticmethod
+    def get_viewport(project_id: str, x0: float, y0: float, x1: float, y1: float) -> ViewportResponse:
+        """视口查询：包围盒与矩形相交的章节/部分/节点及相连的边（由 R*Tree 索引支持）"""
+        if not all(math.isfinite(value) for value in (x0, y0, x1, y1)):
+            raise HTTPException(status_code=400, detail="Viewport coordinates must be finite numbers")
+        if x0 > x1 or y0 > y1:
+            raise HTTPException(status_code=400, detail="Viewport requires x0 <= x1 and y0 <= y1")
+        try:
+            version, chapters, edges = storage.query_viewport(project_id, x0, y0, x1, y1)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return ViewportResponse(
+            project_id=project_id, version=version,
+            x0=x0, y0=y0, x1=x1, y1=y1,
+            chapters=chapters, edges=edges
+        )
+    
+    @staticmethod
+    def get_node_contents(project_id: str, node_ids: List[str]) -> NodeContentsResponse:
+        """批量获取节点内容（配合项目骨架按需加载笔记）"""
+        try:
+            version, contents = storage.get_node_contents(project_id, node_ids)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return NodeContentsResponse(
+            project_id=project_id,
+            version=version,
+            contents=contents,
+            missing=[node_id for node_id in dict.fromkeys(node_ids) if node_id not in contents]
+        )
+    
+    @staticmethod
+    def run_if_match(project_id: str, expected_versions: Set[int], func: Callable[[], Project]) -> Project:
+        """If-Match 乐观并发控制：项目当前版本不在 expected_versions 中时拒绝修改（412）
+        
+        必须与修改在同一个写线程单元中执行，版本检查与写入之间不会插入其他写操作。
+        """
+        version = storage.get_version(project_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        if version not in expected_versions:
+            raise HTTPException(
+                status_code=412,
+                detail=f"Project has been modified since it was fetched (current version {version})"
+            )
+        return func()
+    
+    @staticmethod
+    def run_with_delta(func: Callable[..., Project], *args) -> ProjectDelta:
+        """执行一次修改，返回它写入的行级变更而不是整个项目
+        
+        必须与修改在同一个写线程单元中执行（所有写操作串行，last_delta 不会被其他请求覆盖）。
+        修改没有实际写入时（如添加已存在的边）返回不含任何行、版本号不变的变更。
+        """
+        previous = storage.last_delta
+        project = func(*args)
+        delta = storage.last_delta
+        if delta is previous or delta is None or delta.project_id != project.id:
+            return ProjectDelta(
+                project_id=project.id,
+                base_version=project.version,
+                version=project.version,
+                updated_at=project.updated_at
+            )
+        return delta
+    
+    # 变更日志单次最多返回的条目数
+    MAX_CHANGES_LIMIT = 10000
+    
+    @staticmethod
+    def get_changes(project_id: str, since: int, limit: int = 1000, compact: bool = False) -> ProjectChanges:
+        """获取项目在版本 since 之后的变更（增量同步）
+        
+        日志不再覆盖 since 之后的全部变更（已过期、记录变更日志之前的版本或日志被关闭）时返回 410，
+        调用方需要重新获取完整项目，再以其版本号作为 since 继续同步。
+        compact 为真时把返回的变更合并为一条。
+        """
+        if since < 0:
+            raise HTTPException(status_code=400, detail="since must be a non-negative version")
+        if not 1 <= limit <= ProjectService.MAX_CHANGES_LIMIT:
+            raise HTTPException(status_code=400,
+                                detail=f"limit must be between 1 and {ProjectService.MAX_CHANGES_LIMIT}")
+        try:
+            latest, deltas = storage.read_changes(project_id, since, limit + 1)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Project not found")
+        if since > latest:
+            raise HTTPException(status_code=400, detail=f"since ({since}) is newer than the project version ({latest})")
+        
+        has_more = len(deltas) > limit
+        deltas = deltas[:limit]
+        # 第一条必须覆盖 since，之后每条都必须紧接上一条（合并过的条目覆盖一个区间）
+        previous = since
+        for delta in deltas:
+            if delta.base_version > previous:
+                raise HTTPException(status_code=410,
+                                    detail=f"Changes since version {previous} are no longer available; reload the project")
+            previous = delta.version
+        if not has_more and previous != latest:
+            raise HTTPException(status_code=410,
+                                detail=f"Changes since version {previous} are no longer available; reload the project")
+        
+        if compact and len(deltas) > 1:
+            deltas = [storage.merge_deltas(deltas)]
+        return ProjectChanges(
+            project_id=project_id,
+            since=since,
+            version=previous,
+            latest_version=latest,
+            has_more=has_more,
+            changes=deltas
+        )
     
     @staticmethod
     def update_project(project_id: str, name: str) -> Project:
@@ -72,11 +302,24 @@ class ProjectService:
         if not storage.exists(project_id):
             raise HTTPException(status_code=404, detail="Project not found")
         storage.delete(project_id)
+        for cache in (edge_weights_cache, graph_metrics_cache, graph_layout_cache):
+            cache.invalidate(project_id)
 
 
 class ChapterService:
     """章节服务"""
     
+    @staticmethod
+    def get_chapter(project_id: str, chapter_id: str) -> ChapterResponse:
+        """获取单个章节及与其节点相连的边（只查询该章节的行，不加载项目树）"""
+        try:
+            version, chapter, edges = storage.load_chapter(project_id, chapter_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Project not found")
+        if chapter is None:
+            raise HTTPException(status_code=404, detail="Chapter not found")
+        return ChapterResponse(project_id=project_id, version=version, chapter=chapter, edges=edges)
+    
     @staticmethod
     def add_chapter(project_id: str, request: AddChapterRequest) -> Project:
         """添加章节"""
@@ -134,32 +377,19 @@ class ChapterService:
     def update_chapter_position(project_id: str, chapter_id: str, x: Optional[float] = None, 
                                 y: Optional[float] = None, width: Optional[float] = None, 
                                 height: Optional[float] = None) -> Project:
-        """更新章节位置和尺寸"""
-        project = ProjectService.get_project(project_id)
-        
-        # 找到要更新的章节
-        chapter_to_update = None
-        for chapter in project.chapters:
-            if chapter.id == chapter_id:
-                chapter_to_update = chapter
-                break
+        """更新章节位置和尺寸（单行 UPDATE，不重写整个项目）"""
+        if not storage.exists(project_id):
+            raise HTTPException(status_code=404, detail="Project not found")
         
-        if not chapter_to_update:
+        updated = storage.update_chapter_geometry(
+            project_id, chapter_id, x, y, width, height,
+            updated_at=datetime.now().isoformat()
+        )
+        if not updated:
             raise HTTPException(status_code=404, detail="Chapter not found")
         
-        # 更新位置和尺寸
-        if x is not None:
-            chapter_to_update.x = x
-        if y is not None:
-            chapter_to_update.y = y
-        if width is not None:
-            chapter_to_update.width = width
-        if height is not None:
-            chapter_to_update.height = height
-        
-        project.updated_at = datetime.now().isoformat()
-        storage.update(project)
-        return project
+        # 返回独立副本，不把缓存中与读线程共享的对象交给路由
+        return storage.get(project_id)
     
     @staticmethod
     def update_chapter_position_payload(project_id: str, payload: dict) -> Project:
@@ -241,14 +471,8 @@ class ChapterService:
         # 删除章节
         project.chapters = [ch for ch in project.chapters if ch.id != chapter_id]
         
-        # 清理相关的边（删除所有包含这些节点的边）
-        edges_before = len(project.edges)
-        project.edges = [
-            e for e in project.edges 
-            if e.source not in node_ids_to_remove and e.target not in node_ids_to_remove
-        ]
-        edges_after = len(project.edges)
-        edges_removed = edges_before - edges_after
+        # 清理相关的边（集合判断，只过滤一遍边列表）
+        project.remove_node_edges(node_ids_to_remove)
         
         project.updated_at = datetime.now().isoformat()
         storage.update(project)
@@ -350,8 +574,9 @@ class SectionService:
     
     @staticmethod
     def update_section_position(project_id: str, request: UpdateSectionPositionRequest) -> Project:
-        """更新部分位置和尺寸"""
-        project = ProjectService.get_project(project_id)
+        """更新部分位置和尺寸（单行 UPDATE，不重写整个项目）"""
+        if not storage.exists(project_id):
+            raise HTTPException(status_code=404, detail="Project not found")
 
         # 基本参数校验（避免 422，改为 400）
         if not request.section_id or not request.chapter_id:
@@ -359,40 +584,19 @@ class SectionService:
         # 坐标兜底
         x = request.x if request.x is not None else 0
         y = request.y if request.y is not None else 0
-        w = request.width
-        h = request.height
-        
-        # 查找章节
-        chapter = None
-        for ch in project.chapters:
-            if ch.id == request.chapter_id:
-                chapter = ch
-                break
-        
-        if not chapter:
-            raise HTTPException(status_code=404, detail="Chapter not found")
-        
-        # 查找部分
-        section = None
-        for sec in chapter.sections:
-            if sec.id == request.section_id:
-                section = sec
-                break
         
-        if not section:
+        updated = storage.update_section_geometry(
+            project_id, request.chapter_id, request.section_id,
+            x, y, request.width, request.height,
+            updated_at=datetime.now().isoformat()
+        )
+        if not updated:
+            if not storage.chapter_exists(project_id, request.chapter_id):
+                raise HTTPException(status_code=404, detail="Chapter not found")
             raise HTTPException(status_code=404, detail="Section not found in the specified chapter")
         
-        # 更新位置和尺寸
-        section.x = x
-        section.y = y
-        if w is not None:
-            section.width = w
-        if h is not None:
-            section.height = h
-        
-        project.updated_at = datetime.now().isoformat()
-        storage.update(project)
-        return project
+        # 返回独立副本，不把缓存中与读线程共享的对象交给路由
+        return storage.get(project_id)
 
     @staticmethod
     def update_section_position_payload(project_id: str, payload: dict) -> Project:
@@ -480,14 +684,8 @@ class SectionService:
         # 删除 section
         target_chapter.sections = [s for s in target_chapter.sections if s.id != section_id]
         
-        # 清理相关的边（删除所有包含这些节点的边）
-        edges_before = len(project.edges)
-        project.edges = [
-            e for e in project.edges 
-            if e.source not in node_ids_to_remove and e.target not in node_ids_to_remove
-        ]
-        edges_after = len(project.edges)
-        edges_removed = edges_before - edges_after
+        # 清理相关的边（集合判断，只过滤一遍边列表）
+        project.remove_node_edges(node_ids_to_remove)
         
         project.updated_at = datetime.now().isoformat()
         storage.update(project)
@@ -542,7 +740,12 @@ class NodeService:
         section.nodes.append(new_node)
         project.updated_at = datetime.now().isoformat()
         
+        old_version = project.version
         storage.update(project)
+        dag_indexes.advance(project_id, old_version, project.version,
+                            lambda dag: dag.add_node(new_node_id))
+        reach_indexes.advance(project_id, old_version, project.version,
+                              lambda reach: reach.with_node_added(new_node_id))
         return project
     
     @staticmethod
@@ -683,58 +886,26 @@ class NodeService:
     
     @staticmethod
     def update_node_position(project_id: str, request: UpdateNodePositionRequest) -> Project:
-        """更新节点位置"""
-        project = ProjectService.get_project(project_id)
+        """更新节点位置（按复合主键单行 UPDATE，不重写整个项目）"""
+        if not storage.exists(project_id):
+            raise HTTPException(status_code=404, detail="Project not found")
         
-        # 验证节点确实属于指定的 section
-        location = NodeService._find_node_location(
-            project, 
-            request.node_id,
-            section_id=request.section_id
+        updated = storage.update_node_geometry(
+            project_id, request.node_id, request.x, request.y,
+            request.width, request.height,
+            updated_at=datetime.now().isoformat(),
+            section_id=request.section_id,
+            chapter_id=request.chapter_id
         )
-        if not location:
-            raise HTTPException(status_code=404, detail="Node not found in the specified project/section")
-        
-        # 双重验证：确保 section_id 匹配
-        if location["section_id"] != request.section_id:
-            raise HTTPException(status_code=400, detail="Section ID mismatch: node belongs to different section")
-        
-        # 验证 section 确实属于指定的项目
-        section_found = False
-        target_chapter = None
-        for chapter in project.chapters:
-            # 如果提供了 chapter_id，进行验证
-            if request.chapter_id and chapter.id != request.chapter_id:
-                continue
-            for section in chapter.sections:
-                if section.id == request.section_id:
-                    section_found = True
-                    target_chapter = chapter
-                    break
-            if section_found:
-                break
-        
-        if not section_found:
-            error_msg = "Section not found in the specified project"
-            if request.chapter_id:
-                error_msg += f"/chapter {request.chapter_id}"
-            raise HTTPException(status_code=404, detail=error_msg)
-        
-        # 如果提供了 chapter_id，验证是否匹配
-        if request.chapter_id and location["chapter_id"] != request.chapter_id:
+        if not updated:
+            # 区分“节点不在该部分”与“章节不匹配”两种错误
+            location = storage.find_node(project_id, request.node_id, section_id=request.section_id)
+            if not location:
+                raise HTTPException(status_code=404, detail="Node not found in the specified project/section")
             raise HTTPException(status_code=400, detail="Chapter ID mismatch: node belongs to different chapter")
         
-        node = location["node"]
-        node.x = request.x
-        node.y = request.y
-        if request.width is not None:
-            node.width = request.width
-        if request.height is not None:
-            node.height = request.height
-        
-        project.updated_at = datetime.now().isoformat()
-        storage.update(project)
-        return project
+        # 返回独立副本，不把缓存中与读线程共享的对象交给路由
+        return storage.get(project_id)
     
     @staticmethod
     def delete_node(project_id: str, node_id: str, chapter_id: Optional[str] = None, section_id: Optional[str] = None) -> Project:
@@ -781,10 +952,15 @@ class NodeService:
             raise HTTPException(status_code=404, detail=f"Node {node_id} not found in section {section.id}")
         
         # 清理相关的边（删除所有包含该节点的边）
-        project.edges = [e for e in project.edges if e.source != node_id and e.target != node_id]
+        project.remove_node_edges([node_id])
         
         project.updated_at = datetime.now().isoformat()
+        old_version = project.version
         storage.update(project)
+        dag_indexes.advance(project_id, old_version, project.version,
+                            lambda dag: dag.remove_node(node_id))
+        reach_indexes.advance(project_id, old_version, project.version,
+                              lambda reach: reach.with_node_removed(node_id))
         
         return project
 
@@ -792,16 +968,6 @@ class NodeService:
 class GraphService:
     """图谱服务"""
     
-    @staticmethod
-    def _get_graph(project: Project) -> nx.DiGraph:
-        """构建 NetworkX 有向图"""
-        G = nx.DiGraph()
-        nodes_dict = NodeService._get_all_nodes(project)
-        G.add_nodes_from(nodes_dict.keys())
-        # 将 Edge 对象转换为 (source, target) 元组
-        G.add_edges_from([(e.source, e.target) for e in project.edges])
-        return G
-    
     @staticmethod
     def find_node_location(project: Project, node_id: str) -> Optional[Dict]:
         """查找节点所在的位置"""
@@ -817,22 +983,24 @@ class GraphService:
         if request.source not in all_nodes or request.target not in all_nodes:
             raise HTTPException(status_code=404, detail="Source or Target node not found")
         
-        # 检查边是否已存在
-        existing_edge = next(
-            (e for e in project.edges if e.source == request.source and e.target == request.target),
-            None
+        # DAG 环检测：使用持久的增量拓扑序索引，只搜索受影响的区域
+        cycle_error = HTTPException(
+            status_code=400, 
+            detail="Cycle detected! Knowledge graphs must be acyclic."
         )
-        if existing_edge:
+        try:
+            dag = dag_indexes.get(project)
+        except CycleError:
+            raise cycle_error
+        
+        # 检查边是否已存在
+        if dag.has_edge(request.source, request.target):
             return project
         
-        # DAG 环检测
-        G = GraphService._get_graph(project)
-        G.add_edge(request.source, request.target)
-        if not nx.is_directed_acyclic_graph(G):
-            raise HTTPException(
-                status_code=400, 
-                detail="Cycle detected! Knowledge graphs must be acyclic."
-            )
+        try:
+            dag.add_edge(request.source, request.target)
+        except CycleError:
+            raise cycle_error
         
         # 创建新的边对象
         new_edge = Edge(
@@ -840,9 +1008,18 @@ class GraphService:
             target=request.target,
             label=request.label or ""
         )
-        project.edges.append(new_edge)
+        project.add_edge(new_edge)
         project.updated_at = datetime.now().isoformat()
-        storage.update(project)
+        old_version = project.version
+        try:
+            storage.update(project)
+        except Exception:
+            # 索引已包含新边，保存失败时必须丢弃
+            dag_indexes.invalidate(project_id)
+            raise
+        dag_indexes.put(project_id, project.version, dag)
+        reach_indexes.advance(project_id, old_version, project.version,
+                              lambda reach: reach.with_edge_added(request.source, request.target))
         return project
     
     @staticmethod
@@ -850,12 +1027,14 @@ class GraphService:
         """删除边"""
         project = ProjectService.get_project(project_id)
         
-        project.edges = [
-            e for e in project.edges 
-            if not (e.source == request.source and e.target == request.target)
-        ]
+        project.remove_edges([(request.source, request.target)])
         project.updated_at = datetime.now().isoformat()
+        old_version = project.version
         storage.update(project)
+        dag_indexes.advance(project_id, old_version, project.version,
+                            lambda dag: dag.remove_edge(request.source, request.target))
+        reach_indexes.advance(project_id, old_version, project.version,
+                              lambda reach: reach.with_edge_removed(request.source, request.target))
         return project
     
     @staticmethod
@@ -863,10 +1042,7 @@ class GraphService:
         """更新边的标签"""
         project = ProjectService.get_project(project_id)
         
-        edge = next(
-            (e for e in project.edges if e.source == request.source and e.target == request.target),
-            None
-        )
+        edge = project.find_edge(request.source, request.target)
         if not edge:
             raise HTTPException(status_code=404, detail="Edge not found")
         
@@ -876,48 +1052,419 @@ class GraphService:
         return project
     
     @staticmethod
-    def analyze_graph(project_id: str, focus_node: Optional[str] = None):
-        """分析图谱，返回选中节点的DAG路径"""
+    def transitive_reduction(project_id: str, dry_run: bool = True):
+        """报告（或删除）传递归约中的冗余边
+        
+        A -> C 在存在 A -> B -> C 时是冗余的：删除后祖先/后代关系不变，但路径枚举的数量大幅减少。
+        dry_run 为真时只读报告；否则在一次 storage.update 事务中删除全部冗余边。
+        """
+        from knowledge_dag.models import TransitiveReductionResponse
+        
+        project = ProjectService.get_project(project_id, readonly=dry_run)
+        try:
+            redundant = set(redundant_edges(graph_indexes.get(project)))
+        except CycleError:
+            raise HTTPException(status_code=409, detail="Graph contains a cycle; transitive reduction requires a DAG")
+        
+        edge_count = len(project.edges)
+        removed = [edge for edge in project.edges if (edge.source, edge.target) in redundant]
+        if not dry_run and removed:
+            project.remove_edges(redundant)
+            project.updated_at = datetime.now().isoformat()
+            old_version = project.version
+            storage.update(project)
+            
+            def remove_all(dag):
+                for source, target in redundant:
+                    dag.remove_edge(source, target)
+            
+            # 拓扑序在删边后仍然有效，原地推进；闭包不变但邻接表变了，闭包快照在下次使用时重建
+            dag_indexes.advance(project_id, old_version, project.version, remove_all)
+        
+        return TransitiveReductionResponse(
+            dry_run=dry_run,
+            version=project.version,
+            edge_count=edge_count,
+            redundant_count=len(removed),
+            removed_count=0 if dry_run else len(removed),
+            redundant_edges=removed
+        )
+    
+    @staticmethod
+    def analyze_graph(project_id: str, focus_node: Optional[str] = None, include_paths: bool = False,
+                      max_paths: Optional[int] = None, max_depth: Optional[int] = None,
+                      timeout_ms: Optional[int] = None):
+        """分析图谱，返回选中节点的祖先/后代子图
+        
+        默认只返回紧凑的子图（高亮节点 + 它们之间的边），不枚举路径。
+        include_paths 为真时额外枚举路径，受 max_paths、max_depth、timeout_ms 限制；
+        被截断时 truncated 为真，cursor 可交给 stream_paths 继续枚举剩余路径。
+        """
         from knowledge_dag.models import GraphAnalysisResponse
         
-        project = ProjectService.get_project(project_id)
+        max_paths = settings.graph_max_paths if max_paths is None else max_paths
+        timeout_ms = settings.graph_path_timeout_ms if timeout_ms is None else timeout_ms
+        if max_paths < 1 or timeout_ms < 1 or (max_depth is not None and max_depth < 1):
+            raise HTTPException(status_code=400, detail="max_paths, max_depth and timeout_ms must be >= 1")
+        
+        project = ProjectService.get_project(project_id, readonly=True)
         
         if not focus_node:
             return GraphAnalysisResponse()
         
-        G = GraphService._get_graph(project)
-        if focus_node not in G:
+        graph = GraphService._graph_snapshot(project)
+        if focus_node not in graph:
             return GraphAnalysisResponse()
         
-        # 获取祖先和后代
-        ancestors = list(nx.ancestors(G, focus_node))
-        descendants = list(nx.descendants(G, focus_node))
+        # 获取祖先和后代（闭包索引直接查位集，CSR 图或限制深度时广度优先搜索）
+        ancestors = graph.ancestors(focus_node, max_depth)
+        descendants = graph.descendants(focus_node, max_depth)
         related = ancestors + descendants + [focus_node]
+        edges = graph.induced_edges(related)
         
-        # 获取所有路径
         paths = []
-        # 从所有祖先到焦点节点的路径
-        for ancestor in ancestors:
-            try:
-                for path in nx.all_simple_paths(G, ancestor, focus_node):
-                    paths.append(path)
-            except:
-                pass
-        
-        # 从焦点节点到所有后代的路径
-        for descendant in descendants:
-            try:
-                for path in nx.all_simple_paths(G, focus_node, descendant):
-                    paths.append(path)
-            except:
-                pass
+        truncated = False
+        cursor = None
+        if include_paths:
+            deadline = time.perf_counter() + timeout_ms / 1000
+            last = None
+            for direction, path in GraphService._iter_focus_paths(graph, focus_node, max_depth):
+                if len(paths) >= max_paths or time.perf_counter() > deadline:
+                    truncated = True
+                    break
+                paths.append(path[::-1] if direction == "up" else path)
+                last = (direction, path)
+            if truncated and last:
+                fingerprint = graph_fingerprint((e.source, e.target) for e in project.edges)
+                cursor = GraphService._encode_path_cursor(fingerprint, last)
         
         return GraphAnalysisResponse(
             highlight=related,
+            edges=edges,
             paths=paths,
             ancestors=ancestors,
-            descendants=descendants
+            descendants=descendants,
+            truncated=truncated,
+            cursor=cursor
+        )
+    
+    @staticmethod
+    def stream_paths(project_id: str, focus_node: str, cursor: Optional[str] = None,
+                     max_depth: Optional[int] = None, limit: Optional[int] = None) -> Iterator[str]:
+        """流式枚举焦点节点的全部路径（NDJSON）
+        
+        每行一个 {"path": [...]}，最后一行为 {"done": true}；达到 limit 时最后一行为
+        {"done": false, "cursor": ...}，带上游标再次请求即可从中断处继续。
+        参数和游标在返回生成器之前校验，错误会以正常的 HTTP 状态码返回。
+        """
+        if (limit is not None and limit < 1) or (max_depth is not None and max_depth < 1):
+            raise HTTPException(status_code=400, detail="limit and max_depth must be >= 1")
+        
+        project = ProjectService.get_project(project_id, readonly=True)
+        graph = GraphService._graph_snapshot(project)
+        if focus_node not in graph:
+            raise HTTPException(status_code=404, detail="Node not found")
+        
+        fingerprint = None
+        if cursor or limit:
+            fingerprint = graph_fingerprint((e.source, e.target) for e in project.edges)
+        resume = GraphService._decode_path_cursor(cursor, fingerprint) if cursor else None
+        paths = GraphService._iter_focus_paths(graph, focus_node, max_depth, resume)
+        try:
+            first = next(paths, None)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        
+        def generate():
+            emitted = 0
+            last = None
+            if first is not None:
+                for direction, path in chain([first], paths):
+                    if limit is not None and emitted >= limit:
+                        next_cursor = GraphService._encode_path_cursor(fingerprint, last)
+                        yield json.dumps({"done": False, "cursor": next_cursor}) + "\n"
+                        return
+                    display = path[::-1] if direction == "up" else path
+                    yield json.dumps({"path": display}, ensure_ascii=False) + "\n"
+                    emitted += 1
+                    last = (direction, path)
+            yield json.dumps({"done": True}) + "\n"
+        
+        return generate()
+    
+    @staticmethod
+    def analyze_graph_batch(project_id: str, focus_nodes, max_depth: Optional[int] = None) -> Iterator[str]:
+        """批量分析多个焦点节点（NDJSON 流）
+        
+        整批只加载一次项目、取一次图快照。快照为闭包索引且不限制深度时，祖先/后代
+        位集已在建立索引时一次算好，每个焦点只需展开位集并取诱导子图；否则（节点数
+        超过 graph_reachability_max_nodes、图中有环或指定了 max_depth）每个焦点都要
+        广度优先搜索一遍，整批为 O(焦点数 × (V + E))，因此焦点数超过
+        graph_batch_max_search_nodes 时直接拒绝（400），请分批请求。
+        每行一个 {"focus_node", "highlight", "edges", "ancestors", "descendants"}，
+        与单节点 graph_analysis 的结果一致；不存在的节点给出 {"focus_node", "error"}；
+        最后一行为 {"done": true, "count": 焦点数}。
+        """
+        project = ProjectService.get_project(project_id, readonly=True)
+        graph = GraphService._graph_snapshot(project)
+        if focus_nodes == "all":
+            focus_nodes = list(NodeService._get_all_nodes(project))
+        
+        searching = max_depth is not None or not isinstance(graph, ReachabilityIndex)
+        if searching and len(focus_nodes) > settings.graph_batch_max_search_nodes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch of {len(focus_nodes)} focus nodes exceeds graph_batch_max_search_nodes "
+                       f"({settings.graph_batch_max_search_nodes}) for a graph without a reachability "
+                       f"index or with max_depth; split the request"
+            )
+        
+        def generate():
+            for focus_node in focus_nodes:
+                if focus_node not in graph:
+                    line = {"focus_node": focus_node, "error": "Node not found"}
+                else:
+                    ancestors = graph.ancestors(focus_node, max_depth)
+                    descendants = graph.descendants(focus_node, max_depth)
+                    related = ancestors + descendants + [focus_node]
+                    line = {
+                        "focus_node": focus_node,
+                        "highlight": related,
+                        "edges": graph.induced_edges(related),
+                        "ancestors": ancestors,
+                        "descendants": descendants
+                    }
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "count": len(focus_nodes)}) + "\n"
+        
+        return generate()
+    
+    @staticmethod
+    def find_path(project_id: str, source: str, target: str, mode: str = "shortest",
+                  weighted: bool = False):
+        """两个节点之间的最短/最长路径（学习路线规划）
+        
+        在按版本缓存的 CSR 图上计算：不带权的最短路径用广度优先搜索，
+        带权或最长路径在 source 与 target 之间的子图上做拓扑序动态规划，不枚举路径。
+        闭包索引已缓存时先用它 O(1) 判断可达性，不可达直接返回。
+        """
+        from knowledge_dag.models import GraphPathResponse
+        
+        if mode not in ("shortest", "longest"):
+            raise HTTPException(status_code=400, detail="mode must be 'shortest' or 'longest'")
+        
+        project = ProjectService.get_project(project_id, readonly=True)
+        graph = graph_indexes.get(project)
+        for node_id in (source, target):
+            if node_id not in graph:
+                raise HTTPException(status_code=404, detail=f"Node {node_id} not found")
+        
+        result = None
+        reach = reach_indexes.peek(project)
+        if source == target or reach is None or reach.reaches(source, target):
+            weights = edge_weights_cache.get(project) if weighted else None
+            try:
+                result = best_path(graph, source, target, longest=mode == "longest", weights=weights)
+            except CycleError:
+                raise HTTPException(status_code=409, detail="Graph contains a cycle between the nodes; "
+                                                            "this query requires a DAG")
+        
+        path, length = result if result else ([], None)
+        return GraphPathResponse(
+            source=source,
+            target=target,
+            mode=mode,
+            weighted=weighted,
+            found=result is not None,
+            length=length,
+            path=path
+        )
+    
+    @staticmethod
+    def _build_edge_weights(project: Project):
+        """从边标签解析边权，按下标编码以便在 CSR 图上直接查找"""
+        return label_weights(graph_indexes.get(project),
+                             ((edge.source, edge.target, edge.label) for edge in project.edges))
+    
+    @staticmethod
+    def get_graph_metrics(project_id: str):
+        """整图指标（层级、关键路径、度数、根/叶、连通分量、跨章节连接），按图结构缓存"""
+        project = ProjectService.get_project(project_id, readonly=True)
+        try:
+            return GraphService._at_version(graph_metrics_cache.get(project), project)
+        except CycleError:
+            raise HTTPException(status_code=409, detail="Graph contains a cycle; metrics require a DAG")
+    
+    @staticmethod
+    def _at_version(result, project: Project):
+        """缓存的结果建立于较早的版本时，返回带当前版本号的浅拷贝（缓存项本身不修改）"""
+        if result.version == project.version:
+            return result
+        return result.model_copy(update={"version": project.version})
+    
+    @staticmethod
+    def _build_graph_metrics(project: Project):
+        """在 CSR 图上一次拓扑遍历计算指标，并按章节整理连接统计"""
+        from knowledge_dag.models import GraphMetricsResponse, ChapterLinkMetrics, ChapterCrossLink
+        
+        chapter_of = {node.id: chapter.id for chapter in project.chapters
+                      for section in chapter.sections for node in section.nodes}
+        graph = graph_indexes.get(project)
+        metrics = graph_metrics(graph, chapter_of)
+        group_edges = metrics.pop("group_edges")
+        cross_links = metrics.pop("cross_links")
+        
+        chapters = []
+        for chapter in project.chapters:
+            counts = group_edges.get(chapter.id, {})
+            chapters.append(ChapterLinkMetrics(
+                chapter_id=chapter.id,
+                internal_edges=counts.get("internal", 0),
+                outgoing_edges=counts.get("outgoing", 0),
+                incoming_edges=counts.get("incoming", 0)
+            ))
+        links = [
+            ChapterCrossLink(source_chapter=source, target_chapter=target, count=count)
+            for (source, target), count in sorted(cross_links.items(), key=lambda item: (-item[1], item[0]))
+        ]
+        return GraphMetricsResponse(
+            version=project.version,
+            node_count=len(graph),
+            edge_count=graph.edge_count,
+            chapters=chapters,
+            cross_links=links,
+            **metrics
         )
+    
+    @staticmethod
+    def get_graph_layout(project_id: str):
+        """分层布局坐标（Sugiyama 风格，按章节/部分分块），按图结构缓存"""
+        project = ProjectService.get_project(project_id, readonly=True)
+        try:
+            return GraphService._at_version(graph_layout_cache.get(project), project)
+        except CycleError:
+            raise HTTPException(status_code=409, detail="Graph contains a cycle; layout requires a DAG")
+    
+    @staticmethod
+    def _build_graph_layout(project: Project):
+        """在 CSR 图上计算布局，坐标保留一位小数"""
+        from knowledge_dag.models import GraphLayoutResponse, NodeLayout, EdgeLayout
+        
+        groups = {}
+        for chapter_index, chapter in enumerate(project.chapters):
+            for section_index, section in enumerate(chapter.sections):
+                for node_index, node in enumerate(section.nodes):
+                    groups[node.id] = (chapter_index, section_index, node_index)
+        layout = layered_layout(graph_indexes.get(project), groups)
+        
+        positions = layout["nodes"]
+        nodes = [
+            NodeLayout(id=node_id, x=round(positions[node_id][0], 1), y=positions[node_id][1],
+                       layer=positions[node_id][2])
+            for node_id in chain(groups, (node_id for node_id in positions if node_id not in groups))
+        ]
+        edges = [
+            EdgeLayout(source=source, target=target,
+                       points=[(round(x, 1), y) for x, y in points])
+            for (source, target), points in layout["bends"].items()
+        ]
+        return GraphLayoutResponse(
+            version=project.version,
+            layer_count=layout["layer_count"],
+            width=round(layout["width"], 1),
+            height=layout["height"],
+            crossings=layout["crossings"],
+            nodes=nodes,
+            edges=edges
+        )
+    
+    @staticmethod
+    def _graph_snapshot(project: Project):
+        """获取项目的只读图快照（闭包索引或 CSR 图，两者提供相同的查询接口）
+        
+        正常情况下使用 reach_indexes 中按版本缓存的闭包索引。项目数据中已存在环时
+        （如未经检查导入的数据）无法建立闭包，节点数超过 graph_reachability_max_nodes 时
+        闭包内存过大，这两种情况都退回为按版本缓存的 CSR 图，查询时广度优先搜索。
+        """
+        reach = reach_indexes.peek(project)
+        if reach is not None:
+            return reach
+        graph = graph_indexes.get(project)
+        if len(graph) <= settings.graph_reachability_max_nodes:
+            try:
+                return reach_indexes.get(project)
+            except CycleError:
+                pass
+        return graph
+    
+    @staticmethod
+    def _iter_focus_paths(graph, focus_node: str, max_depth: Optional[int] = None,
+                          resume: Optional[tuple] = None):
+        """依次枚举 祖先 -> 焦点 与 焦点 -> 后代 的路径，产生 (方向, 深度优先路径)
+        
+        方向为 "up" 的路径沿入边从焦点出发，展示时需要反转；
+        resume 为游标中的 (方向, 路径)，从该路径之后继续。
+        """
+        phases = [("up", graph.predecessor_ids), ("down", graph.successor_ids)]
+        if resume and resume[0] == "down":
+            phases = phases[1:]
+        for direction, neighbors in phases:
+            after = resume[1] if resume and resume[0] == direction else None
+            for path in iter_paths(neighbors, focus_node, after=after, max_depth=max_depth):
+                yield direction, path
+    
+    @staticmethod
+    def _encode_path_cursor(fingerprint: str, last: tuple) -> str:
+        """把最后产生的路径编码为游标（附带边集合指纹，图变化后游标失效）"""
+        direction, path = last
+        data = json.dumps({"g": fingerprint, "d": direction, "p": path}, ensure_ascii=False)
+        return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def _decode_path_cursor(cursor: str, fingerprint: str) -> tuple:
+        """解析游标，返回 (方向, 路径)"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            direction, path = data["d"], data["p"]
+            valid = (direction in ("up", "down") and isinstance(path, list)
+                     and all(isinstance(node, str) for node in path))
+        except (ValueError, KeyError, TypeError):
+            valid = False
+        if not valid:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if data.get("g") != fingerprint:
+            raise HTTPException(status_code=409, detail="Graph has changed since the cursor was issued")
+        return direction, path
+
+
+# 整图指标和布局只依赖边集合与章节/部分/节点顺序，按 structure_fingerprint 校验
+# （只读结果，命中时直接返回同一个响应对象），拖拽、改名、改内容不会引起重算；边权依赖边标签，按版本缓存
+edge_weights_cache = IndexCache(GraphService._build_edge_weights,
+                                max_entries=settings.project_cache_max_entries)
+graph_metrics_cache = IndexCache(GraphService._build_graph_metrics,
+                                 max_entries=settings.project_cache_max_entries,
+                                 key=structure_fingerprint)
+graph_layout_cache = IndexCache(GraphService._build_graph_layout,
+                                max_entries=settings.project_cache_max_entries,
+                                key=structure_fingerprint)
+
+
+class MaintenanceService:
+    """运维服务"""
+    
+    @staticmethod
+    def get_storage_stats() -> Dict:
+        """获取存储层运行指标（连接池等待耗时、写队列长度、图索引内存占用等）"""
+        stats = async_storage.stats()
+        stats["graph"] = {
+            "dag": dag_indexes.stats(),
+            "compact": graph_indexes.stats(),
+            "reachability": reach_indexes.stats(),
+            "metrics": graph_metrics_cache.stats(),
+            "layout": graph_layout_cache.stats(),
+            "weights": edge_weights_cache.stats(),
+        }
+        return stats
 
 
 class ExportService:
@@ -926,7 +1473,7 @@ class ExportService:
     @staticmethod
     def export_to_yaml(project_id: str) -> str:
         """导出项目为 YAML 格式"""
-        project = ProjectService.get_project(project_id)
+        project = ProjectService.get_project(project_id, readonly=True)
         
         # 构建 YAML 数据结构（只包含三级结构和边、位置信息）
         yaml_data = {
@@ -993,9 +1540,22 @@ class ExportService:
     @staticmethod
     def import_from_yaml(yaml_content: str, project_name: Optional[str] = None) -> Project:
         """从 YAML 内容导入项目"""
+        new_project = ExportService.parse_yaml_project(yaml_content, project_name)
+        try:
+            storage.add(new_project)
+        except Exception as e:
+            raise ValueError(f"导入失败: {str(e)}")
+        return new_project
+    
+    @staticmethod
+    def parse_yaml_project(yaml_content: str, project_name: Optional[str] = None) -> Project:
+        """解析 YAML 内容并构建新项目（不写入数据库）
+        
+        解析是导入中最耗时的部分且不涉及数据库，可以放在写线程之外执行。
+        """
         try:
             # 解析 YAML
-            data = yaml.safe_load(yaml_content)
+            data = yaml.load(yaml_content, Loader=YamlSafeLoader)
             if not data:
                 raise ValueError("YAML 文件为空或格式错误")
             
@@ -1170,9 +1730,6 @@ class ExportService:
                 if edge.target not in all_node_ids:
                     raise ValueError(f"边的目标节点不存在: {edge.target}")
             
-            # 保存项目
-            storage.add(new_project)
-            
             return new_project
             
         except yaml.YAMLError as e:
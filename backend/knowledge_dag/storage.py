@@ -1,219 +1,449 @@
 """数据存储模块 - SQLite 版本"""
 import sqlite3
 import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Optional
-from datetime import datetime
-from knowledge_dag.models import Project, Chapter, Section, Node, Edge
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from knowledge_dag.models import Project, Chapter, Section, Node, Edge, ProjectDelta
 from knowledge_dag.config import settings
+from knowledge_dag import migrations
+from knowledge_dag.graph import carry_indexes, dag_indexes, graph_indexes, reach_indexes
+
+
+class ConnectionPool:
+    """有界 SQLite 连接池
+    
+    连接按需创建，最多 size 个，用完后放回队列供其他线程复用
+    （AsyncStorage 的读写线程共享连接池，同一连接同一时刻只会被一个线程使用）。
+    连接池耗尽时等待最多 timeout 秒，并记录等待耗时指标。
+    """
+    
+    def __init__(self, factory: Callable[[], sqlite3.Connection], size: int, timeout: float):
+        if size < 1:
+            raise ValueError("Connection pool size must be >= 1")
+        self._factory = factory
+        self._size = size
+        self._timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        # 指标
+        self._acquisitions = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+    
+    def acquire(self) -> sqlite3.Connection:
+        """取出一个连接（必要时新建或等待）"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+        
+        if conn is None:
+            with self._lock:
+                can_create = self._created < self._size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                # 连接池已满，阻塞等待其他线程归还
+                start = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self._timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise TimeoutError(
+                        f"Timed out after {self._timeout}s waiting for a database connection"
+                    )
+                waited = time.perf_counter() - start
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time_total += waited
+                    self._wait_time_max = max(self._wait_time_max, waited)
+        
+        with self._lock:
+            self._acquisitions += 1
+        return conn
+    
+    def release(self, conn: sqlite3.Connection) -> None:
+        """归还连接；未提交的事务会被回滚，损坏的连接直接丢弃"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+    
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """with 语句中使用的连接，退出时自动归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close(self) -> None:
+        """关闭连接池中所有空闲连接；之后归还的连接也会被直接关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+    
+    def stats(self) -> Dict[str, float]:
+        """连接池指标"""
+        with self._lock:
+            return {
+                "size": self._size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "acquisitions": self._acquisitions,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+            }
+
+
+def clone_project(project: Project) -> Project:
+    """复制项目树
+    
+    模型字段除列表外都是不可变值，逐层浅复制即可得到独立的树，
+    比 model_copy(deep=True) 快一倍左右。
+    """
+    return project.model_copy(update={
+        "chapters": [
+            chapter.model_copy(update={
+                "sections": [
+                    section.model_copy(update={"nodes": [node.model_copy() for node in section.nodes]})
+                    for section in chapter.sections
+                ]
+            })
+            for chapter in project.chapters
+        ],
+        "edges": [edge.model_copy() for edge in project.edges],
+    })
+
+
+def persisted_copy(project: Project) -> Project:
+    """返回项目写入数据库后再读出时的形态（用于写穿缓存）
+    
+    与 _save_project_structure / _project_rows 的写入规则保持一致：
+    部分的 position 保存为其在章节中的索引，节点 position 为空时保存为索引，
+    重复的 (source, target) 边只保留一条。
+    """
+    copied = clone_project(project)
+    for chapter in copied.chapters:
+        for sec_idx, section in enumerate(chapter.sections):
+            section.position = float(sec_idx)
+            for node_idx, node in enumerate(section.nodes):
+                if node.position is None:
+                    node.position = float(node_idx)
+    edges: Dict[tuple, Edge] = {}
+    for edge in copied.edges:
+        key = (edge.source, edge.target)
+        if key in edges:
+            edges[key].label = edge.label
+        else:
+            edges[key] = edge
+    copied.edges = list(edges.values())
+    return copied
+
+
+def estimate_project_size(project: Project) -> int:
+    """粗略估算项目对象占用的内存字节数（用于缓存容量控制）"""
+    size = 512
+    for chapter in project.chapters:
+        size += 512 + len(chapter.name)
+        for section in chapter.sections:
+            size += 512 + len(section.name)
+            for node in section.nodes:
+                size += 600 + len(node.name) + len(node.content)
+    size += 300 * len(project.edges)
+    return size
+
+
+class ProjectCache:
+    """已加载项目的 LRU 缓存
+    
+    以项目 ID 为键，缓存项同时记录项目的 version，读取时只有版本一致才算命中。
+    max_entries / max_bytes 任一为 0 时禁用缓存。
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, Project, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+    
+    def get(self, project_id: str, version: int) -> Optional[Project]:
+        """按版本读取缓存，版本不一致时视为未命中并丢弃旧缓存"""
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._remove(project_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(project_id)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, project: Project) -> None:
+        """写入缓存（写穿：在数据库写入成功后调用）"""
+        if not self.enabled:
+            return
+        size = estimate_project_size(project)
+        with self._lock:
+            if project.id in self._entries:
+                self._remove(project.id)
+            if size > self.max_bytes:
+                return
+            self._entries[project.id] = (project.version, project, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def patch(self, project_id: str, old_version: int, new_version: int, updated_at: str,
+              apply: Callable[[Project], bool]) -> None:
+        """在缓存项目的副本上应用一次小修改（如拖拽坐标），推进版本号后替换缓存项
+        
+        已发布的缓存对象可能正被读线程序列化，永远不会被原地修改。
+        只有缓存版本恰好是修改前的版本时才会应用，否则直接丢弃缓存项。
+        """
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None:
+                return
+            if entry[0] != old_version:
+                self._remove(project_id)
+                return
+        
+        # 复制在锁外进行，替换前确认缓存项没有被其他线程换掉
+        project = clone_project(entry[1])
+        applied = apply(project)
+        with self._lock:
+            if self._entries.get(project_id) is not entry:
+                return
+            if not applied:
+                self._remove(project_id)
+                return
+            project.version = new_version
+            project.updated_at = updated_at
+            self._entries[project_id] = (new_version, project, entry[2])
+    
+    def invalidate(self, project_id: str) -> None:
+        with self._lock:
+            if project_id in self._entries:
+                self._remove(project_id)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def _remove(self, project_id: str) -> None:
+        _, _, size = self._entries.pop(project_id)
+        self._bytes -= size
+    
+    def stats(self) -> Dict[str, int]:
+        """缓存指标"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
 
 
 class Storage:
     """数据存储类 - 使用 SQLite"""
     
-    def __init__(self, db_file: Path = None):
-        self.db_file = db_file or (settings.data_file.parent / "knowledge_dag.db")
+    def __init__(self, db_file: Path = None, pool_size: Optional[int] = None):
+        self.db_file = db_file or settings.db_path
+        self.pool = ConnectionPool(
+            self._create_connection,
+            size=pool_size or settings.db_pool_size,
+            timeout=settings.db_pool_timeout
+        )
+        self.cache = ProjectCache(
+            max_entries=settings.project_cache_max_entries,
+            max_bytes=settings.project_cache_max_bytes
+        )
+        # 最近一次提交的行级变更（update 与单行几何更新产生；写操作都在写线程上串行执行）
+        self.last_delta: Optional[ProjectDelta] = None
         self._init_db()
     
-    def _get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_file)
+    def _create_connection(self) -> sqlite3.Connection:
+        """创建新的数据库连接（每个连接只初始化一次）"""
+        # 连接会在线程池的不同线程之间复用，由连接池保证同一时刻只有一个使用者
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
         conn.row_factory = sqlite3.Row  # 使结果可以像字典一样访问
+        self._apply_pragmas(conn)
         return conn
     
+    @staticmethod
+    def _apply_pragmas(conn: sqlite3.Connection) -> None:
+        """应用存储配置中的 PRAGMA
+        
+        WAL 模式让读操作不再被写操作阻塞；开启 foreign_keys 后
+        表结构中的 ON DELETE CASCADE 才会真正生效。
+        """
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout)}")
+        cursor.execute(f"PRAGMA journal_mode = {settings.db_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {settings.db_synchronous}")
+        cursor.execute(f"PRAGMA cache_size = {int(settings.db_cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.db_mmap_size)}")
+        cursor.execute(f"PRAGMA temp_store = {settings.db_temp_store}")
+        cursor.execute(f"PRAGMA foreign_keys = {'ON' if settings.db_foreign_keys else 'OFF'}")
+        cursor.close()
+    
+    def _connection(self):
+        """从连接池获取数据库连接（with 语句退出时自动归还）"""
+        return self.pool.connection()
+    
+    def close(self) -> None:
+        """关闭连接池（应用退出时调用）"""
+        self.pool.close()
+    
+    def stats(self) -> Dict[str, Dict]:
+        """存储层运行指标"""
+        return {"pool": self.pool.stats(), "cache": self.cache.stats()}
+    
     def _init_db(self):
-        """初始化数据库表结构"""
-        conn = self._get_connection()
+        """初始化数据库表结构（执行未完成的结构迁移；结构已是最新时直接跳过）"""
+        if not settings.db_auto_migrate:
+            return
+        with self._connection() as conn:
+            applied = migrations.migrate(conn)
+        if applied:
+            print(f"Applied database migrations: {', '.join(applied)}")
+    
+    @staticmethod
+    def _optional_float(row: sqlite3.Row, key: str) -> Optional[float]:
+        """读取可能不存在或为空的数值列（兼容旧数据库）"""
         try:
-            cursor = conn.cursor()
-            
-            # 项目表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS projects (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
-                )
-            """)
-            
-            # 章节表
-            # 使用复合主键 (project_id, id) 确保项目内章节ID唯一
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chapters (
-                    project_id TEXT NOT NULL,
-                    id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    position INTEGER,
-                    PRIMARY KEY (project_id, id),
-                    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # 部分表（使用复合主键确保项目内部分ID唯一）
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS sections (
-                    project_id TEXT NOT NULL,
-                    chapter_id TEXT NOT NULL,
-                    id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    position INTEGER,
-                    x REAL,
-                    y REAL,
-                    PRIMARY KEY (project_id, chapter_id, id),
-                    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
-                    FOREIGN KEY (project_id, chapter_id) REFERENCES chapters(project_id, id) ON DELETE CASCADE
-                )
-            """)
-            
-            # 数据库迁移：为 sections 表添加 x, y, width, height 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE sections ADD COLUMN x REAL")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            try:
-                cursor.execute("ALTER TABLE sections ADD COLUMN y REAL")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            try:
-                cursor.execute("ALTER TABLE sections ADD COLUMN width REAL")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            try:
-                cursor.execute("ALTER TABLE sections ADD COLUMN height REAL")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            # 节点表（使用复合主键确保项目内节点ID唯一）
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS nodes (
-                    project_id TEXT NOT NULL,
-                    chapter_id TEXT NOT NULL,
-                    section_id TEXT NOT NULL,
-                    id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    content TEXT DEFAULT '',
-                    position INTEGER,
-                    x REAL,
-                    y REAL,
-                    PRIMARY KEY (project_id, chapter_id, section_id, id),
-                    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
-                    FOREIGN KEY (project_id, chapter_id, section_id) REFERENCES sections(project_id, chapter_id, id) ON DELETE CASCADE
-                )
-            """)
-            
-            # 数据库迁移：为现有数据库添加新列（如果不存在）
-            # 为 sections 表添加 project_id 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE sections ADD COLUMN project_id TEXT")
-                # 为现有数据填充 project_id（通过 chapter_id 关联）
-                cursor.execute("""
-                    UPDATE sections 
-                    SET project_id = (
-                        SELECT project_id FROM chapters 
-                        WHERE chapters.id = sections.chapter_id
-                    )
-                    WHERE project_id IS NULL
-                """)
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            # 为 nodes 表添加 project_id 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE nodes ADD COLUMN project_id TEXT")
-                # 为现有数据填充 project_id（通过 section_id -> chapter_id -> project_id 关联）
-                cursor.execute("""
-                    UPDATE nodes 
-                    SET project_id = (
-                        SELECT chapters.project_id 
-                        FROM sections 
-                        JOIN chapters ON sections.chapter_id = chapters.id
-                        WHERE sections.id = nodes.section_id
-                    )
-                    WHERE project_id IS NULL
-                """)
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            # 为 nodes 表添加 chapter_id 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE nodes ADD COLUMN chapter_id TEXT")
-                # 为现有数据填充 chapter_id（通过 section_id 关联）
-                cursor.execute("""
-                    UPDATE nodes 
-                    SET chapter_id = (
-                        SELECT chapter_id FROM sections 
-                        WHERE sections.id = nodes.section_id
-                    )
-                    WHERE chapter_id IS NULL
-                """)
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            # 为 nodes 表添加 x, y 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE nodes ADD COLUMN x REAL")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            try:
-                cursor.execute("ALTER TABLE nodes ADD COLUMN y REAL")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            # 为 chapters 表添加 layout 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE chapters ADD COLUMN layout TEXT DEFAULT 'row'")
-            except sqlite3.OperationalError:
-                pass  # 列已存在
-            
-            # 边表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS edges (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    project_id TEXT NOT NULL,
-                    source TEXT NOT NULL,
-                    target TEXT NOT NULL,
-                    label TEXT DEFAULT '',
-                    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
-                    UNIQUE(project_id, source, target)
-                )
-            """)
-            
-            # 创建索引以提升查询性能
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_project ON chapters(project_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sections_project ON sections(project_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sections_chapter ON sections(project_id, chapter_id)")
-            # 检查 nodes 表是否有 chapter_id 列，如果有则创建复合索引
-            try:
-                cursor.execute("PRAGMA table_info(nodes)")
-                nodes_info = cursor.fetchall()
-                has_chapter_id = any(col[1] == 'chapter_id' for col in nodes_info)
-                if has_chapter_id:
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_project ON nodes(project_id)")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_section ON nodes(project_id, chapter_id, section_id)")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_id ON nodes(project_id, id)")
-                else:
-                    # 旧结构：只有 project_id 和 section_id
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_project ON nodes(project_id)")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nodes_section ON nodes(project_id, section_id)")
-            except sqlite3.OperationalError:
-                # 表不存在，使用默认索引
-                pass
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_edges_project ON edges(project_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_edges_source ON edges(project_id, source)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_edges_target ON edges(project_id, target)")
-            
-            conn.commit()
-        finally:
-            conn.close()
+            value = row[key]
+        except (KeyError, IndexError):
+            return None
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return None
     
+    @classmethod
+    def _node_from_row(cls, row: sqlite3.Row, content: bool = True) -> Node:
+        position = row['position']
+        return Node(
+            id=row['id'],
+            name=row['name'],
+            content=(row['content'] or '') if content else '',
+            position=float(position) if position is not None else None,
+            x=cls._optional_float(row, 'x'),
+            y=cls._optional_float(row, 'y'),
+            width=cls._optional_float(row, 'width'),
+            height=cls._optional_float(row, 'height')
+        )
     
-    def _load_project(self, project_id: str) -> Optional[Project]:
-        """从数据库加载单个项目"""
-        conn = self._get_connection()
+    @classmethod
+    def _section_from_row(cls, row: sqlite3.Row, nodes: List[Node]) -> Section:
+        return Section(
+            id=row['id'],
+            name=row['name'],
+            position=cls._optional_float(row, 'position'),
+            x=cls._optional_float(row, 'x'),
+            y=cls._optional_float(row, 'y'),
+            width=cls._optional_float(row, 'width'),
+            height=cls._optional_float(row, 'height'),
+            nodes=nodes
+        )
+    
+    @classmethod
+    def _chapter_from_row(cls, row: sqlite3.Row, sections: List[Section]) -> Chapter:
+        # 处理可能不存在的 layout 列（兼容旧数据库）
+        layout_value = 'row'  # 默认值
         try:
+            if row['layout']:
+                layout_value = row['layout']
+        except (KeyError, IndexError):
+            pass
+        
+        return Chapter(
+            id=row['id'],
+            name=row['name'],
+            sections=sections,
+            layout=layout_value,
+            x=cls._optional_float(row, 'x'),
+            y=cls._optional_float(row, 'y'),
+            width=cls._optional_float(row, 'width'),
+            height=cls._optional_float(row, 'height')
+        )
+    
+    def _load_project(self, project_id: str, content: bool = True) -> Optional[Project]:
+        """从数据库加载单个项目
+        
+        固定使用 5 条查询（项目、章节、部分、节点、边）一次性取出整个项目，
+        然后在内存中按 (chapter_id, section_id) 分组组装树结构，
+        查询次数不再随章节/部分数量增长。
+        content 为 False 时不读取节点的 content 列（节点 content 为空字符串），
+        笔记很长时可以省去大部分 I/O 和对象构造开销。
+        """
+        with self._connection() as conn:
             cursor = conn.cursor()
+            # 在同一个读事务中执行所有查询，保证读到的是同一版本的数据
+            cursor.execute("BEGIN")
             
             # 加载项目基本信息
             cursor.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
@@ -221,7 +451,7 @@ class Storage:
             if not project_row:
                 return None
             
-            # 加载章节
+            # 加载所有章节
             cursor.execute("""
                 SELECT * FROM chapters 
                 WHERE project_id = ? 
@@ -229,119 +459,46 @@ class Storage:
             """, (project_id,))
             chapter_rows = cursor.fetchall()
             
+            # 加载所有部分，按 chapter_id 分组（组内保持 position, id 顺序）
+            cursor.execute("""
+                SELECT * FROM sections 
+                WHERE project_id = ? 
+                ORDER BY position, id
+            """, (project_id,))
+            sections_by_chapter: Dict[str, List[sqlite3.Row]] = {}
+            for sec_row in cursor.fetchall():
+                sections_by_chapter.setdefault(sec_row['chapter_id'], []).append(sec_row)
+            
+            # 加载所有节点，按 (chapter_id, section_id) 分组
+            node_columns = "*" if content else (
+                "chapter_id, section_id, id, name, position, x, y, width, height"
+            )
+            cursor.execute(f"""
+                SELECT {node_columns} FROM nodes 
+                WHERE project_id = ? 
+                ORDER BY position, id
+            """, (project_id,))
+            nodes_by_section: Dict[tuple, List[Node]] = {}
+            for row in cursor.fetchall():
+                nodes_by_section.setdefault((row['chapter_id'], row['section_id']), []).append(
+                    self._node_from_row(row, content)
+                )
+            
             chapters = []
             for ch_row in chapter_rows:
                 chapter_id = ch_row['id']
-                
-                # 加载部分（通过 project_id 和 chapter_id 双重过滤）
-                cursor.execute("""
-                    SELECT * FROM sections 
-                    WHERE project_id = ? AND chapter_id = ? 
-                    ORDER BY position, id
-                """, (project_id, chapter_id))
-                section_rows = cursor.fetchall()
-                
-                sections = []
-                for sec_row in section_rows:
-                    section_id = sec_row['id']
-                    
-                    # 加载节点（使用复合主键查询：project_id, chapter_id, section_id）
-                    cursor.execute("""
-                        SELECT * FROM nodes 
-                        WHERE project_id = ? AND chapter_id = ? AND section_id = ? 
-                        ORDER BY position, id
-                    """, (project_id, chapter_id, section_id))
-                    node_rows = cursor.fetchall()
-                    
-                    nodes = []
-                    for row in node_rows:
-                        # 处理可能不存在的 x, y 列（兼容旧数据库）
-                        x_value = None
-                        y_value = None
-                        try:
-                            if 'x' in row.keys() and row['x'] is not None:
-                                x_value = float(row['x'])
-                        except (KeyError, IndexError):
-                            pass
-                        try:
-                            if 'y' in row.keys() and row['y'] is not None:
-                                y_value = float(row['y'])
-                        except (KeyError, IndexError):
-                            pass
-                        
-                        nodes.append(Node(
-                            id=row['id'],
-                            name=row['name'],
-                            content=row['content'] or '',
-                            position=float(row['position']) if row['position'] is not None else None,
-                            x=x_value,
-                            y=y_value
-                        ))
-                    
-                    # 处理可能不存在的 x, y, width, height 列（兼容旧数据库）
-                    x_value = None
-                    y_value = None
-                    width_value = None
-                    height_value = None
-                    position_value = None
-                    
-                    try:
-                        if 'x' in sec_row.keys() and sec_row['x'] is not None:
-                            x_value = float(sec_row['x'])
-                    except (KeyError, IndexError, ValueError, TypeError):
-                        pass
-                    try:
-                        if 'y' in sec_row.keys() and sec_row['y'] is not None:
-                            y_value = float(sec_row['y'])
-                    except (KeyError, IndexError, ValueError, TypeError):
-                        pass
-                    try:
-                        if 'width' in sec_row.keys() and sec_row['width'] is not None:
-                            width_value = float(sec_row['width'])
-                    except (KeyError, IndexError, ValueError, TypeError):
-                        pass
-                    try:
-                        if 'height' in sec_row.keys() and sec_row['height'] is not None:
-                            height_value = float(sec_row['height'])
-                    except (KeyError, IndexError, ValueError, TypeError):
-                        pass
-                    try:
-                        if 'position' in sec_row.keys() and sec_row['position'] is not None:
-                            position_value = float(sec_row['position'])
-                    except (KeyError, IndexError, ValueError, TypeError):
-                        pass
-                    
-                    sections.append(Section(
-                        id=section_id,
-                        name=sec_row['name'],
-                        position=position_value,
-                        x=x_value,
-                        y=y_value,
-                        width=width_value,
-                        height=height_value,
-                        nodes=nodes
-                    ))
-                
-                # 处理可能不存在的 layout 列（兼容旧数据库）
-                layout_value = 'row'  # 默认值
-                try:
-                    if 'layout' in ch_row.keys() and ch_row['layout']:
-                        layout_value = ch_row['layout']
-                except (KeyError, IndexError):
-                    pass
-                
-                chapters.append(Chapter(
-                    id=chapter_id,
-                    name=ch_row['name'],
-                    sections=sections,
-                    layout=layout_value
-                ))
+                sections = [
+                    self._section_from_row(sec_row, nodes_by_section.get((chapter_id, sec_row['id']), []))
+                    for sec_row in sections_by_chapter.get(chapter_id, [])
+                ]
+                chapters.append(self._chapter_from_row(ch_row, sections))
             
             # 加载边
             cursor.execute("""
                 SELECT source, target, label 
                 FROM edges 
                 WHERE project_id = ?
+                ORDER BY id
             """, (project_id,))
             edge_rows = cursor.fetchall()
             
@@ -359,165 +516,1082 @@ class Storage:
                 name=project_row['name'],
                 created_at=project_row['created_at'],
                 updated_at=project_row['updated_at'],
+                version=project_row['version'] or 0,
                 chapters=chapters,
                 edges=edges
             )
-        finally:
-            conn.close()
     
     def get_all(self) -> Dict[str, Project]:
         """获取所有项目"""
-        conn = self._get_connection()
-        try:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM projects")
             project_ids = [row['id'] for row in cursor.fetchall()]
-            
-            projects = {}
-            for project_id in project_ids:
-                project = self._load_project(project_id)
-                if project:
-                    projects[project_id] = project
-            
-            return projects
-        finally:
-            conn.close()
+        
+        # 释放连接后再逐个加载，避免同时占用多个连接池连接
+        projects = {}
+        for project_id in project_ids:
+            project = self._load_project(project_id)
+            if project:
+                projects[project_id] = project
+        
+        return projects
     
-    def get(self, project_id: str) -> Project:
-        """获取单个项目"""
-        project = self._load_project(project_id)
+    # 项目列表允许的排序字段（白名单，避免 SQL 注入）
+    SUMMARY_SORT_FIELDS = ('updated_at', 'created_at', 'name')
+    
+    def count(self) -> int:
+        """统计项目数量（只读 projects 表）"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM projects")
+            return cursor.fetchone()[0]
+    
+    def list_summaries(self, limit: Optional[int] = None, offset: int = 0,
+                       sort_by: Optional[str] = None, descending: bool = True,
+                       with_counts: bool = False) -> List[Dict]:
+        """获取项目摘要列表（不加载章节/节点树）
+        
+        Args:
+            limit: 返回条数上限，None 表示不分页
+            offset: 分页偏移量
+            sort_by: 排序字段（updated_at / created_at / name），None 保持插入顺序
+            descending: 是否倒序
+            with_counts: 是否使用聚合 SQL 附带章节数、节点数、边数
+        """
+        if sort_by is not None and sort_by not in self.SUMMARY_SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field: {sort_by}")
+        
+        columns = "p.id, p.name, p.created_at, p.updated_at"
+        if with_counts:
+            columns += """,
+                (SELECT COUNT(*) FROM chapters c WHERE c.project_id = p.id) AS chapters_count,
+                (SELECT COUNT(*) FROM nodes n WHERE n.project_id = p.id) AS nodes_count,
+                (SELECT COUNT(*) FROM edges e WHERE e.project_id = p.id) AS edges_count"""
+        
+        sql = f"SELECT {columns} FROM projects p"
+        if sort_by is not None:
+            sql += f" ORDER BY p.{sort_by} {'DESC' if descending else 'ASC'}, p.id"
+        else:
+            sql += " ORDER BY p.rowid"
+        
+        params: list = []
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        elif offset:
+            sql += " LIMIT -1 OFFSET ?"
+            params.append(offset)
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_version(self, project_id: str) -> Optional[int]:
+        """获取项目当前版本号，项目不存在时返回 None"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM projects WHERE id = ?", (project_id,))
+            row = cursor.fetchone()
+            return (row['version'] or 0) if row else None
+    
+    def get(self, project_id: str, copy: bool = True, content: bool = True) -> Project:
+        """获取单个项目
+        
+        优先从缓存读取（用一条查询校验版本号），未命中时从数据库加载并写入缓存。
+        
+        Args:
+            copy: 默认返回独立副本，调用方可以随意修改；只读调用方传 False
+                  直接使用缓存中的共享对象，省去复制开销（不得修改返回值）
+            content: 为 False 时调用方不需要节点 content；缓存命中时照常返回缓存的项目，
+                     未命中时不读取 content 列，结果也不写入缓存（只能用于只读展示，不得写回）
+        """
+        if self.cache.enabled:
+            version = self.get_version(project_id)
+            if version is None:
+                self.cache.invalidate(project_id)
+                raise KeyError(f"Project {project_id} not found")
+            cached = self.cache.get(project_id, version)
+            if cached is not None:
+                return clone_project(cached) if copy else cached
+        
+        project = self._load_project(project_id, content=content)
         if not project:
             raise KeyError(f"Project {project_id} not found")
+        if self.cache.enabled and content:
+            self.cache.put(project)
+            return clone_project(project) if copy else project
         return project
     
     def add(self, project: Project) -> None:
         """添加项目"""
-        conn = self._get_connection()
-        try:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             # 插入项目
             cursor.execute("""
-                INSERT INTO projects (id, name, created_at, updated_at)
-                VALUES (?, ?, ?, ?)
-            """, (project.id, project.name, project.created_at, project.updated_at))
+                INSERT INTO projects (id, name, created_at, updated_at, version)
+                VALUES (?, ?, ?, ?, ?)
+            """, (project.id, project.name, project.created_at, project.updated_at, project.version))
             
-            # 插入章节、部分和节点
+            # 插入章节、部分、节点和边
             self._save_project_structure(cursor, project)
+            self._reindex_geometry(cursor, project.id, ())
             
-            # 插入边
-            for edge in project.edges:
+            conn.commit()
+        
+        # 写穿缓存（缓存独立副本，调用方之后修改传入对象不会影响缓存）
+        self.cache.put(persisted_copy(project))
+    
+    # 增量写入使用的表结构描述：(表名, 项目内主键列, 值列)
+    _DELTA_TABLES = (
+        ('chapters', ('id',), ('name', 'position', 'layout', 'x', 'y', 'width', 'height')),
+        ('sections', ('chapter_id', 'id'), ('name', 'position', 'x', 'y', 'width', 'height')),
+        ('nodes', ('chapter_id', 'section_id', 'id'),
+         ('name', 'content', 'position', 'x', 'y', 'width', 'height')),
+        ('edges', ('source', 'target'), ('label',)),
+    )
+    
+    @staticmethod
+    def _project_rows(project: Project) -> Dict[str, Dict[tuple, tuple]]:
+        """将 Project 展开为各表的行 {表名: {主键: 值}}，与 _save_project_structure 写入的内容一致"""
+        chapter_rows: Dict[tuple, tuple] = {}
+        section_rows: Dict[tuple, tuple] = {}
+        node_rows: Dict[tuple, tuple] = {}
+        for ch_idx, chapter in enumerate(project.chapters):
+            layout_value = chapter.layout if chapter.layout else 'row'
+            chapter_rows[(chapter.id,)] = (
+                chapter.name, ch_idx, layout_value, chapter.x, chapter.y, chapter.width, chapter.height
+            )
+            for sec_idx, section in enumerate(chapter.sections):
+                section_rows[(chapter.id, section.id)] = (
+                    section.name, sec_idx, section.x, section.y, section.width, section.height
+                )
+                for node_idx, node in enumerate(section.nodes):
+                    node_position = node.position if node.position is not None else float(node_idx)
+                    node_rows[(chapter.id, section.id, node.id)] = (
+                        node.name, node.content or '', node_position, node.x, node.y,
+                        node.width, node.height
+                    )
+        edge_rows = {
+            (edge.source, edge.target): (edge.label or '',)
+            for edge in project.edges
+        }
+        return {
+            'chapters': chapter_rows,
+            'sections': section_rows,
+            'nodes': node_rows,
+            'edges': edge_rows,
+        }
+    
+    def update(self, project: Project) -> Dict[str, Dict[str, int]]:
+        """更新项目（增量写入）
+        
+        在同一个 IMMEDIATE 事务中读取已持久化的行，与传入的 Project 做差异比较，
+        只对新增、删除和内容变化的行执行 INSERT/DELETE/UPDATE。
+        最终数据库内容与整体删除后重新插入的结果一致。
+        这些行整理为 ProjectDelta，在同一事务中追加到变更日志，提交后记录在 last_delta 中。
+        
+        Returns:
+            每张表的变更统计 {表名: {"inserted": n, "updated": n, "deleted": n}}
+        """
+        with self._connection() as conn:
+            try:
+                cursor = conn.cursor()
+                # 先获取写锁，保证“读取现状 -> 写入差异”之间不会被其他写入者插入
+                cursor.execute("BEGIN IMMEDIATE")
+            
+                # 检查项目是否存在
+                cursor.execute("SELECT name FROM projects WHERE id = ?", (project.id,))
+                row = cursor.fetchone()
+                if not row:
+                    raise KeyError(f"Project {project.id} not found")
+                renamed = row['name'] != project.name
+            
+                # 更新项目基本信息，并递增版本号
                 cursor.execute("""
-                    INSERT OR REPLACE INTO edges (project_id, source, target, label)
-                    VALUES (?, ?, ?, ?)
-                """, (project.id, edge.source, edge.target, edge.label or ''))
+                    UPDATE projects 
+                    SET name = ?, updated_at = ?, version = version + 1
+                    WHERE id = ?
+                """, (project.name, project.updated_at, project.id))
+                cursor.execute("SELECT version FROM projects WHERE id = ?", (project.id,))
+                new_version = cursor.fetchone()['version']
+            
+                new_rows = self._project_rows(project)
+                deltas = []
+                previous_rows = []
+                for table, key_columns, value_columns in self._DELTA_TABLES:
+                    to_insert, to_update, to_delete, old_rows = self._diff_table(
+                        cursor, project.id, table, key_columns, value_columns, new_rows[table]
+                    )
+                    deltas.append((to_insert, to_update, to_delete))
+                    previous_rows.append(old_rows)
+            
+                # 先删除（子表在前），再插入和更新（父表在前），保证外键约束成立
+                for (table, key_columns, _), (_, _, to_delete) in reversed(list(zip(self._DELTA_TABLES, deltas))):
+                    if to_delete:
+                        where = " AND ".join(f"{col} = ?" for col in key_columns)
+                        cursor.executemany(
+                            f"DELETE FROM {table} WHERE project_id = ? AND {where}",
+                            [(project.id,) + key for key in to_delete]
+                        )
+            
+                stats = {}
+                for (table, key_columns, value_columns), (to_insert, to_update, to_delete) in zip(self._DELTA_TABLES, deltas):
+                    if to_insert:
+                        self._insert_rows(cursor, project.id, table, key_columns, value_columns, to_insert)
+                    if to_update:
+                        assignments = ", ".join(f"{col} = ?" for col in value_columns)
+                        where = " AND ".join(f"{col} = ?" for col in key_columns)
+                        cursor.executemany(
+                            f"UPDATE {table} SET {assignments} WHERE project_id = ? AND {where}",
+                            [value + (project.id,) + key for key, value in to_update]
+                        )
+                    stats[table] = {
+                        "inserted": len(to_insert),
+                        "updated": len(to_update),
+                        "deleted": len(to_delete),
+                    }
+            
+                self._update_geometry_index(cursor, project.id, deltas, previous_rows)
+                delta = self._build_delta(project, new_version, renamed, deltas)
+                self._log_change(cursor, delta)
             
+                # 提交事务
+                conn.commit()
+                project.version = new_version
+                self.cache.put(persisted_copy(project))
+                self.last_delta = delta
+                if not self._changes_graph(deltas):
+                    carry_indexes(project.id, new_version - 1, new_version)
+                return stats
+            except Exception as e:
+                conn.rollback()
+                self.cache.invalidate(project.id)
+                print(f"Error updating project {project.id}: {e}")
+                import traceback
+                traceback.print_exc()
+                raise
+    
+    @staticmethod
+    def _changes_graph(deltas) -> bool:
+        """差异是否改变了节点集合或边集合（只改边标签不算；节点换部分是先删后插，保守地算作改变）"""
+        _, _, (node_insert, _, node_delete), (edge_insert, _, edge_delete) = deltas
+        return bool(node_insert or node_delete or edge_insert or edge_delete)
+    
+    @classmethod
+    def _build_delta(cls, project: Project, new_version: int, renamed: bool, deltas) -> ProjectDelta:
+        """把各表的 (待插入, 待更新, 待删除) 整理为 ProjectDelta，只包含变化的行"""
+        upserts = {}
+        deletes = {}
+        for (table, key_columns, value_columns), (to_insert, to_update, to_delete) in zip(cls._DELTA_TABLES, deltas):
+            columns = key_columns + value_columns
+            rows = [dict(zip(columns, key + value)) for key, value in chain(to_insert, to_update)]
+            if rows:
+                upserts[table] = rows
+            if to_delete:
+                deletes[table] = [dict(zip(key_columns, key)) for key in to_delete]
+        return ProjectDelta(
+            project_id=project.id,
+            base_version=new_version - 1,
+            version=new_version,
+            updated_at=project.updated_at,
+            name=project.name if renamed else None,
+            upserts=upserts,
+            deletes=deletes
+        )
+    
+    @staticmethod
+    def _diff_table(cursor, project_id: str, table: str, key_columns: tuple,
+                    value_columns: tuple, new_rows: Dict[tuple, tuple]):
+        """比较某张表中项目已持久化的行与新行，返回 (待插入, 待更新, 待删除, 已持久化的行)"""
+        key_len = len(key_columns)
+        cursor.execute(
+            f"SELECT {', '.join(key_columns + value_columns)} FROM {table} WHERE project_id = ?",
+            (project_id,)
+        )
+        old_rows = {tuple(row[:key_len]): tuple(row[key_len:]) for row in cursor.fetchall()}
+        
+        to_insert = []
+        to_update = []
+        for key, value in new_rows.items():
+            old_value = old_rows.get(key)
+            if old_value is None:
+                to_insert.append((key, value))
+            elif old_value != value:
+                to_update.append((key, value))
+        to_delete = [key for key in old_rows if key not in new_rows]
+        return to_insert, to_update, to_delete, old_rows
+    
+    @staticmethod
+    def _insert_rows(cursor, project_id: str, table: str, key_columns: tuple,
+                     value_columns: tuple, rows) -> None:
+        """使用 executemany 批量插入某张表的行 [(主键, 值), ...]"""
+        columns = ('project_id',) + key_columns + value_columns
+        placeholders = ", ".join("?" for _ in columns)
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [(project_id,) + key + value for key, value in rows]
+        )
+    
+    def _save_project_structure(self, cursor, project: Project):
+        """保存项目结构（章节、部分、节点和边）
+        
+        先把整个项目展开为各表的行元组，再按表用 executemany 一次性写入，
+        避免逐行调用 execute 的 Python/C 往返开销。
+        """
+        rows = self._project_rows(project)
+        for table, key_columns, value_columns in self._DELTA_TABLES:
+            if rows[table]:
+                self._insert_rows(cursor, project.id, table, key_columns, value_columns,
+                                  rows[table].items())
+    
+    # --- 单行几何更新（拖拽等高频操作使用，不重写整个项目） ---
+    
+    @staticmethod
+    def _touch_project(cursor, project_id: str, updated_at: str) -> int:
+        """更新项目的 updated_at 并递增版本号，返回新版本号"""
+        cursor.execute(
+            "UPDATE projects SET updated_at = ?, version = version + 1 WHERE id = ?",
+            (updated_at, project_id)
+        )
+        cursor.execute("SELECT version FROM projects WHERE id = ?", (project_id,))
+        return cursor.fetchone()['version']
+    
+    @staticmethod
+    def _apply_geometry(item, x: Optional[float], y: Optional[float], width: Optional[float],
+                        height: Optional[float], keep_none_xy: bool) -> None:
+        """在内存对象上应用与 _update_geometry 相同的赋值规则"""
+        if x is not None or not keep_none_xy:
+            item.x = x
+        if y is not None or not keep_none_xy:
+            item.y = y
+        if width is not None:
+            item.width = width
+        if height is not None:
+            item.height = height
+    
+    def _update_geometry(self, table: str, project_id: str, keys: Dict[str, str],
+                         x: Optional[float], y: Optional[float], width: Optional[float],
+                         height: Optional[float], updated_at: str, keep_none_xy: bool,
+                         find_item: Callable[[Project], object]) -> int:
+        """按复合主键更新单行的 x/y/width/height，并在同一事务中更新项目时间戳
+        
+        width/height 为 None 时保持原值；keep_none_xy 为 True 时 x/y 为 None 也保持原值。
+        find_item 用于在缓存的项目中定位同一对象，以便同步修改缓存。
+        更新后的几何字段（连同主键）在同一事务中追加到变更日志，并记录在 last_delta 中；
+        该行（连同下级）在几何索引中的包围盒也在同一事务中重建。
+        返回受影响的行数（0 表示未找到）。
+        """
+        xy_expr = "COALESCE(?, {col})" if keep_none_xy else "?"
+        assignments = ", ".join([
+            "x = " + xy_expr.format(col="x"),
+            "y = " + xy_expr.format(col="y"),
+            "width = COALESCE(?, width)",
+            "height = COALESCE(?, height)",
+        ])
+        where = " AND ".join(["project_id = ?"] + [f"{col} = ?" for col in keys])
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} WHERE {where}",
+                (x, y, width, height, project_id, *keys.values())
+            )
+            affected = cursor.rowcount
+            if not affected:
+                conn.rollback()
+                return 0
+            new_version = self._touch_project(cursor, project_id, updated_at)
+            key_columns = next(keys for name, keys, _ in self._DELTA_TABLES if name == table)
+            cursor.execute(
+                f"SELECT {', '.join(key_columns)}, x, y, width, height FROM {table} WHERE {where}",
+                (project_id, *keys.values())
+            )
+            rows = [dict(row) for row in cursor.fetchall()]
+            for row in rows:
+                self._reindex_geometry(cursor, project_id, tuple(row[col] for col in key_columns))
+            delta = ProjectDelta(
+                project_id=project_id,
+                base_version=new_version - 1,
+                version=new_version,
+                updated_at=updated_at,
+                upserts={table: rows}
+            )
+            self._log_change(cursor, delta)
             conn.commit()
-        finally:
-            conn.close()
+        
+        self.last_delta = delta
+        carry_indexes(project_id, new_version - 1, new_version)
+        
+        def apply(project: Project) -> bool:
+            item = find_item(project)
+            if item is None:
+                return False
+            self._apply_geometry(item, x, y, width, height, keep_none_xy)
+            return True
+        
+        self.cache.patch(project_id, new_version - 1, new_version, updated_at, apply)
+        return affected
     
-    def update(self, project: Project) -> None:
-        """更新项目"""
-        conn = self._get_connection()
-        try:
+    def update_node_geometry(self, project_id: str, node_id: str, x: float, y: float,
+                             width: Optional[float], height: Optional[float], updated_at: str,
+                             section_id: Optional[str] = None,
+                             chapter_id: Optional[str] = None) -> int:
+        """更新单个节点的位置和尺寸（width/height 为 None 时保持原值）"""
+        keys = {}
+        if chapter_id:
+            keys['chapter_id'] = chapter_id
+        if section_id:
+            keys['section_id'] = section_id
+        keys['id'] = node_id
+        
+        def find_item(project: Project):
+            for chapter in project.chapters:
+                if chapter_id and chapter.id != chapter_id:
+                    continue
+                for section in chapter.sections:
+                    if section_id and section.id != section_id:
+                        continue
+                    for node in section.nodes:
+                        if node.id == node_id:
+                            return node
+            return None
+        
+        return self._update_geometry('nodes', project_id, keys, x, y, width, height,
+                                     updated_at, keep_none_xy=False, find_item=find_item)
+    
+    def update_section_geometry(self, project_id: str, chapter_id: str, section_id: str,
+                                x: float, y: float, width: Optional[float],
+                                height: Optional[float], updated_at: str) -> int:
+        """更新单个部分的位置和尺寸（width/height 为 None 时保持原值）"""
+        keys = {'chapter_id': chapter_id, 'id': section_id}
+        
+        def find_item(project: Project):
+            for chapter in project.chapters:
+                if chapter.id == chapter_id:
+                    return next((sec for sec in chapter.sections if sec.id == section_id), None)
+            return None
+        
+        return self._update_geometry('sections', project_id, keys, x, y, width, height,
+                                     updated_at, keep_none_xy=False, find_item=find_item)
+    
+    def update_chapter_geometry(self, project_id: str, chapter_id: str,
+                                x: Optional[float], y: Optional[float], width: Optional[float],
+                                height: Optional[float], updated_at: str) -> int:
+        """更新单个章节的位置和尺寸（任一参数为 None 时保持原值）"""
+        def find_item(project: Project):
+            return next((ch for ch in project.chapters if ch.id == chapter_id), None)
+        
+        return self._update_geometry('chapters', project_id, {'id': chapter_id}, x, y, width, height,
+                                     updated_at, keep_none_xy=True, find_item=find_item)
+    
+    def find_node(self, project_id: str, node_id: str,
+                  section_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """按 ID 查找节点所在的章节和部分（不加载项目树）"""
+        sql = "SELECT chapter_id, section_id FROM nodes WHERE project_id = ? AND id = ?"
+        params = [project_id, node_id]
+        if section_id:
+            sql += " AND section_id = ?"
+            params.append(section_id)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql + " LIMIT 1", params)
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    # 单条 IN (...) 查询的最大参数个数（旧版 SQLite 上限为 999）
+    _IN_BATCH_SIZE = 500
+    
+    def get_node_contents(self, project_id: str, node_ids: List[str]) -> Tuple[int, Dict[str, str]]:
+        """按节点 ID 批量读取 content（走 (project_id, id) 索引，不加载项目树）
+        
+        项目版本与内容在同一个读事务中读取；不存在的节点不出现在结果中。
+        
+        Returns:
+            (项目当前版本号, {节点ID: content})
+        
+        Raises:
+            KeyError: 项目不存在
+        """
+        ids = list(dict.fromkeys(node_ids))
+        contents: Dict[str, str] = {}
+        with self._connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT version FROM projects WHERE id = ?", (project_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise KeyError(f"Project {project_id} not found")
+            for start in range(0, len(ids), self._IN_BATCH_SIZE):
+                batch = ids[start:start + self._IN_BATCH_SIZE]
+                cursor.execute(
+                    f"SELECT id, content FROM nodes WHERE project_id = ? AND id IN ({', '.join('?' * len(batch))})",
+                    (project_id, *batch)
+                )
+                for node_row in cursor.fetchall():
+                    contents[node_row['id']] = node_row['content'] or ''
+            return row['version'] or 0, contents
+    
+    def _edges_touching(self, cursor, project_id: str, node_ids: List[str]) -> List[Edge]:
+        """以给定节点之一为端点的边（按 source、target 索引分批查询，保持边的原始顺序）"""
+        rows = {}
+        for start in range(0, len(node_ids), self._IN_BATCH_SIZE):
+            batch = node_ids[start:start + self._IN_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            for column in ('source', 'target'):
+                cursor.execute(
+                    f"SELECT id, source, target, label FROM edges WHERE project_id = ? AND {column} IN ({placeholders})",
+                    (project_id, *batch)
+                )
+                for row in cursor.fetchall():
+                    rows[row['id']] = row
+        return [
+            Edge(source=row['source'], target=row['target'], label=row['label'] or '')
+            for _, row in sorted(rows.items())
+        ]
+    
+    def load_chapter(self, project_id: str, chapter_id: str) -> Tuple[int, Optional[Chapter], List[Edge]]:
+        """只加载一个章节（含部分和节点）以及与章节内节点相连的边，不加载项目树
+        
+        Returns:
+            (项目当前版本号, 章节（不存在时为 None）, 边列表)
+        
+        Raises:
+            KeyError: 项目不存在
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT version FROM projects WHERE id = ?", (project_id,))
+            project_row = cursor.fetchone()
+            if not project_row:
+                raise KeyError(f"Project {project_id} not found")
+            version = project_row['version'] or 0
             
-            # 检查项目是否存在
-            cursor.execute("SELECT id FROM projects WHERE id = ?", (project.id,))
-            if not cursor.fetchone():
-                raise KeyError(f"Project {project.id} not found")
+            cursor.execute("SELECT * FROM chapters WHERE project_id = ? AND id = ?", (project_id, chapter_id))
+            chapter_row = cursor.fetchone()
+            if not chapter_row:
+                return version, None, []
             
-            # 更新项目基本信息
             cursor.execute("""
-                UPDATE projects 
-                SET name = ?, updated_at = ?
-                WHERE id = ?
-            """, (project.name, project.updated_at, project.id))
+                SELECT * FROM nodes
+                WHERE project_id = ? AND chapter_id = ?
+                ORDER BY position, id
+            """, (project_id, chapter_id))
+            nodes_by_section: Dict[str, List[Node]] = {}
+            for row in cursor.fetchall():
+                nodes_by_section.setdefault(row['section_id'], []).append(self._node_from_row(row))
             
-            # 删除旧的结构数据（通过 project_id 直接删除，更高效且安全）
-            # 先删除边，避免外键约束问题
-            cursor.execute("DELETE FROM edges WHERE project_id = ?", (project.id,))
+            cursor.execute("""
+                SELECT * FROM sections
+                WHERE project_id = ? AND chapter_id = ?
+                ORDER BY position, id
+            """, (project_id, chapter_id))
+            sections = [
+                self._section_from_row(row, nodes_by_section.get(row['id'], []))
+                for row in cursor.fetchall()
+            ]
             
-            # 删除节点（直接通过 project_id）
-            cursor.execute("DELETE FROM nodes WHERE project_id = ?", (project.id,))
+            node_ids = [node.id for nodes in nodes_by_section.values() for node in nodes]
+            edges = self._edges_touching(cursor, project_id, node_ids)
+            return version, self._chapter_from_row(chapter_row, sections), edges
+    
+    def query_viewport(self, project_id: str, x0: float, y0: float,
+                       x1: float, y1: float) -> Tuple[int, List[Chapter], List[Edge]]:
+        """视口查询：通过 R*Tree 找出包围盒与矩形相交的章节/部分/节点
+        
+        返回裁剪后的项目树：只包含相交的节点、相交或含有相交节点的部分，
+        以及相交或含有上述部分/节点的章节；边为以相交节点为端点的边。
+        矩形使用项目坐标系（部分、节点的 x/y 依次加上上级的 x/y），返回的行保持存储的相对坐标。
+        
+        Returns:
+            (项目当前版本号, 章节列表, 边列表)
+        
+        Raises:
+            KeyError: 项目不存在
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT version FROM projects WHERE id = ?", (project_id,))
+            project_row = cursor.fetchone()
+            if not project_row:
+                raise KeyError(f"Project {project_id} not found")
+            version = project_row['version'] or 0
             
-            # 删除部分（直接通过 project_id）
-            cursor.execute("DELETE FROM sections WHERE project_id = ?", (project.id,))
+            cursor.execute("SELECT pkey FROM geometry_projects WHERE project_id = ?", (project_id,))
+            key_row = cursor.fetchone()
+            if not key_row:
+                return version, [], []
+            # CROSS JOIN 固定以 R*Tree 为外层循环，否则查询规划器可能先扫描项目的全部索引项
+            cursor.execute("""
+                SELECT g.chapter_id, g.section_id, g.node_id
+                FROM geometry_rtree r
+                CROSS JOIN geometry_items g ON g.rid = r.id
+                WHERE r.x0 <= ? AND r.x1 >= ? AND r.y0 <= ? AND r.y1 >= ?
+                  AND r.p0 <= ? AND r.p1 >= ? AND g.project_id = ?
+            """, (x1, x0, y1, y0, key_row['pkey'], key_row['pkey'], project_id))
+            hits = cursor.fetchall()
+            hit_nodes = {(c, s, n) for c, s, n in hits if n}
+            hit_sections = {(c, s) for c, s, n in hits if s}
+            hit_chapters = sorted({c for c, _, _ in hits})
             
-            # 删除章节
-            cursor.execute("DELETE FROM chapters WHERE project_id = ?", (project.id,))
+            nodes_by_section: Dict[tuple, List[Node]] = {}
+            node_ids = sorted({n for _, _, n in hit_nodes})
+            for start in range(0, len(node_ids), self._IN_BATCH_SIZE):
+                batch = node_ids[start:start + self._IN_BATCH_SIZE]
+                cursor.execute(
+                    f"SELECT * FROM nodes WHERE project_id = ? AND id IN ({', '.join('?' * len(batch))})",
+                    (project_id, *batch)
+                )
+                for row in cursor.fetchall():
+                    if (row['chapter_id'], row['section_id'], row['id']) in hit_nodes:
+                        nodes_by_section.setdefault((row['chapter_id'], row['section_id']), []).append(row)
             
-            # 重新插入结构数据
-            self._save_project_structure(cursor, project)
+            chapter_rows = []
+            section_rows: Dict[str, List[sqlite3.Row]] = {}
+            for start in range(0, len(hit_chapters), self._IN_BATCH_SIZE):
+                batch = hit_chapters[start:start + self._IN_BATCH_SIZE]
+                placeholders = ', '.join('?' * len(batch))
+                cursor.execute(
+                    f"SELECT * FROM chapters WHERE project_id = ? AND id IN ({placeholders})",
+                    (project_id, *batch)
+                )
+                chapter_rows.extend(cursor.fetchall())
+                cursor.execute(
+                    f"SELECT * FROM sections WHERE project_id = ? AND chapter_id IN ({placeholders})",
+                    (project_id, *batch)
+                )
+                for row in cursor.fetchall():
+                    if (row['chapter_id'], row['id']) in hit_sections:
+                        section_rows.setdefault(row['chapter_id'], []).append(row)
             
-            # 插入边
-            for edge in project.edges:
-                cursor.execute("""
-                    INSERT INTO edges (project_id, source, target, label)
-                    VALUES (?, ?, ?, ?)
-                """, (project.id, edge.source, edge.target, edge.label or ''))
+            def order(row):
+                # 与 ORDER BY position, id 一致（SQLite 中 NULL 排在最前）
+                position = row['position']
+                return (position is not None, position if position is not None else 0, row['id'])
             
-            # 提交事务
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error updating project {project.id}: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
-        finally:
-            conn.close()
-    
-    def _save_project_structure(self, cursor, project: Project):
-        """保存项目结构（章节、部分、节点）"""
-        total_nodes = 0
-        saved_node_ids = []
-        for ch_idx, chapter in enumerate(project.chapters):
-            # 插入章节（使用复合主键：project_id, id）
-            layout_value = chapter.layout if hasattr(chapter, 'layout') and chapter.layout else 'row'
-            cursor.execute("""
-                INSERT OR REPLACE INTO chapters (project_id, id, name, position, layout)
-                VALUES (?, ?, ?, ?, ?)
-            """, (project.id, chapter.id, chapter.name, ch_idx, layout_value))
+            chapters = []
+            for ch_row in sorted(chapter_rows, key=order):
+                chapter_id = ch_row['id']
+                sections = []
+                for sec_row in sorted(section_rows.get(chapter_id, []), key=order):
+                    nodes = sorted(nodes_by_section.get((chapter_id, sec_row['id']), []), key=order)
+                    sections.append(self._section_from_row(sec_row, [self._node_from_row(row) for row in nodes]))
+                chapters.append(self._chapter_from_row(ch_row, sections))
             
-            for sec_idx, section in enumerate(chapter.sections):
-                # 插入部分（使用复合主键：project_id, chapter_id, id），包含 x, y, width, height
-                cursor.execute("""
-                    INSERT OR REPLACE INTO sections (project_id, chapter_id, id, name, position, x, y, width, height)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (project.id, chapter.id, section.id, section.name, sec_idx, section.x, section.y, section.width, section.height))
-                
-                for node_idx, node in enumerate(section.nodes):
-                    # 插入节点（使用复合主键：project_id, chapter_id, section_id, id）
-                    # 使用节点的 position 字段，如果为 None 则使用索引
-                    node_position = node.position if node.position is not None else float(node_idx)
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO nodes (project_id, chapter_id, section_id, id, name, content, position, x, y)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (project.id, chapter.id, section.id, node.id, node.name, node.content or '', node_position, node.x, node.y))
-                    total_nodes += 1
-                    saved_node_ids.append(node.id)
-        
+            edges = self._edges_touching(cursor, project_id, node_ids)
+            return version, chapters, edges
+    
+    def chapter_exists(self, project_id: str, chapter_id: str) -> bool:
+        """检查章节是否存在"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM chapters WHERE project_id = ? AND id = ?", (project_id, chapter_id))
+            return cursor.fetchone() is not None
     
     def delete(self, project_id: str) -> None:
-        """删除项目（级联删除会自动处理相关数据）"""
-        conn = self._get_connection()
-        try:
+        """删除项目（级联删除会自动处理相关数据）
+        
+        同时丢弃项目缓存和图索引：索引只按 (项目ID, 版本) 校验，
+        同一秒内重新创建的同 ID 项目版本号从 0 开始，不能复用已删除项目的索引。
+        """
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            # 几何索引不依赖外键级联（DB_FOREIGN_KEYS=false 时不会级联），在同一事务中显式删除；
+            # 触发器同步删除 R*Tree 行
+            cursor.execute("DELETE FROM geometry_items WHERE project_id = ?", (project_id,))
+            cursor.execute("DELETE FROM geometry_projects WHERE project_id = ?", (project_id,))
             conn.commit()
-        finally:
-            conn.close()
+        self.cache.invalidate(project_id)
+        for indexes in (dag_indexes, graph_indexes, reach_indexes):
+            indexes.invalidate(project_id)
+    
+    # --- 几何索引（R*Tree，视口查询使用） ---
+    
+    # 参与包围盒计算的列
+    _GEOMETRY_COLUMNS = ('x', 'y', 'width', 'height')
+    # geometry_items 中标识一行的列，章节/部分/节点的主键依次是它的前缀
+    _GEOMETRY_KEY_COLUMNS = ('chapter_id', 'section_id', 'node_id')
+    # 单次 update 中需要分别重建的范围超过该数量时，改为重建整个项目
+    _GEOMETRY_MAX_SCOPES = 64
+    # 各层级在项目坐标系中的包围盒：(查询, 与 geometry_items 键列对应的过滤列)
+    # 下级的坐标相对于上级，自身或任一上级缺少 x/y 的行不参与索引
+    _GEOMETRY_QUERIES = (
+        ("""
+            SELECT c.id, '', '', c.x, c.y, c.width, c.height
+            FROM chapters c
+            WHERE c.project_id = ? AND c.x IS NOT NULL AND c.y IS NOT NULL
+        """, ('c.id',)),
+        ("""
+            SELECT s.chapter_id, s.id, '', c.x + s.x, c.y + s.y, s.width, s.height
+            FROM sections s
+            JOIN chapters c ON c.project_id = s.project_id AND c.id = s.chapter_id
+            WHERE s.project_id = ? AND (c.x + s.x) IS NOT NULL AND (c.y + s.y) IS NOT NULL
+        """, ('s.chapter_id', 's.id')),
+        ("""
+            SELECT n.chapter_id, n.section_id, n.id, c.x + s.x + n.x, c.y + s.y + n.y, n.width, n.height
+            FROM nodes n
+            JOIN sections s ON s.project_id = n.project_id AND s.chapter_id = n.chapter_id AND s.id = n.section_id
+            JOIN chapters c ON c.project_id = n.project_id AND c.id = n.chapter_id
+            WHERE n.project_id = ? AND (c.x + s.x + n.x) IS NOT NULL AND (c.y + s.y + n.y) IS NOT NULL
+        """, ('n.chapter_id', 'n.section_id', 'n.id')),
+    )
+    
+    @staticmethod
+    def _geometry_key(cursor, project_id: str) -> int:
+        """项目在 R*Tree 第三维中的编号（首次使用时分配）"""
+        cursor.execute("INSERT OR IGNORE INTO geometry_projects (project_id) VALUES (?)", (project_id,))
+        cursor.execute("SELECT pkey FROM geometry_projects WHERE project_id = ?", (project_id,))
+        return cursor.fetchone()['pkey']
+    
+    def _delete_geometry(self, cursor, project_id: str, scopes: List[tuple]) -> None:
+        """删除若干范围内的包围盒（范围为键列前缀，如 (chapter_id,) 包含整个章节；触发器同步删除 R*Tree 行）"""
+        by_length: Dict[int, List[tuple]] = {}
+        for scope in scopes:
+            by_length.setdefault(len(scope), []).append(scope)
+        for length, group in by_length.items():
+            where = "".join(f" AND {col} = ?" for col in self._GEOMETRY_KEY_COLUMNS[:length])
+            cursor.executemany(f"DELETE FROM geometry_items WHERE project_id = ?{where}",
+                               [(project_id,) + scope for scope in group])
+    
+    def _reindex_geometry(self, cursor, project_id: str, scope: tuple) -> None:
+        """重建某个范围内的包围盒：() 为整个项目，(chapter_id,) 为章节及其下级，以此类推"""
+        self._delete_geometry(cursor, project_id, [scope])
+        pkey = self._geometry_key(cursor, project_id)
+        cursor.execute("SELECT COALESCE(MAX(rid), 0) FROM geometry_items")
+        next_rid = cursor.fetchone()[0] + 1
+        items = []
+        boxes = []
+        for level, (sql, filter_columns) in enumerate(self._GEOMETRY_QUERIES):
+            # 范围 (c, s) 只涉及部分和节点两层，(c, s, n) 只涉及节点
+            if level < len(scope) - 1:
+                continue
+            where = "".join(f" AND {col} = ?" for col in filter_columns[:len(scope)])
+            cursor.execute(sql + where, (project_id,) + scope)
+            for chapter_id, section_id, node_id, x, y, width, height in cursor.fetchall():
+                items.append((next_rid, project_id, chapter_id, section_id, node_id))
+                boxes.append((next_rid, x, x + (width or 0), y, y + (height or 0), pkey, pkey))
+                next_rid += 1
+        if items:
+            cursor.executemany("""
+                INSERT INTO geometry_items (rid, project_id, chapter_id, section_id, node_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, items)
+            cursor.executemany("""
+                INSERT INTO geometry_rtree (id, x0, x1, y0, y1, p0, p1) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, boxes)
+    
+    def _update_geometry_index(self, cursor, project_id: str, deltas, previous_rows) -> None:
+        """按 update 的行级差异维护几何索引
+        
+        删除已删除行的包围盒；新增或几何列变化的行连同下级一起重建
+        （移动章节会改变其中所有部分和节点的项目坐标）。只改名称、内容、顺序的行不受影响。
+        """
+        deleted: List[tuple] = []
+        changed: List[tuple] = []
+        for (table, _, value_columns), (to_insert, to_update, to_delete), old_rows in zip(
+                self._DELTA_TABLES, deltas, previous_rows):
+            if table == 'edges':
+                continue
+            deleted.extend(to_delete)
+            changed.extend(key for key, _ in to_insert)
+            indexes = [value_columns.index(col) for col in self._GEOMETRY_COLUMNS]
+            for key, value in to_update:
+                old_value = old_rows[key]
+                if any(value[i] != old_value[i] for i in indexes):
+                    changed.append(key)
+        if deleted:
+            self._delete_geometry(cursor, project_id, deleted)
+        
+        # 去掉已被上级范围覆盖的范围（changed 中章节在部分之前，部分在节点之前）
+        scopes = set()
+        for key in changed:
+            if not any(key[:length] in scopes for length in range(1, len(key))):
+                scopes.add(key)
+        if len(scopes) > self._GEOMETRY_MAX_SCOPES:
+            scopes = {()}
+        for scope in scopes:
+            self._reindex_geometry(cursor, project_id, scope)
+    
+    # --- 变更日志 ---
+    
+    @classmethod
+    def merge_deltas(cls, deltas: List[ProjectDelta]) -> ProjectDelta:
+        """把版本连续的多条变更合并为一条（从第一条的 base_version 到最后一条的 version）
+        
+        同一行的多次 upsert 按字段合并，后出现的值覆盖先出现的值；删除后又新增的行只保留 upsert，
+        新增后又删除的行保留删除（对区间开始时不存在该行的副本是空操作）。
+        因此合并结果应用到区间内任一版本的副本上，都会得到最后一个版本。
+        """
+        upserts: Dict[str, Dict[tuple, Dict]] = {}
+        deletes: Dict[str, Dict[tuple, Dict]] = {}
+        name = None
+        for delta in deltas:
+            if delta.name is not None:
+                name = delta.name
+            for table, key_columns, _ in cls._DELTA_TABLES:
+                table_upserts = upserts.setdefault(table, {})
+                table_deletes = deletes.setdefault(table, {})
+                for row in delta.deletes.get(table, ()):
+                    key = tuple(row[col] for col in key_columns)
+                    table_upserts.pop(key, None)
+                    table_deletes[key] = row
+                for row in delta.upserts.get(table, ()):
+                    key = tuple(row[col] for col in key_columns)
+                    table_deletes.pop(key, None)
+                    merged = table_upserts.get(key)
+                    if merged is None:
+                        table_upserts[key] = dict(row)
+                    else:
+                        merged.update(row)
+        return ProjectDelta(
+            project_id=deltas[-1].project_id,
+            base_version=deltas[0].base_version,
+            version=deltas[-1].version,
+            updated_at=deltas[-1].updated_at,
+            name=name,
+            upserts={table: list(rows.values()) for table, rows in upserts.items() if rows},
+            deletes={table: list(rows.values()) for table, rows in deletes.items() if rows}
+        )
+    
+    @staticmethod
+    def _retention_cutoff(retention_days: int) -> Optional[str]:
+        """按保留天数计算 updated_at 的下限（与 updated_at 相同的 ISO 格式），为 0 时不清理"""
+        if retention_days <= 0:
+            return None
+        return (datetime.now() - timedelta(days=retention_days)).isoformat()
+    
+    @staticmethod
+    def _insert_change(cursor, delta: ProjectDelta) -> None:
+        cursor.execute("""
+            INSERT OR REPLACE INTO change_log (project_id, version, base_version, updated_at, delta)
+            VALUES (?, ?, ?, ?, ?)
+        """, (delta.project_id, delta.version, delta.base_version, delta.updated_at,
+              delta.model_dump_json()))
+    
+    def _log_change(self, cursor, delta: ProjectDelta) -> None:
+        """在写事务中追加一条变更日志；条目数超过上限时把较早的一半合并为一条"""
+        max_entries = settings.change_log_max_entries
+        if max_entries <= 0:
+            return
+        self._insert_change(cursor, delta)
+        cursor.execute("SELECT COUNT(*) FROM change_log WHERE project_id = ?", (delta.project_id,))
+        if cursor.fetchone()[0] > max_entries:
+            self._compact_project_changes(cursor, delta.project_id, max_entries // 2,
+                                          self._retention_cutoff(settings.change_log_retention_days))
+    
+    def _compact_project_changes(self, cursor, project_id: str, keep: int,
+                                 cutoff: Optional[str]) -> Tuple[int, int]:
+        """删除早于 cutoff 的条目，再把最新 keep 条之前的条目合并为一条
+        
+        Returns:
+            (被合并的条目数, 过期删除的条目数)
+        """
+        expired = 0
+        if cutoff is not None:
+            cursor.execute("DELETE FROM change_log WHERE project_id = ? AND updated_at < ?",
+                           (project_id, cutoff))
+            expired = cursor.rowcount
+        
+        # 第 keep + 1 新的条目及更早的条目需要合并
+        cursor.execute("""
+            SELECT version FROM change_log WHERE project_id = ?
+            ORDER BY version DESC LIMIT 1 OFFSET ?
+        """, (project_id, keep))
+        row = cursor.fetchone()
+        if row is None:
+            return 0, expired
+        cursor.execute("""
+            SELECT delta FROM change_log WHERE project_id = ? AND version <= ?
+            ORDER BY version
+        """, (project_id, row['version']))
+        old = [ProjectDelta.model_validate_json(r['delta']) for r in cursor.fetchall()]
+        if len(old) < 2:
+            return 0, expired
+        cursor.execute("DELETE FROM change_log WHERE project_id = ? AND version <= ?",
+                       (project_id, row['version']))
+        self._insert_change(cursor, self.merge_deltas(old))
+        return len(old), expired
+    
+    def compact_changes(self, project_id: Optional[str] = None, keep: Optional[int] = None,
+                        retention_days: Optional[int] = None) -> Dict[str, int]:
+        """压缩变更日志：删除超过保留天数的条目，并把每个项目最新 keep 条之前的条目合并为一条
+        
+        Args:
+            project_id: 只处理指定项目，默认处理所有项目
+            keep: 保留的未合并条目数，默认为 change_log_max_entries
+            retention_days: 保留天数，默认为 change_log_retention_days（为 0 时不按时间清理）
+        
+        Returns:
+            {"projects": 处理的项目数, "merged": 被合并的条目数, "expired": 过期删除的条目数}
+        """
+        keep = settings.change_log_max_entries if keep is None else keep
+        retention_days = settings.change_log_retention_days if retention_days is None else retention_days
+        cutoff = self._retention_cutoff(retention_days)
+        counts = {"projects": 0, "merged": 0, "expired": 0}
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                if project_id is None:
+                    cursor.execute("SELECT DISTINCT project_id FROM change_log")
+                    project_ids = [row['project_id'] for row in cursor.fetchall()]
+                else:
+                    project_ids = [project_id]
+                for pid in project_ids:
+                    merged, expired = self._compact_project_changes(cursor, pid, keep, cutoff)
+                    counts["projects"] += 1
+                    counts["merged"] += merged
+                    counts["expired"] += expired
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return counts
+    
+    def read_changes(self, project_id: str, since: int,
+                     limit: int) -> Tuple[int, List[ProjectDelta]]:
+        """读取版本号大于 since 的变更日志（按版本升序，最多 limit 条）
+        
+        项目版本与日志在同一个读事务中读取。
+        
+        Returns:
+            (项目当前版本号, 变更列表)
+        
+        Raises:
+            KeyError: 项目不存在
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT version FROM projects WHERE id = ?", (project_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise KeyError(f"Project {project_id} not found")
+            cursor.execute("""
+                SELECT delta FROM change_log
+                WHERE project_id = ? AND version > ?
+                ORDER BY version LIMIT ?
+            """, (project_id, since, limit))
+            deltas = [ProjectDelta.model_validate_json(r['delta']) for r in cursor.fetchall()]
+            return row['version'] or 0, deltas
+    
+    # 孤儿数据清理：(表名, 描述, 判定孤儿行的 WHERE 条件)
+    _ORPHAN_RULES = (
+        ('geometry_projects', '所属项目不存在的几何索引编号', """
+            project_id NOT IN (SELECT id FROM projects)
+        """),
+        ('geometry_items', '所属项目不存在的几何索引项', """
+            project_id NOT IN (SELECT id FROM projects)
+        """),
+        ('change_log', '所属项目不存在的变更日志', """
+            project_id NOT IN (SELECT id FROM projects)
+        """),
+        ('edges', '项目不存在或端点节点不存在的边', """
+            project_id NOT IN (SELECT id FROM projects)
+            OR NOT EXISTS (SELECT 1 FROM nodes n WHERE n.project_id = edges.project_id AND n.id = edges.source)
+            OR NOT EXISTS (SELECT 1 FROM nodes n WHERE n.project_id = edges.project_id AND n.id = edges.target)
+        """),
+        ('nodes', '所属项目或部分不存在的节点', """
+            project_id NOT IN (SELECT id FROM projects)
+            OR NOT EXISTS (
+                SELECT 1 FROM sections s
+                WHERE s.project_id = nodes.project_id
+                  AND s.chapter_id = nodes.chapter_id
+                  AND s.id = nodes.section_id
+            )
+        """),
+        ('sections', '所属项目或章节不存在的部分', """
+            project_id NOT IN (SELECT id FROM projects)
+            OR NOT EXISTS (
+                SELECT 1 FROM chapters c
+                WHERE c.project_id = sections.project_id AND c.id = sections.chapter_id
+            )
+        """),
+        ('chapters', '所属项目不存在的章节', """
+            project_id NOT IN (SELECT id FROM projects)
+        """),
+    )
+    
+    def sweep_orphans(self, dry_run: bool = False) -> Dict[str, int]:
+        """清理孤儿数据（外键未生效时删除项目/章节等遗留下来的行）
+        
+        按 chapters -> sections -> nodes -> edges 的顺序删除，
+        上一级被删掉的行会在下一步被一并识别为孤儿。
+        清理期间临时关闭外键，避免级联删除影响统计。
+        
+        仍然存在的项目中被删除的行（端点不存在的边、上级不存在的节点/部分）与普通写入一样处理：
+        在同一事务中递增项目版本号、追加一条只含 deletes 的变更日志、删除对应的包围盒，
+        提交后使项目缓存和图索引失效。
+        
+        Args:
+            dry_run: 为 True 时在事务中执行后回滚，只返回统计结果
+        
+        Returns:
+            每张表删除（或将删除）的行数 {表名: 行数}
+        """
+        counts: Dict[str, int] = {}
+        touched: Dict[str, Dict[str, List[tuple]]] = {}
+        key_columns = {table: keys for table, keys, _ in self._DELTA_TABLES}
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA foreign_keys = OFF")
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for table, _, condition in reversed(self._ORPHAN_RULES):
+                    if table in key_columns:
+                        cursor.execute(f"""
+                            SELECT project_id, {', '.join(key_columns[table])} FROM {table}
+                            WHERE ({condition}) AND project_id IN (SELECT id FROM projects)
+                        """)
+                        for row in cursor.fetchall():
+                            touched.setdefault(row[0], {}).setdefault(table, []).append(tuple(row[1:]))
+                    cursor.execute(f"DELETE FROM {table} WHERE {condition}")
+                    counts[table] = cursor.rowcount
+                self._log_sweep(cursor, touched)
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                cursor.execute(f"PRAGMA foreign_keys = {'ON' if settings.db_foreign_keys else 'OFF'}")
+        if not dry_run:
+            for project_id in touched:
+                self.cache.invalidate(project_id)
+                for indexes in (dag_indexes, graph_indexes, reach_indexes):
+                    indexes.invalidate(project_id)
+        return counts
+    
+    def _log_sweep(self, cursor, touched: Dict[str, Dict[str, List[tuple]]]) -> None:
+        """为清理中删除了行的现存项目递增版本号、删除包围盒并记录变更"""
+        updated_at = datetime.now().isoformat()
+        for project_id, rows in touched.items():
+            scopes = [key for table, keys in rows.items() if table != 'edges' for key in keys]
+            if scopes:
+                self._delete_geometry(cursor, project_id, scopes)
+            new_version = self._touch_project(cursor, project_id, updated_at)
+            self._log_change(cursor, ProjectDelta(
+                project_id=project_id,
+                base_version=new_version - 1,
+                version=new_version,
+                updated_at=updated_at,
+                deletes={
+                    table: [dict(zip(key_columns, key)) for key in rows[table]]
+                    for table, key_columns, _ in self._DELTA_TABLES if table in rows
+                }
+            ))
     
     def exists(self, project_id: str) -> bool:
         """检查项目是否存在"""
-        conn = self._get_connection()
-        try:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM projects WHERE id = ?", (project_id,))
             return cursor.fetchone() is not None
-        finally:
-            conn.close()
     
     def migrate_from_json(self, json_file: Path = None):
         """从 JSON 文件迁移数据到 SQLite"""
@@ -555,7 +1629,7 @@ class Storage:
 storage = Storage()
 
 # 如果 JSON 文件存在但数据库为空，自动迁移
-if settings.data_file.exists() and not storage.get_all():
+if settings.data_file.exists() and storage.count() == 0:
     try:
         storage.migrate_from_json()
     except Exception as e:
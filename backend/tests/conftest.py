@@ -0,0 +1,11 @@
+"""测试环境：在导入 knowledge_dag 之前把数据目录指向临时目录，避免改动仓库中的数据库"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+os.environ["DATA_FILE"] = str(Path(tempfile.mkdtemp(prefix="knowledge_dag_test_")) / "projects_data.json")
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
@@ -0,0 +1,226 @@
+"""增量图算法与变更合并的差分测试：随机操作序列下与 networkx（或逐条应用变更）的结果比较
+
+覆盖 DynamicDAG.add_edge（Pearce–Kelly 增量拓扑序）、ReachabilityIndex 的增量更新、
+redundant_edges（传递归约）、iter_paths 的游标续传，以及 Storage.merge_deltas。
+"""
+import random
+
+import networkx as nx
+import pytest
+
+from knowledge_dag.graph import (
+    CompactGraph, CycleError, DynamicDAG, ReachabilityIndex, iter_paths, redundant_edges
+)
+from knowledge_dag.models import ProjectDelta
+from knowledge_dag.storage import Storage
+
+SEEDS = range(40)
+
+
+def random_dag(rnd: random.Random, n: int, p: float) -> nx.DiGraph:
+    """按随机排列方向连边的 DAG"""
+    ids = [f"v{i}" for i in range(n)]
+    order = ids[:]
+    rnd.shuffle(order)
+    graph = nx.DiGraph()
+    graph.add_nodes_from(ids)
+    for i, u in enumerate(order):
+        for v in order[i + 1:]:
+            if rnd.random() < p:
+                graph.add_edge(u, v)
+    return graph
+
+
+def assert_topological(dag: DynamicDAG, graph: nx.DiGraph) -> None:
+    assert set(dag.ord) == set(graph.nodes)
+    for u, v in graph.edges:
+        assert dag.ord[u] < dag.ord[v], (u, v)
+    assert {(u, v) for u, targets in dag.succ.items() for v in targets} == set(graph.edges)
+
+
+def assert_reachability(reach: ReachabilityIndex, graph: nx.DiGraph) -> None:
+    for node in graph.nodes:
+        assert set(reach.ancestors(node)) == nx.ancestors(graph, node), node
+        assert set(reach.descendants(node)) == nx.descendants(graph, node), node
+    for u, v in graph.edges:
+        assert reach.reaches(u, v)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_dynamic_dag_add_edge_matches_networkx(seed):
+    rnd = random.Random(seed)
+    ids = [f"v{i}" for i in range(rnd.randint(2, 30))]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(ids)
+    dag = DynamicDAG.from_edges(ids, [])
+    for _ in range(120):
+        u, v = rnd.sample(ids, 2)
+        if rnd.random() < 0.15 and graph.number_of_edges():
+            u, v = rnd.choice(list(graph.edges))
+            graph.remove_edge(u, v)
+            dag.remove_edge(u, v)
+        elif nx.has_path(graph, v, u):
+            with pytest.raises(CycleError):
+                dag.add_edge(u, v)
+        else:
+            assert dag.add_edge(u, v) is not graph.has_edge(u, v)
+            graph.add_edge(u, v)
+        assert_topological(dag, graph)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_reachability_updates_match_networkx(seed):
+    rnd = random.Random(seed)
+    graph = random_dag(rnd, rnd.randint(2, 25), 0.1)
+    reach = ReachabilityIndex.from_graph(CompactGraph.from_edges(list(graph.nodes), list(graph.edges)))
+    assert_reachability(reach, graph)
+    history = []
+    for step in range(60):
+        history.append((reach, graph.copy()))
+        op = rnd.random()
+        if op < 0.5 and len(graph) >= 2:
+            u, v = rnd.sample(list(graph.nodes), 2)
+            if nx.has_path(graph, v, u):
+                continue
+            graph.add_edge(u, v)
+            reach = reach.with_edge_added(u, v)
+        elif op < 0.8 and graph.number_of_edges():
+            u, v = rnd.choice(list(graph.edges))
+            graph.remove_edge(u, v)
+            reach = reach.with_edge_removed(u, v)
+        elif op < 0.9 and len(graph) > 2:
+            node = rnd.choice(list(graph.nodes))
+            graph.remove_node(node)
+            reach = reach.with_node_removed(node)
+        else:
+            node = f"n{seed}_{step}"
+            graph.add_node(node)
+            reach = reach.with_node_added(node)
+        assert_reachability(reach, graph)
+    # 写时复制：较早的快照不受后续修改影响
+    for old_reach, old_graph in history[::7]:
+        assert_reachability(old_reach, old_graph)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_redundant_edges_match_transitive_reduction(seed):
+    rnd = random.Random(seed)
+    graph = random_dag(rnd, rnd.randint(1, 40), rnd.choice([0.05, 0.15, 0.4]))
+    compact = CompactGraph.from_edges(list(graph.nodes), list(graph.edges))
+    expected = set(graph.edges) - set(nx.transitive_reduction(graph).edges)
+    assert set(redundant_edges(compact)) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_iter_paths_resumes_where_it_stopped(seed):
+    rnd = random.Random(seed)
+    graph = random_dag(rnd, rnd.randint(2, 12), 0.3)
+    start = rnd.choice(list(graph.nodes))
+    max_depth = rnd.choice([None, 1, 2, 3])
+    compact = CompactGraph.from_edges(list(graph.nodes), list(graph.edges))
+    reach = ReachabilityIndex.from_graph(compact)
+
+    def neighbors(node):
+        return sorted(graph.successors(node))
+
+    paths = list(iter_paths(neighbors, start, max_depth=max_depth))
+    expected = {
+        tuple(path)
+        for target in graph.nodes if target != start
+        for path in nx.all_simple_paths(graph, start, target, cutoff=max_depth)
+    }
+    assert len(paths) == len(expected)
+    assert {tuple(path) for path in paths} == expected
+    assert list(iter_paths(reach.successor_ids, start, max_depth=max_depth)) == paths
+    assert list(iter_paths(compact.successor_ids, start, max_depth=max_depth)) == paths
+
+    for k in range(len(paths)):
+        resumed = list(iter_paths(neighbors, start, after=paths[k], max_depth=max_depth))
+        assert resumed == paths[k + 1:]
+
+
+def test_iter_paths_rejects_invalid_cursor():
+    graph = {"a": ["b"], "b": ["c"], "c": []}
+    with pytest.raises(ValueError):
+        list(iter_paths(graph.get, "a", after=["b", "c"]))
+    with pytest.raises(ValueError):
+        list(iter_paths(graph.get, "a", after=["a", "c"]))
+
+
+NODE_VALUES = ("name", "content", "x", "y")
+
+
+def apply_delta(state, delta: ProjectDelta) -> None:
+    """按前端 applyDelta 的规则把变更应用到 {表名: {主键: 行}} 上"""
+    for table, key_columns, _ in Storage._DELTA_TABLES:
+        rows = state.setdefault(table, {})
+        for row in delta.deletes.get(table, ()):
+            rows.pop(tuple(row[col] for col in key_columns), None)
+        for row in delta.upserts.get(table, ()):
+            rows.setdefault(tuple(row[col] for col in key_columns), {}).update(row)
+
+
+def random_deltas(rnd: random.Random, count: int):
+    """在少量主键上随机新增（完整行）、修改（部分字段）、删除节点和边，产生版本连续的变更"""
+    keys = [("c", "s", f"n{i}") for i in range(6)]
+    edges = [(f"n{i}", f"n{j}") for i in range(4) for j in range(4) if i != j]
+    present = {"nodes": set(), "edges": set()}
+    deltas = []
+    for version in range(1, count + 1):
+        upserts, deletes = {}, {}
+        for _ in range(rnd.randint(1, 4)):
+            if rnd.random() < 0.6:
+                key = rnd.choice(keys)
+                row = {"chapter_id": key[0], "section_id": key[1], "id": key[2]}
+                if key in present["nodes"] and rnd.random() < 0.3:
+                    deletes.setdefault("nodes", []).append(row)
+                    upserts["nodes"] = [r for r in upserts.get("nodes", []) if r["id"] != key[2]]
+                    present["nodes"].discard(key)
+                    continue
+                columns = NODE_VALUES if key not in present["nodes"] else rnd.sample(NODE_VALUES, 2)
+                row.update({col: f"{col}{version}" for col in columns})
+                deletes["nodes"] = [r for r in deletes.get("nodes", []) if r["id"] != key[2]]
+                upserts.setdefault("nodes", []).append(row)
+                present["nodes"].add(key)
+            else:
+                source, target = rnd.choice(edges)
+                row = {"source": source, "target": target}
+                if (source, target) in present["edges"] and rnd.random() < 0.5:
+                    upserts["edges"] = [r for r in upserts.get("edges", [])
+                                        if (r["source"], r["target"]) != (source, target)]
+                    deletes.setdefault("edges", []).append(row)
+                    present["edges"].discard((source, target))
+                else:
+                    row["label"] = f"l{version}"
+                    deletes["edges"] = [r for r in deletes.get("edges", [])
+                                        if (r["source"], r["target"]) != (source, target)]
+                    upserts.setdefault("edges", []).append(row)
+                    present["edges"].add((source, target))
+        deltas.append(ProjectDelta(
+            project_id="p", base_version=version - 1, version=version, updated_at=str(version),
+            name=f"name{version}" if rnd.random() < 0.2 else None,
+            upserts={table: rows for table, rows in upserts.items() if rows},
+            deletes={table: rows for table, rows in deletes.items() if rows}
+        ))
+    return deltas
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_merge_deltas_matches_sequential_application(seed):
+    rnd = random.Random(seed)
+    deltas = random_deltas(rnd, rnd.randint(1, 20))
+    states = [{}]
+    for delta in deltas:
+        state = {table: {key: dict(row) for key, row in rows.items()} for table, rows in states[-1].items()}
+        apply_delta(state, delta)
+        states.append(state)
+    final = states[-1]
+
+    merged = Storage.merge_deltas(deltas)
+    assert (merged.base_version, merged.version) == (0, deltas[-1].version)
+    assert merged.name == next((d.name for d in reversed(deltas) if d.name is not None), None)
+    # 合并结果应用到区间内任一版本的副本上，都得到最后一个版本
+    for state in states:
+        state = {table: {key: dict(row) for key, row in rows.items()} for table, rows in state.items()}
+        apply_delta(state, merged)
+        assert {t: r for t, r in state.items() if r} == {t: r for t, r in final.items() if r}
@@ -0,0 +1,295 @@
+"""存储层往返测试：在临时数据库上比较增量写入、单行几何更新、迁移、条件请求和视口查询的结果
+
+增量写入与整体重写的数据库内容一致；单行几何更新同步修改缓存且不改动先前返回的对象；
+旧版本数据库执行 change_log / 几何索引迁移后与新建数据库一致；ETag 条件请求返回 304/412；
+R*Tree 视口查询与按项目坐标暴力过滤的结果一致。
+"""
+import random
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from knowledge_dag import migrations
+from knowledge_dag.config import settings
+from knowledge_dag.main import app
+from knowledge_dag.models import Chapter, Edge, Node, Project, Section
+from knowledge_dag.storage import Storage, clone_project
+
+SEEDS = range(10)
+NOW = "2024-01-01T00:00:00"
+
+
+def maybe_coord(rnd: random.Random):
+    return None if rnd.random() < 0.1 else float(rnd.randint(0, 400))
+
+
+def random_project(rnd: random.Random, project_id: str) -> Project:
+    """随机生成的项目：部分坐标可能为空，边只从前面的节点指向后面的节点"""
+    chapters = []
+    node_ids = []
+    for c in range(rnd.randint(1, 4)):
+        sections = []
+        for s in range(rnd.randint(1, 3)):
+            nodes = []
+            for n in range(rnd.randint(0, 5)):
+                node_id = f"n{c}_{s}_{n}"
+                node_ids.append(node_id)
+                nodes.append(Node(id=node_id, name=node_id, content=f"note {node_id}", position=float(n),
+                                  x=maybe_coord(rnd), y=maybe_coord(rnd),
+                                  width=rnd.choice([None, 40.0]), height=rnd.choice([None, 20.0])))
+            sections.append(Section(id=f"s{c}_{s}", name=f"S{c}.{s}", nodes=nodes,
+                                    x=maybe_coord(rnd), y=maybe_coord(rnd), width=200.0, height=150.0))
+        chapters.append(Chapter(id=f"c{c}", name=f"C{c}", sections=sections,
+                                x=maybe_coord(rnd), y=maybe_coord(rnd), width=500.0, height=400.0))
+    edges = [
+        Edge(source=u, target=v)
+        for i, u in enumerate(node_ids) for v in node_ids[i + 1:]
+        if rnd.random() < 0.15
+    ]
+    return Project(id=project_id, name=project_id, created_at=NOW, updated_at=NOW,
+                   chapters=chapters, edges=edges)
+
+
+def mutate(rnd: random.Random, project: Project, step: int) -> None:
+    """随机修改项目：改名、移动、增删节点和边、调整章节/部分顺序"""
+    sections = [sec for ch in project.chapters for sec in ch.sections]
+    nodes = [node for sec in sections for node in sec.nodes]
+    op = rnd.randrange(7)
+    if op == 0 and nodes:
+        node = rnd.choice(nodes)
+        node.name = f"{node.id} v{step}"
+        node.content = f"edited {step}"
+    elif op == 1 and nodes:
+        node = rnd.choice(nodes)
+        node.x, node.y = maybe_coord(rnd), maybe_coord(rnd)
+    elif op == 2:
+        section = rnd.choice(sections)
+        section.nodes.append(Node(id=f"new{step}", name=f"new{step}", position=float(len(section.nodes)),
+                                  x=maybe_coord(rnd), y=maybe_coord(rnd)))
+    elif op == 3 and nodes:
+        removed = rnd.choice(nodes).id
+        for section in sections:
+            section.nodes = [node for node in section.nodes if node.id != removed]
+        project.remove_node_edges({removed})
+    elif op == 4 and len(nodes) >= 2:
+        u, v = rnd.sample(nodes, 2)
+        if not project.find_edge(u.id, v.id) and not project.find_edge(v.id, u.id):
+            project.add_edge(Edge(source=u.id, target=v.id, label=f"e{step}"))
+    elif op == 5 and project.edges:
+        project.edges.pop(rnd.randrange(len(project.edges)))
+    else:
+        rnd.shuffle(project.chapters)
+        rnd.shuffle(rnd.choice(project.chapters).sections)
+        chapter = rnd.choice(project.chapters)
+        chapter.x, chapter.y = maybe_coord(rnd), maybe_coord(rnd)
+
+
+def table_rows(storage: Storage, project_id: str):
+    """项目在各表中的行（边忽略自增 id）以及几何索引中的包围盒"""
+    queries = {
+        table: f"SELECT * FROM {table} WHERE project_id = ?"
+        for table in ('chapters', 'sections', 'nodes')
+    }
+    queries['edges'] = "SELECT source, target, label FROM edges WHERE project_id = ?"
+    queries['geometry'] = """
+        SELECT g.chapter_id, g.section_id, g.node_id, r.x0, r.x1, r.y0, r.y1
+        FROM geometry_items g JOIN geometry_rtree r ON r.id = g.rid
+        WHERE g.project_id = ?
+    """
+    with storage._connection() as conn:
+        # 列中可能有 NULL，按 repr 排序
+        return {
+            table: sorted((tuple(row) for row in conn.execute(sql, (project_id,))), key=repr)
+            for table, sql in queries.items()
+        }
+
+
+def project_tree(project: Project):
+    """不含版本与时间戳的项目内容，用于比较"""
+    return project.model_dump(exclude={'version', 'updated_at'})
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "knowledge_dag.db"
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_delta_update_matches_full_rewrite(seed, tmp_path):
+    rnd = random.Random(seed)
+    storage = Storage(tmp_path / "delta.db")
+    project = random_project(rnd, f"p{seed}")
+    storage.add(project)
+    try:
+        for step in range(15):
+            project = storage.get(project.id)
+            mutate(rnd, project, step)
+            storage.update(project)
+
+            rewritten = Storage(tmp_path / f"full{step}.db")
+            rewritten.add(clone_project(project))
+            assert table_rows(storage, project.id) == table_rows(rewritten, project.id)
+            storage.cache.clear()
+            assert project_tree(storage.get(project.id)) == project_tree(rewritten.get(project.id))
+            rewritten.close()
+    finally:
+        storage.close()
+
+
+def test_node_geometry_update_patches_cache_copy(db_path):
+    storage = Storage(db_path)
+    project = random_project(random.Random(1), "geo")
+    storage.add(project)
+    chapter = project.chapters[0]
+    section = chapter.sections[0]
+    if not section.nodes:
+        section.nodes.append(Node(id="n_geo", name="n_geo", x=0.0, y=0.0))
+    chapter.x = chapter.y = section.x = section.y = 0.0
+    storage.update(project)
+    node = section.nodes[0]
+
+    before = storage.get(project.id, copy=False)
+    version = before.version
+    assert storage.update_node_geometry(project.id, node.id, 123.0, 45.0, 60.0, None, "2024-02-01T00:00:00") == 1
+    assert storage.update_node_geometry(project.id, "missing", 1.0, 1.0, None, None, NOW) == 0
+
+    # 先前返回的共享对象保持原样，缓存中换成了修改后的副本
+    old_node = next(n for n in before.chapters[0].sections[0].nodes if n.id == node.id)
+    assert (old_node.x, old_node.y) == (node.x, node.y)
+    cached = storage.get(project.id, copy=False)
+    assert cached is not before
+    assert cached.version == version + 1
+    patched = next(n for n in cached.chapters[0].sections[0].nodes if n.id == node.id)
+    assert (patched.x, patched.y, patched.width, patched.height) == (123.0, 45.0, 60.0, node.height)
+
+    # 缓存与数据库一致，几何索引同步更新
+    storage.cache.clear()
+    assert project_tree(storage.get(project.id)) == project_tree(cached)
+    boxes = {item[:3]: item[3:] for item in table_rows(storage, project.id)['geometry']}
+    assert boxes[(chapter.id, section.id, node.id)][:3:2] == (123.0, 45.0)
+    assert storage.last_delta.upserts['nodes'][0]['x'] == 123.0
+    storage.close()
+
+
+def test_change_log_and_geometry_migrations_on_existing_db(db_path, tmp_path):
+    project = random_project(random.Random(2), "legacy")
+    storage = Storage(db_path)
+    storage.add(project)
+    storage.close()
+
+    # 退回到版本 8 的结构：去掉 change_log 与几何索引
+    conn = sqlite3.connect(db_path)
+    for statement in (
+        "DROP TRIGGER geometry_items_delete", "DROP TABLE geometry_rtree", "DROP TABLE geometry_items",
+        "DROP TABLE geometry_projects", "DROP TABLE change_log", "PRAGMA user_version = 8",
+    ):
+        conn.execute(statement)
+    conn.commit()
+    assert [name for _, name, _ in migrations.pending_migrations(conn)] == [
+        "create_change_log", "create_geometry_index"
+    ]
+    assert migrations.migrate(conn) == ["create_change_log", "create_geometry_index"]
+    assert migrations.get_schema_version(conn) == migrations.LATEST_VERSION
+    assert migrations.migrate(conn) == []
+    conn.close()
+
+    migrated = Storage(db_path)
+    fresh = Storage(tmp_path / "fresh.db")
+    fresh.add(clone_project(project))
+    assert table_rows(migrated, project.id) == table_rows(fresh, project.id)
+
+    # 迁移后的数据库可以照常增量写入并记录变更日志
+    current = migrated.get(project.id)
+    current.name = "renamed"
+    migrated.update(current)
+    _, changes = migrated.read_changes(project.id, current.version - 1, 10)
+    assert [(delta.version, delta.name) for delta in changes] == [(current.version, "renamed")]
+    migrated.close()
+    fresh.close()
+
+
+def test_etag_conditional_requests():
+    prefix = settings.api_prefix
+    with TestClient(app) as client:
+        created = client.post(f"{prefix}/projects", json={"name": "etag"}).json()
+        url = f"{prefix}/projects/{created['id']}"
+
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert etag == f'"{response.json()["version"]}"'
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert client.get(url, headers={"If-None-Match": f'W/{etag}'}).status_code == 304
+        assert client.get(url, headers={"If-None-Match": '"999"'}).status_code == 200
+
+        response = client.put(url, json={"name": "renamed"}, headers={"If-Match": etag})
+        assert response.status_code == 200
+        new_etag = response.headers["etag"]
+        assert new_etag != etag
+
+        # 过期的 ETag 拒绝写入，项目保持不变
+        response = client.put(url, json={"name": "stale"}, headers={"If-Match": etag})
+        assert response.status_code == 412
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["name"] == "renamed"
+        assert client.get(url, headers={"If-None-Match": new_etag}).status_code == 304
+
+        client.request("DELETE", url)
+
+
+def absolute_boxes(project: Project):
+    """按项目坐标计算章节/部分/节点的包围盒（自身及所有上级都有 x/y 才有包围盒）"""
+    def box(item, ox, oy):
+        x, y = ox + item.x, oy + item.y
+        return x, x + (item.width or 0), y, y + (item.height or 0)
+
+    boxes = {}
+    for chapter in project.chapters:
+        if chapter.x is None or chapter.y is None:
+            continue
+        boxes[(chapter.id, '', '')] = box(chapter, 0, 0)
+        for section in chapter.sections:
+            if section.x is None or section.y is None:
+                continue
+            sx, sy = chapter.x + section.x, chapter.y + section.y
+            boxes[(chapter.id, section.id, '')] = box(section, chapter.x, chapter.y)
+            for node in section.nodes:
+                if node.x is not None and node.y is not None:
+                    boxes[(chapter.id, section.id, node.id)] = box(node, sx, sy)
+    return boxes
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_viewport_matches_brute_force(seed, tmp_path):
+    rnd = random.Random(seed)
+    storage = Storage(tmp_path / "viewport.db")
+    project = random_project(rnd, f"v{seed}")
+    storage.add(project)
+    for step in range(5):
+        project = storage.get(project.id)
+        mutate(rnd, project, step)
+        storage.update(project)
+    boxes = absolute_boxes(project)
+
+    for _ in range(30):
+        x0, y0 = rnd.uniform(-100, 900), rnd.uniform(-100, 900)
+        x1, y1 = x0 + rnd.uniform(0, 400), y0 + rnd.uniform(0, 400)
+        hits = {
+            key for key, (bx0, bx1, by0, by1) in boxes.items()
+            if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0
+        }
+        version, chapters, edges = storage.query_viewport(project.id, x0, y0, x1, y1)
+        assert version == project.version
+        assert {ch.id for ch in chapters} == {c for c, _, _ in hits}
+        assert {(ch.id, sec.id) for ch in chapters for sec in ch.sections} == {(c, s) for c, s, _ in hits if s}
+        node_ids = {n for _, _, n in hits if n}
+        assert {node.id for ch in chapters for sec in ch.sections for node in sec.nodes} == node_ids
+        assert {(e.source, e.target) for e in edges} == {
+            (e.source, e.target) for e in project.edges if e.source in node_ids or e.target in node_ids
+        }
+    storage.close()
@@ -18,54 +18,80 @@ const getApiUrl = () => {
 
 const API_URL = getApiUrl()
 
+// 修改类接口的响应只需要本次变更（ProjectDelta），不需要整个项目；
+// 调用方用 projectStore.applyDelta 合并变更，版本不连续时再重新加载项目
+const MINIMAL = { headers: { Prefer: 'return=minimal' } }
+
 export const api = {
   getProjects: () => axios.get(`${API_URL}/projects`),
   createProject: (name) => axios.post(`${API_URL}/projects`, { name }),
-  updateProject: (projectId, name) => axios.put(`${API_URL}/projects/${projectId}`, { name }),
+  updateProject: (projectId, name) => axios.put(`${API_URL}/projects/${projectId}`, { name }, MINIMAL),
   deleteProject: (projectId) => axios.delete(`${API_URL}/projects/${projectId}`),
-  getProject: (id) => axios.get(`${API_URL}/projects/${id}`),
+  // 传入本地已有的版本号时做条件请求：项目未变化时服务器返回 304（不含响应体）
+  getProject: (id, version = null) => axios.get(`${API_URL}/projects/${id}`, version === null ? undefined : {
+    headers: { 'If-None-Match': `"${version}"` },
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304
+  }),
+  // 项目骨架（不含节点 content）；fields 为逗号分隔的字段路径，如 'name,chapters.sections.nodes.name'
+  getProjectSkeleton: (id) => axios.get(`${API_URL}/projects/${id}/skeleton`),
+  getProjectFields: (id, fields) => axios.get(`${API_URL}/projects/${id}`, { params: { fields } }),
+  // 按需批量获取节点 content（每次最多 1000 个）
+  getNodeContents: (projectId, nodeIds) =>
+    axios.post(`${API_URL}/projects/${projectId}/nodes/contents`, { node_ids: nodeIds }),
+  // 单个章节（含与章节内节点相连的边）
+  getChapter: (projectId, chapterId) => axios.get(`${API_URL}/projects/${projectId}/chapters/${chapterId}`),
+  // 视口查询：只返回包围盒与矩形相交的部分/节点（矩形为项目坐标系，返回的 x/y 仍相对于上级）
+  getViewport: (projectId, x0, y0, x1, y1) =>
+    axios.get(`${API_URL}/projects/${projectId}/viewport`, { params: { x0, y0, x1, y1 } }),
+  // 增量同步：版本 since 之后的行级变更（日志已不完整时返回 410，需重新 getProject）
+  getChanges: (projectId, since, { limit, compact = false } = {}) =>
+    axios.get(`${API_URL}/projects/${projectId}/changes`, {
+      params: { since, limit, compact }
+    }),
   addChapter: (projectId, chapterName) => 
-    axios.post(`${API_URL}/projects/${projectId}/chapters`, { chapter_name: chapterName }),
+    axios.post(`${API_URL}/projects/${projectId}/chapters`, { chapter_name: chapterName }, MINIMAL),
   updateChapter: (projectId, chapterId, data) =>
-    axios.put(`${API_URL}/projects/${projectId}/chapters/${chapterId}`, data),
+    axios.put(`${API_URL}/projects/${projectId}/chapters/${chapterId}`, data, MINIMAL),
   deleteChapter: (projectId, chapterId) => 
-    axios.delete(`${API_URL}/projects/${projectId}/chapters/${chapterId}`),
+    axios.delete(`${API_URL}/projects/${projectId}/chapters/${chapterId}`, MINIMAL),
   addSection: (projectId, chapterId, sectionName) => 
     axios.post(`${API_URL}/projects/${projectId}/sections`, { 
       chapter_id: chapterId, 
       section_name: sectionName 
-    }),
+    }, MINIMAL),
   updateSection: (projectId, sectionId, data) =>
-    axios.put(`${API_URL}/projects/${projectId}/sections/${sectionId}`, data),
+    axios.put(`${API_URL}/projects/${projectId}/sections/${sectionId}`, data, MINIMAL),
   deleteSection: (projectId, sectionId) => 
-    axios.delete(`${API_URL}/projects/${projectId}/sections/${sectionId}`),
+    axios.delete(`${API_URL}/projects/${projectId}/sections/${sectionId}`, MINIMAL),
   addNode: (projectId, chapterId, sectionId, nodeName, nodeContent = '') => 
     axios.post(`${API_URL}/projects/${projectId}/nodes`, {
       chapter_id: chapterId,
       section_id: sectionId,
       node_name: nodeName,
       node_content: nodeContent
-    }),
+    }, MINIMAL),
+  deleteNode: (projectId, nodeId) =>
+    axios.delete(`${API_URL}/projects/${projectId}/nodes/${nodeId}`, MINIMAL),
   addEdge: (projectId, source, target, label = '') => 
-    axios.post(`${API_URL}/projects/${projectId}/edges`, { source, target, label }),
+    axios.post(`${API_URL}/projects/${projectId}/edges`, { source, target, label }, MINIMAL),
   deleteEdge: (projectId, source, target) =>
-    axios.delete(`${API_URL}/projects/${projectId}/edges`, { data: { source, target } }),
+    axios.delete(`${API_URL}/projects/${projectId}/edges`, { data: { source, target }, ...MINIMAL }),
   updateEdge: (projectId, source, target, label) =>
-    axios.put(`${API_URL}/projects/${projectId}/edges`, { source, target, label }),
+    axios.put(`${API_URL}/projects/${projectId}/edges`, { source, target, label }, MINIMAL),
   reorderNodes: (projectId, sectionId, nodeIds) =>
     axios.post(`${API_URL}/projects/${projectId}/nodes/reorder`, {
       section_id: sectionId,
       node_ids: nodeIds
-    }),
+    }, MINIMAL),
   reorderSections: (projectId, chapterId, sectionIds) =>
     axios.post(`${API_URL}/projects/${projectId}/sections/reorder`, {
       chapter_id: chapterId,
       section_ids: sectionIds
-    }),
+    }, MINIMAL),
   reorderChapters: (projectId, chapterIds) =>
     axios.post(`${API_URL}/projects/${projectId}/chapters/reorder`, {
       chapter_ids: chapterIds
-    }),
+    }, MINIMAL),
   updateNodePosition: (projectId, nodeId, sectionId, x, y, width, height) =>
     axios.put(`${API_URL}/projects/${projectId}/nodes/position`, {
       node_id: nodeId,
@@ -74,18 +100,26 @@ export const api = {
       y: y,
       width: width,
       height: height
-    }),
+    }, MINIMAL),
   updateSectionPosition: (projectId, payload) =>
-    axios.put(`${API_URL}/projects/${projectId}/sections/position`, payload),
+    axios.put(`${API_URL}/projects/${projectId}/sections/position`, payload, MINIMAL),
   updateChapterPosition: (projectId, payload) =>
-    axios.put(`${API_URL}/projects/${projectId}/chapters/position`, payload),
+    axios.put(`${API_URL}/projects/${projectId}/chapters/position`, payload, MINIMAL),
   updateNode: (projectId, nodeId, sectionId, data) =>
     axios.put(`${API_URL}/projects/${projectId}/nodes/${nodeId}`, {
       section_id: sectionId,
       ...data
-    }),
+    }, MINIMAL),
   analyzeGraph: (projectId, focusNode) => 
     axios.get(`${API_URL}/projects/${projectId}/graph_analysis?focus_node=${focusNode}`),
+  getGraphMetrics: (projectId) =>
+    axios.get(`${API_URL}/projects/${projectId}/graph_metrics`),
+  getGraphLayout: (projectId) =>
+    axios.get(`${API_URL}/projects/${projectId}/graph_layout`),
+  findPath: (projectId, from, to, { mode = 'shortest', weighted = false } = {}) =>
+    axios.get(`${API_URL}/projects/${projectId}/path`, {
+      params: { from, to, mode, weighted }
+    }),
   exportProject: (projectId) =>
     axios.get(`${API_URL}/projects/${projectId}/export`, {
       responseType: 'blob'
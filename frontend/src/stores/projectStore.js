@@ -30,7 +30,10 @@ export const useProjectStore = defineStore('project', () => {
   const loadProject = async (id) => {
     if (!id) return
     try {
-      const res = await api.getProject(id)
+      // 重新加载同一项目时带上版本号，项目未变化时服务器返回 304，保留现有数据
+      const known = currentProjectId.value === id ? projectData.value.version : null
+      const res = await api.getProject(id, known ?? null)
+      if (res.status === 304) return
       // 保持引用更新
       projectData.value = res.data
       currentProjectId.value = id
@@ -39,6 +42,76 @@ export const useProjectStore = defineStore('project', () => {
     }
   }
 
+  // 合并修改类接口返回的变更（ProjectDelta，见 api.js 的 MINIMAL）
+  // 变更按主键描述：chapters 为 id，sections 为 (chapter_id, id)，nodes 为 (chapter_id, section_id, id)，
+  // edges 为 (source, target)。返回 false 表示版本不连续（中间漏了其他变更），调用方应重新加载项目
+  const applyDelta = (delta) => {
+    const project = projectData.value
+    if (!delta || delta.project_id !== project.id) return false
+    if (delta.version === project.version) return true
+    if (delta.base_version !== project.version) return false
+
+    const upserts = delta.upserts || {}
+    const deletes = delta.deletes || {}
+    const findChapter = (id) => project.chapters.find(ch => ch.id === id)
+    const findSection = (chapterId, id) => findChapter(chapterId)?.sections.find(sec => sec.id === id)
+    const sameEdge = (a, b) => a.source === b.source && a.target === b.target
+
+    // 先删除（子对象在前），再合并新增/修改的行（父对象在前）
+    for (const key of deletes.edges || []) {
+      project.edges = project.edges.filter(e => !sameEdge(e, key))
+    }
+    for (const key of deletes.nodes || []) {
+      const section = findSection(key.chapter_id, key.section_id)
+      if (section) section.nodes = section.nodes.filter(n => n.id !== key.id)
+    }
+    for (const key of deletes.sections || []) {
+      const chapter = findChapter(key.chapter_id)
+      if (chapter) chapter.sections = chapter.sections.filter(sec => sec.id !== key.id)
+    }
+    for (const key of deletes.chapters || []) {
+      project.chapters = project.chapters.filter(ch => ch.id !== key.id)
+    }
+
+    const merge = (list, match, row, create) => {
+      const item = list.find(match)
+      if (item) Object.assign(item, row)
+      else list.push(Object.assign(create(), row))
+    }
+    for (const row of upserts.chapters || []) {
+      merge(project.chapters, ch => ch.id === row.id, row, () => ({ sections: [] }))
+    }
+    for (const { chapter_id, ...row } of upserts.sections || []) {
+      const chapter = findChapter(chapter_id)
+      if (chapter) merge(chapter.sections, sec => sec.id === row.id, row, () => ({ nodes: [] }))
+    }
+    for (const { chapter_id, section_id, ...row } of upserts.nodes || []) {
+      const section = findSection(chapter_id, section_id)
+      if (section) merge(section.nodes, n => n.id === row.id, row, () => ({}))
+    }
+    for (const row of upserts.edges || []) {
+      merge(project.edges, e => sameEdge(e, row), row, () => ({}))
+    }
+
+    // 顺序变化时服务器会给出所有受影响行的新 position，其余对象保持原来的相对顺序
+    const byPosition = (list) => list
+      .map((item, index) => [item.position ?? index, index, item])
+      .sort((a, b) => a[0] - b[0] || a[1] - b[1])
+      .map(entry => entry[2])
+    if (upserts.chapters) project.chapters = byPosition(project.chapters)
+    for (const chapter of project.chapters) {
+      if (upserts.sections) chapter.sections = byPosition(chapter.sections)
+      if (upserts.nodes) {
+        for (const section of chapter.sections) section.nodes = byPosition(section.nodes)
+      }
+    }
+
+    project.version = delta.version
+    project.updated_at = delta.updated_at
+    if (delta.name) project.name = delta.name
+    return true
+  }
+
   // 更新节点在屏幕上的绝对位置 (由组件汇报)
   const updateNodeLayout = (nodeId, rect) => {
     // 简单防抖：只有数值变化超过 1px 才更新，避免浮点数抖动
@@ -116,6 +189,7 @@ export const useProjectStore = defineStore('project', () => {
     nodeLayoutMap,
     rowColumnLayoutCache,
     loadProject,
+    applyDelta,
     updateNodeLayout,
     updateCanvasState,
     getNodeRelativePosition,